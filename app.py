@@ -3,7 +3,8 @@
 #   ORM para la base de datos de la Pared Eólica para ASE II
 #   Versión 2.0
 
-from flask import Flask, request, abort, jsonify
+from flask import Flask, request, abort, jsonify, Response, stream_with_context, g, has_request_context
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from dotenv import load_dotenv
@@ -12,27 +13,262 @@ from flask_cors import CORS
 from flask_migrate import Migrate
 from datetime import date, timedelta
 import pytz
-from sqlalchemy import cast, Date, func
+from sqlalchemy import func, insert, select, delete, text, event, cast, extract, type_coerce, literal_column, Date, DateTime, Float
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import threading
+import itertools
 import time
+import queue
+import atexit
+from collections import OrderedDict
+from functools import wraps, lru_cache
+import tempfile
+import csv
+import io
+import json
+import click
+import uuid
+import gzip
+import numpy as np
+import sqlite3
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet y Arrow solo están disponibles si se instala pyarrow
+    pa = None
+
+try:
+    import orjson
+except ImportError:  # Sin orjson se usa el json de la biblioteca estándar
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # jsonify y app.json.dumps con orjson cuando está instalado. Se conserva
+    # el comportamiento del proveedor de Flask: llaves ordenadas y fechas con
+    # el formato de Flask. Los diccionarios con llaves que no son str (como
+    # las horas de getAllHours) se dejan al json estándar, que las ordena
+    # como números y no como texto.
+    ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    @staticmethod
+    def use_orjson(obj):
+        return orjson is not None and not (isinstance(obj, dict) and any(not isinstance(key, str) for key in obj))
+
+    def dumps(self, obj, **kwargs):
+        if kwargs or not self.use_orjson(obj):
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.ORJSON_OPTIONS).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if not self.use_orjson(obj) or not (self.compact or (self.compact is None and not self._app.debug)):
+            return super().response(obj)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.ORJSON_OPTIONS) + b'\n',
+            mimetype=self.mimetype
+        )
+
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
- 
+
+# -----------------------------------------------------------------------
+# MOTOR Y POOL DE CONEXIONES
+# -----------------------------------------------------------------------
+
+# Perfiles del pool (DB_PROFILE). Cada valor se puede cambiar con su propia
+# variable de entorno (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE,
+# DB_POOL_TIMEOUT, DB_POOL_PRE_PING).
+#   - gunicorn:   pool por worker, LIFO para que las conexiones que sobran se
+#                 queden inactivas y se reciclen
+#   - serverless: Vercel; una conexión que se reutiliza entre invocaciones
+#                 mientras la instancia siga viva, más poco margen para los hilos
+#   - pgbouncer:  sin pool propio (NullPool), PgBouncer es el que agrupa
+ENGINE_PROFILES = {
+    'gunicorn': {'pool_size': 5, 'max_overflow': 10, 'pool_recycle': 1800, 'pool_timeout': 30, 'pool_pre_ping': True, 'pool_use_lifo': True},
+    'serverless': {'pool_size': 1, 'max_overflow': 2, 'pool_recycle': 300, 'pool_timeout': 10, 'pool_pre_ping': True},
+    'pgbouncer': {'poolclass': NullPool},
+}
+DB_PROFILE = os.getenv('DB_PROFILE') or ('serverless' if os.getenv('VERCEL') else 'gunicorn')
+DB_PGBOUNCER = DB_PROFILE == 'pgbouncer' or os.getenv('DB_PGBOUNCER', '0') == '1'  # Modo transacción de PgBouncer
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))  # 0 = sin límite (solo PostgreSQL)
+
+# SQLite: WAL deja leer mientras otro proceso escribe y synchronous=NORMAL
+# evita un fsync por commit (en WAL no se corrompe la base, a lo más se
+# pierden los últimos commits si se va la luz)
+SQLITE_WAL = os.getenv('DB_SQLITE_WAL', '1') == '1'
+SQLITE_SYNCHRONOUS = os.getenv('DB_SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('DB_SQLITE_BUSY_TIMEOUT_MS', '5000'))  # Espera por el candado de escritura
+
+def engine_options(uri):
+    # Opciones de create_engine para SQLALCHEMY_ENGINE_OPTIONS según el perfil
+    if not uri or uri.startswith('sqlite'):
+        # SQLite usa su propio pool (por archivo o por hilo); solo se ajusta
+        # la espera del driver, los pragmas van en el evento connect
+        return {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000}}
+
+    if DB_PROFILE not in ENGINE_PROFILES:
+        raise ValueError(f'Unknown DB_PROFILE {DB_PROFILE!r}, expected one of {sorted(ENGINE_PROFILES)}')
+
+    options = dict(ENGINE_PROFILES[DB_PROFILE])
+    if DB_PGBOUNCER:
+        # Con NullPool no hay conexiones ociosas que revisar ni reciclar
+        options = {'poolclass': NullPool}
+    else:
+        for name, env, parse in (
+            ('pool_size', 'DB_POOL_SIZE', int),
+            ('max_overflow', 'DB_MAX_OVERFLOW', int),
+            ('pool_recycle', 'DB_POOL_RECYCLE', int),
+            ('pool_timeout', 'DB_POOL_TIMEOUT', int),
+            ('pool_pre_ping', 'DB_POOL_PRE_PING', lambda value: value == '1'),
+        ):
+            if os.getenv(env):
+                options[name] = parse(os.getenv(env))
+
+    # Keepalives de TCP para detectar conexiones que un balanceador o NAT
+    # cerró sin avisar
+    connect_args = {
+        'application_name': os.getenv('DB_APPLICATION_NAME', 'muro-eolico'),
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 5,
+    }
+    if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+        # PgBouncer no acepta parámetros de arranque como options
+        connect_args['options'] = f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+    options['connect_args'] = connect_args
+    return options
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+def sqlite_pragmas():
+    pragmas = ['PRAGMA journal_mode=WAL'] if SQLITE_WAL else []
+    return pragmas + [f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}', f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}']
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma in sqlite_pragmas():
+        cursor.execute(pragma)
+    cursor.close()
+
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)  # Inicializar Flask-Migrate
 
+def dispose_inherited_connections():
+    # Con gunicorn --preload los workers heredan el pool del proceso maestro;
+    # sin esto dos procesos comparten el mismo socket a la base de datos
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=dispose_inherited_connections)
+
 BASE_URL = '/api/v1'
  
 mexico_tz = pytz.timezone('America/Mexico_City')
 
+DEFAULT_WALL_ID = 1  # Muro de las lecturas y consultas que no dicen otro (?wall_id= o "wall_id")
+DATA_VERSION_ID = 1  # DataVersion también guarda un solo renglón
+UPSERT_CHUNK = 500  # Renglones por INSERT ... ON CONFLICT (límite de parámetros de SQLite/PostgreSQL)
+
+# Estado de los dispositivos (la Xiao manda un heartbeat a /update)
+DEFAULT_DEVICE = 'xiao'
+HEARTBEAT_TIMEOUT = timedelta(seconds=int(os.getenv('HEARTBEAT_TIMEOUT_SECONDS', '180')))  # Sin señal por más de esto = 0
+HEARTBEAT_CHECK_SECONDS = int(os.getenv('HEARTBEAT_CHECK_SECONDS', '60'))  # Cada cuánto se revisan los timeouts
+HEARTBEAT_PERSIST_SECONDS = int(os.getenv('HEARTBEAT_PERSIST_SECONDS', '30'))  # Cada cuánto se guarda la última señal
+MONITOR_LOCK_KEY = 72730001  # Llave del advisory lock del monitor en PostgreSQL
+
+# Modo de ingesta con buffer: /new encola la lectura y un hilo la escribe después
+INGEST_BUFFER_ENABLED = os.getenv('INGEST_BUFFER', '0') == '1'
+INGEST_BUFFER_SIZE = int(os.getenv('INGEST_BUFFER_SIZE', '10000'))  # Lecturas máximas en cola
+INGEST_FLUSH_MS = int(os.getenv('INGEST_FLUSH_MS', '500'))  # Cada cuánto se vacía la cola
+INGEST_FLUSH_ROWS = int(os.getenv('INGEST_FLUSH_ROWS', '500'))  # Lecturas máximas por transacción
+INGEST_RETRY_LIMIT = int(os.getenv('INGEST_RETRY_LIMIT', '5'))  # Intentos de escribir un lote antes de descartarlo
+INGEST_RETRY_BACKOFF_MS = int(os.getenv('INGEST_RETRY_BACKOFF_MS', '500'))  # Espera antes del 2º intento, se duplica en cada uno
+
+STREAM_CHUNK = 1000  # Renglones que se leen del cursor y se envían por bloque
+MAX_PAGE_SIZE = 10000  # Límite máximo para ?limit= en las consultas paginadas
+
+# Caché de respuestas para los endpoints de totales que consultan los dashboards
+CACHE_TTL = int(os.getenv('CACHE_TTL', '30'))  # Segundos, 0 lo desactiva
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '256'))
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')  # Backend compartido entre workers (opcional)
+DATA_VERSION_TTL = int(os.getenv('DATA_VERSION_TTL', '2'))  # Segundos que un worker usa la versión de los ETag sin releerla
+
+# Stream en vivo (SSE) de las lecturas nuevas
+STREAM_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', '100'))  # Eventos pendientes antes de soltar a un cliente lento
+STREAM_KEEPALIVE_SECONDS = int(os.getenv('STREAM_KEEPALIVE_SECONDS', '15'))
+
+# Reconstrucción de acumulados desde WallData
+ROLLUP_CHUNK_DAYS = int(os.getenv('ROLLUP_CHUNK_DAYS', '7'))  # Días por transacción al reconstruir
+ROLLUP_LOCK_ALL_WALLS = -1  # Muro de los advisory locks de un recálculo de todos los muros
+
+# Borrados masivos en segundo plano, por bloques de id
+DELETE_BATCH_SIZE = int(os.getenv('DELETE_BATCH_SIZE', '5000'))  # Lecturas por transacción
+DELETE_BATCH_PAUSE_MS = int(os.getenv('DELETE_BATCH_PAUSE_MS', '10'))  # Pausa entre bloques para dejar pasar la ingesta
+
+# Particiones mensuales de WallData (solo PostgreSQL, las crea la migración)
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '2'))  # Meses futuros que se crean por adelantado
+PARTITION_CHECK_SECONDS = int(os.getenv('PARTITION_CHECK_SECONDS', '3600'))  # Cada cuánto el monitor revisa que existan
+
+# Retención: las lecturas crudas viejas se archivan en disco y se borran de WallData
+RETENTION_RAW_DAYS = int(os.getenv('RETENTION_RAW_DAYS', '0'))  # Días de lecturas crudas en WallData, 0 = sin retención
+RETENTION_MINUTE_DAYS = int(os.getenv('RETENTION_MINUTE_DAYS', '0'))  # Días de TotalMinute, 0 = sin límite (TotalHour se queda siempre)
+RETENTION_ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+RETENTION_ARCHIVE_FORMAT = os.getenv('RETENTION_ARCHIVE_FORMAT', 'csv')  # csv (con gzip) o parquet
+RETENTION_CRON = os.getenv('RETENTION_CRON', '30 3 * * *')  # Cuándo corre el trabajo, en hora de México
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '5000'))  # Lecturas borradas por transacción
+ARCHIVE_CACHE_DAYS = int(os.getenv('ARCHIVE_CACHE_DAYS', '32'))  # Días archivados que se guardan ya leídos en memoria
+
+# Exportación de WallData y TotalDay (CSV, Parquet, Arrow)
+EXPORT_CHUNK = int(os.getenv('EXPORT_CHUNK', '50000'))  # Renglones por lectura del cursor
+
+# Importación de lecturas históricas (CSV / NDJSON)
+IMPORT_CHUNK = int(os.getenv('IMPORT_CHUNK', '20000'))  # Lecturas por COPY / executemany
+
+# Estadísticas por hélice en /stats
+STATS_BUCKETS = {'minute': 'm', 'hour': 'h', 'day': 'D', 'month': 'M'}  # Unidades de numpy.datetime64
+STATS_PERCENTILES = [50, 90, 99]
+STATS_MAX_DAYS = int(os.getenv('STATS_MAX_DAYS', '92'))  # Rango máximo por consulta
+
+# Métricas por endpoint y avisos de consultas sospechosas
+METRICS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]  # Segundos
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '10'))  # Misma consulta repetida en una petición
+ROWS_WARNING_THRESHOLD = int(os.getenv('ROWS_WARNING_THRESHOLD', '10000'))  # Renglones leídos en una petición
+
 # -----------------------------------------------------------------------
 # MODELOS
 # -----------------------------------------------------------------------
 
 class TempWallData(db.Model):
+    # Solo guarda la última lectura de cada grupo de cada muro (un renglón
+    # por muro y grupo). reading_id es el id de la lectura en WallData; el id
+    # propio del renglón no cambia al reemplazar la lectura.
+    __table_args__ = (db.Index('ix_temp_wall_data_wall_group', 'wall_id', 'group', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    reading_id = db.Column(db.Integer, nullable=False)
+    wall_id = db.Column(db.Integer, nullable=False, default=DEFAULT_WALL_ID, server_default=str(DEFAULT_WALL_ID))
     date = db.Column(db.DateTime, nullable=False)
     group = db.Column(db.Integer, nullable=False)
     propeller1 = db.Column(db.Float, nullable=False)
@@ -41,7 +277,8 @@ class TempWallData(db.Model):
     propeller4 = db.Column(db.Float, nullable=False)
     propeller5 = db.Column(db.Float, nullable=False)
 
-    def __init__(self, date, group, propeller1, propeller2, propeller3, propeller4, propeller5):    
+    def __init__(self, date, group, propeller1, propeller2, propeller3, propeller4, propeller5, wall_id=DEFAULT_WALL_ID):
+        self.wall_id = wall_id
         self.date = date
         self.group = group
         self.propeller1 = propeller1
@@ -52,7 +289,8 @@ class TempWallData(db.Model):
 
     def to_json(self):
         return {
-            'id': self.id,  # Siempre es buena idea incluir el id también
+            'id': self.reading_id,  # El id de la lectura en WallData
+            'wall_id': self.wall_id,
             'date': self.date.strftime('%Y-%m-%d %H:%M:%S'),
             'group': self.group,
             'propeller1': self.propeller1,
@@ -67,8 +305,17 @@ class TempWallData(db.Model):
 
 
 class WallData(db.Model):
+    # En PostgreSQL la tabla está particionada por mes sobre `date` (ver
+    # PARTICIONES), en SQLite es una tabla normal. Las consultas de un muro
+    # van por los índices que empiezan con wall_id.
+    __table_args__ = (
+        db.Index('ix_wall_data_wall_date', 'wall_id', 'date'),
+        db.Index('ix_wall_data_wall_id', 'wall_id', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    date = db.Column(db.DateTime, nullable=False)
+    wall_id = db.Column(db.Integer, nullable=False, default=DEFAULT_WALL_ID, server_default=str(DEFAULT_WALL_ID))
+    date = db.Column(db.DateTime, nullable=False, index=True)
     group = db.Column(db.Integer, nullable=False)
     propeller1 = db.Column(db.Float, nullable=False)
     propeller2 = db.Column(db.Float, nullable=False)
@@ -76,7 +323,8 @@ class WallData(db.Model):
     propeller4 = db.Column(db.Float, nullable=False)
     propeller5 = db.Column(db.Float, nullable=False)
 
-    def __init__(self, date, group, propeller1, propeller2, propeller3, propeller4, propeller5):    
+    def __init__(self, date, group, propeller1, propeller2, propeller3, propeller4, propeller5, wall_id=DEFAULT_WALL_ID):
+        self.wall_id = wall_id
         self.date = date
         self.group = group
         self.propeller1 = propeller1
@@ -88,6 +336,7 @@ class WallData(db.Model):
     def to_json(self):
         return {
             'id': self.id,  # Siempre es buena idea incluir el id también
+            'wall_id': self.wall_id,
             'date': self.date.strftime('%Y-%m-%d %H:%M:%S'),
             'group': self.group,
             'propeller1': self.propeller1,
@@ -102,14 +351,18 @@ class WallData(db.Model):
 
 # -----------------------------------------------------------------------
 class TotalDay(db.Model):
+    __table_args__ = (db.Index('ix_total_day_wall_date', 'wall_id', 'date', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    wall_id = db.Column(db.Integer, nullable=False, default=DEFAULT_WALL_ID, server_default=str(DEFAULT_WALL_ID))
     date = db.Column(db.Date, nullable=False)
     total = db.Column(db.Float, nullable=False)
     group1 = db.Column(db.Float, nullable=False)
     group2 = db.Column(db.Float, nullable=False)
     group3 = db.Column(db.Float, nullable=False)
 
-    def __init__(self, date, total, group1, group2, group3):
+    def __init__(self, date, total, group1, group2, group3, wall_id=DEFAULT_WALL_ID):
+        self.wall_id = wall_id
         self.date = date
         self.total = total
         self.group1 = group1
@@ -131,11 +384,15 @@ class TotalDay(db.Model):
 
 # -----------------------------------------------------------------------
 class TotalMonth(db.Model):
+    __table_args__ = (db.Index('ix_total_month_wall_date', 'wall_id', 'date', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    wall_id = db.Column(db.Integer, nullable=False, default=DEFAULT_WALL_ID, server_default=str(DEFAULT_WALL_ID))
     date = db.Column(db.Date, nullable=False)
     total = db.Column(db.Float, nullable=False)
 
-    def __init__(self, date, total):
+    def __init__(self, date, total, wall_id=DEFAULT_WALL_ID):
+        self.wall_id = wall_id
         self.date = date
         self.total = total
 
@@ -150,10 +407,15 @@ class TotalMonth(db.Model):
         return '<TotalMonth %r>' % self.total
 # -----------------------------------------------------------------------
 class TotalAll(db.Model):
+    # Un renglón por muro con su total general
+    __table_args__ = (db.Index('ix_total_all_wall_id', 'wall_id', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    wall_id = db.Column(db.Integer, nullable=False, default=DEFAULT_WALL_ID, server_default=str(DEFAULT_WALL_ID))
     total = db.Column(db.Float, nullable=False)
 
-    def __init__(self, total):
+    def __init__(self, total, wall_id=DEFAULT_WALL_ID):
+        self.wall_id = wall_id
         self.total = total
 
     def to_json(self):
@@ -165,13 +427,156 @@ class TotalAll(db.Model):
     def __repr__(self):
         return '<TotalAll %r>' % self.total
 
+# -----------------------------------------------------------------------
+class TotalCalendar(db.Model):
+    # Total acumulado por día del mes (kind='day', number 1-31) y por mes del
+    # año (kind='month', number 1-12) de todos los años de cada muro, para
+    # getDayByNumber y readAllMonths. Se actualiza junto con TotalDay y TotalMonth.
+    __table_args__ = (db.Index('ix_total_calendar_wall_kind_number', 'wall_id', 'kind', 'number', unique=True),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    wall_id = db.Column(db.Integer, nullable=False, default=DEFAULT_WALL_ID, server_default=str(DEFAULT_WALL_ID))
+    kind = db.Column(db.String(8), nullable=False)
+    number = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<TotalCalendar %r %r>' % (self.kind, self.number)
+
+# -----------------------------------------------------------------------
+class BucketTotals:
+    # Columnas comunes de TotalMinute y TotalHour: por cada hélice se guarda
+    # la suma de la velocidad (propellerN) y de la potencia p**2/216*1000 (powerN)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    wall_id = db.Column(db.Integer, nullable=False, default=DEFAULT_WALL_ID, server_default=str(DEFAULT_WALL_ID))
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    group = db.Column(db.Integer, nullable=False)
+    readings = db.Column(db.Integer, nullable=False, default=0)
+    propeller1 = db.Column(db.Float, nullable=False, default=0)
+    propeller2 = db.Column(db.Float, nullable=False, default=0)
+    propeller3 = db.Column(db.Float, nullable=False, default=0)
+    propeller4 = db.Column(db.Float, nullable=False, default=0)
+    propeller5 = db.Column(db.Float, nullable=False, default=0)
+    power1 = db.Column(db.Float, nullable=False, default=0)
+    power2 = db.Column(db.Float, nullable=False, default=0)
+    power3 = db.Column(db.Float, nullable=False, default=0)
+    power4 = db.Column(db.Float, nullable=False, default=0)
+    power5 = db.Column(db.Float, nullable=False, default=0)
+
+    def to_json(self):
+        return {
+            'id': self.id,
+            'bucketStart': self.bucket_start.strftime('%Y-%m-%d %H:%M:%S'),
+            'group': self.group,
+            'readings': self.readings,
+            'propeller1': self.propeller1,
+            'propeller2': self.propeller2,
+            'propeller3': self.propeller3,
+            'propeller4': self.propeller4,
+            'propeller5': self.propeller5,
+            'power1': self.power1,
+            'power2': self.power2,
+            'power3': self.power3,
+            'power4': self.power4,
+            'power5': self.power5
+        }
+
+class TotalMinute(BucketTotals, db.Model):
+    __table_args__ = (db.Index('ix_total_minute_wall_bucket_group', 'wall_id', 'bucket_start', 'group', unique=True),)
+
+    def __repr__(self):
+        return '<TotalMinute %r>' % self.bucket_start
+
+class TotalHour(BucketTotals, db.Model):
+    __table_args__ = (db.Index('ix_total_hour_wall_bucket_group', 'wall_id', 'bucket_start', 'group', unique=True),)
+
+    def __repr__(self):
+        return '<TotalHour %r>' % self.bucket_start
+
+# -----------------------------------------------------------------------
+class DeviceStatus(db.Model):
+    # Último estado conocido de cada dispositivo, un solo renglón por dispositivo
+    # de cada muro (todos los muros usan el mismo nombre de dispositivo)
+    wall_id = db.Column(db.Integer, primary_key=True, default=DEFAULT_WALL_ID, server_default=str(DEFAULT_WALL_ID))
+    device = db.Column(db.String(64), primary_key=True)
+    status = db.Column(db.Integer, nullable=False, default=0)  # 0 = offline, 1 = online
+    last_update = db.Column(db.DateTime, nullable=False)  # Guardar en UTC
+
+    def __repr__(self):
+        return '<DeviceStatus %r>' % ((self.wall_id, self.device),)
+
+# -----------------------------------------------------------------------
+class DataVersion(db.Model):
+    # Contador que sube con cada escritura, de él salen los ETag de los GET
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<DataVersion %r>' % self.version
+
+# -----------------------------------------------------------------------
+class DeleteJob(db.Model):
+    # Estado de un borrado masivo que corre en segundo plano. Vive en la base
+    # para que cualquier worker pueda responder por él.
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)  # resetAll, deleteAllZeros, deleteRangeWallData, rebuildRollups
+    status = db.Column(db.String(16), nullable=False, default='running')  # running, done, failed
+    deleted = db.Column(db.Integer, nullable=False, default=0)
+    batches = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)  # Guardar en UTC
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_json(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'deleted': self.deleted,
+            'batches': self.batches,
+            'error': self.error,
+            'createdAt': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'finishedAt': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return '<DeleteJob %r>' % self.id
+
+# -----------------------------------------------------------------------
+class ArchiveFile(db.Model):
+    # Archivo con lecturas crudas que la retención sacó de WallData. Un día
+    # de un muro puede tener varios (si llegaron lecturas después de
+    # archivarlo); cada uno guarda los ids [first_id, last_id] de ese día.
+    __table_args__ = (db.Index('ix_archive_file_wall_date', 'wall_id', 'date'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    wall_id = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    path = db.Column(db.String(255), nullable=False)  # Relativa a RETENTION_ARCHIVE_DIR
+    format = db.Column(db.String(16), nullable=False)  # csv (con gzip), parquet o dropped (partición borrada, sin archivo)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    rows = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)  # Guardar en UTC
+
+    def __repr__(self):
+        return '<ArchiveFile %r>' % self.path
+
+# -----------------------------------------------------------------------
 class SystemStatus(db.Model):
+    # Historial de cambios de estado de cada dispositivo
+    __table_args__ = (db.Index('ix_system_status_wall_id', 'wall_id', 'id'),)
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    wall_id = db.Column(db.Integer, nullable=False, default=DEFAULT_WALL_ID, server_default=str(DEFAULT_WALL_ID))
+    device = db.Column(db.String(64), nullable=False, default=DEFAULT_DEVICE, server_default=DEFAULT_DEVICE)
     status = db.Column(db.Integer, nullable=False, default=0)  # 0 = offline, 1 = online
-    last_update = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.utc))  # Guardar en UTC
+    last_update = db.Column(db.DateTime, nullable=False, index=True, default=lambda: datetime.now(pytz.utc))  # Guardar en UTC
 
-    def __init__(self, status):
+    def __init__(self, status, device=DEFAULT_DEVICE, wall_id=DEFAULT_WALL_ID):
         self.status = status
+        self.device = device
+        self.wall_id = wall_id
         self.last_update = datetime.now(pytz.utc)  # Guardar en UTC
 
     def to_json(self):
@@ -189,71 +594,735 @@ class SystemStatus(db.Model):
 # INICIO DE | FUNCIONES
 # -----------------------------------------------------------------------
 
-def update_total_day(today, total_sum, sum_group1, sum_group2, sum_group3):
+def upsert_insert(model):
+    # INSERT ... ON CONFLICT existe en PostgreSQL y SQLite pero cada dialecto
+    # tiene su propia construcción en SQLAlchemy
+    if db.engine.dialect.name == 'postgresql':
+        return pg_insert(model)
+    return sqlite_insert(model)
 
-    today_object = TotalDay.query.filter_by(date=today).first()
+# -----------------------------------------------------------------------
+def chunked(items, size):
+    # Parte una lista en bloques de `size` elementos
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
-    # Si no existe un objeto con la fecha de hoy, crear uno nuevo
-    if today_object is None:
-        new_total_day = TotalDay(date=today, total=total_sum, group1=sum_group1, group2=sum_group2, group3=sum_group3)
-        db.session.add(new_total_day)
-        db.session.commit()
-    
-    # Si ya existe un objeto con la fecha de hoy, actualizarlo
-    else:
-        today_object.total += total_sum
-        today_object.group1 += sum_group1
-        today_object.group2 += sum_group2
-        today_object.group3 += sum_group3
-        db.session.commit()
 # -----------------------------------------------------------------------
-def update_total_month(month, total_sum):
-    # Ensure month is a datetime object and convert to Mexico City timezone
-    if isinstance(month, str):
-        month = datetime.strptime(month, '%Y-%m')
-    month = mexico_tz.localize(month)
+def lock_rollup_days(keys, exclusive=False, session=None):
+    # Advisory locks de transacción por (muro, día) en PostgreSQL. La ingesta,
+    # los borrados y las importaciones toman el compartido de cada (muro, día)
+    # que tocan y el de (todos los muros, día); rebuild_day_range toma el
+    # exclusivo. Así un recálculo (DELETE + INSERT ... SELECT) nunca se cruza
+    # con un UPSERT de los mismos días: el incremento se perdería o chocaría
+    # con la llave única. Se sueltan con el commit. En SQLite no hace falta,
+    # la base tiene un solo escritor a la vez.
+    if db.engine.dialect.name != 'postgresql':
+        return
+    session = session or db.session
+    keys = set(keys)
+    shared = {(ROLLUP_LOCK_ALL_WALLS, day) for wall_id, day in keys if wall_id != ROLLUP_LOCK_ALL_WALLS}
+    if not exclusive:
+        keys, shared = set(), keys | shared
+
+    # Siempre en el mismo orden para que dos transacciones no se bloqueen mutuamente
+    for function, group in (('pg_advisory_xact_lock_shared', shared), ('pg_advisory_xact_lock', keys)):
+        if group:
+            ordered = sorted(group)
+            session.execute(
+                text(f'SELECT {function}(k.wall_id, k.day) FROM unnest(CAST(:walls AS integer[]), CAST(:days AS integer[])) AS k(wall_id, day)'),
+                {'walls': [wall_id for wall_id, _ in ordered], 'days': [day.toordinal() for _, day in ordered]}
+            )
 
-    # Use the first day of the month for the query
-    month_start = month.replace(day=1).date()
+# -----------------------------------------------------------------------
+def update_totals(days, months, total_all, session=None):
+    # Suma los incrementos a TotalDay, TotalMonth y TotalAll con un solo
+    # INSERT ... ON CONFLICT DO UPDATE por tabla (por bloque de UPSERT_CHUNK). El incremento se hace en la
+    # base de datos, así que dos workers en paralelo no se pisan.
+    # days y months van por (muro, fecha) y total_all por muro, como los regresa fold_totals.
+    # No hace commit, el commit lo hace quien llama.
+    # Regresa los totales ya actualizados (para el stream en vivo).
+    session = session or db.session
+    totals = {'day': {}, 'month': {}, 'all': {}}
+    lock_rollup_days(days.keys(), session=session)
+
+    day_values = [
+        {'wall_id': wall_id, 'date': day, 'total': total_sum, 'group1': sum_group1, 'group2': sum_group2, 'group3': sum_group3}
+        for (wall_id, day), (total_sum, sum_group1, sum_group2, sum_group3) in days.items()
+    ]
+    for values in chunked(day_values, UPSERT_CHUNK):
+        stmt = upsert_insert(TotalDay).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TotalDay.wall_id, TotalDay.date],
+            set_={
+                'total': TotalDay.total + stmt.excluded.total,
+                'group1': TotalDay.group1 + stmt.excluded.group1,
+                'group2': TotalDay.group2 + stmt.excluded.group2,
+                'group3': TotalDay.group3 + stmt.excluded.group3,
+            }
+        ).returning(TotalDay.wall_id, TotalDay.date, TotalDay.total, TotalDay.group1, TotalDay.group2, TotalDay.group3)
+        for wall_id, day, total, group1, group2, group3 in session.execute(stmt):
+            totals['day'][(wall_id, day)] = {
+                'date': day.strftime('%Y-%m-%d'),
+                'total': total,
+                'group1': group1,
+                'group2': group2,
+                'group3': group3
+            }
+
+    month_values = [
+        {'wall_id': wall_id, 'date': month_start, 'total': total_sum}
+        for (wall_id, month_start), total_sum in months.items()
+    ]
+    for values in chunked(month_values, UPSERT_CHUNK):
+        stmt = upsert_insert(TotalMonth).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TotalMonth.wall_id, TotalMonth.date],
+            set_={'total': TotalMonth.total + stmt.excluded.total}
+        ).returning(TotalMonth.wall_id, TotalMonth.date, TotalMonth.total)
+        for wall_id, month_start, total in session.execute(stmt):
+            totals['month'][(wall_id, month_start)] = {'date': month_start.strftime('%Y-%m'), 'total': total}
+
+    # Totales por día del mes y por mes del año
+    calendar = {}
+    for (wall_id, day), (total_sum, _, _, _) in days.items():
+        calendar[(wall_id, 'day', day.day)] = calendar.get((wall_id, 'day', day.day), 0) + total_sum
+    for (wall_id, month_start), total_sum in months.items():
+        calendar[(wall_id, 'month', month_start.month)] = calendar.get((wall_id, 'month', month_start.month), 0) + total_sum
+    if calendar:
+        stmt = upsert_insert(TotalCalendar).values([
+            {'wall_id': wall_id, 'kind': kind, 'number': number, 'total': total_sum}
+            for (wall_id, kind, number), total_sum in calendar.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TotalCalendar.wall_id, TotalCalendar.kind, TotalCalendar.number],
+            set_={'total': TotalCalendar.total + stmt.excluded.total}
+        )
+        session.execute(stmt)
 
-    month_object = TotalMonth.query.filter_by(date=month_start).first()
+    all_values = [{'wall_id': wall_id, 'total': total_sum} for wall_id, total_sum in total_all.items() if total_sum]
+    if all_values:
+        # TotalAll tiene un renglón por muro
+        stmt = upsert_insert(TotalAll).values(all_values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TotalAll.wall_id],
+            set_={'total': TotalAll.total + stmt.excluded.total}
+        ).returning(TotalAll.wall_id, TotalAll.total)
+        for wall_id, total in session.execute(stmt):
+            totals['all'][wall_id] = {'total': total}
 
+    return totals
 
-    print(month_start)
+# -----------------------------------------------------------------------
+def bump_data_version(session=None):
+    # Sube la versión de los datos dentro de la transacción actual,
+    # así la versión solo cambia si la escritura se confirma
+    session = session or db.session
+    stmt = upsert_insert(DataVersion).values(id=DATA_VERSION_ID, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DataVersion.id],
+        set_={'version': DataVersion.version + 1}
+    )
+    session.execute(stmt)
+    session.info['data_version_bumped'] = True
 
-    print(month_object)
-    # If no object exists with the given date, create a new one
-    if month_object is None:
-        new_total_month = TotalMonth(date=month_start, total=total_sum)
-        db.session.add(new_total_month)
-        db.session.commit()
-    
-    # If an object already exists with the given date, update it
+# -----------------------------------------------------------------------
+def parse_reading(data):
+    # Convierte una lectura del sensor en un diccionario listo para insertar.
+    # Si la lectura trae su propia fecha se respeta, si no se usa la hora actual.
+    if 'date' in data and data['date']:
+        date = datetime.strptime(data['date'], '%Y-%m-%d %H:%M:%S')
     else:
-        month_object.total += total_sum
-        db.session.commit()
+        date = datetime.now(mexico_tz).replace(tzinfo=None, microsecond=0)
+
+    return {
+        'wall_id': int(data.get('wall_id', DEFAULT_WALL_ID)),
+        'date': date,
+        'group': int(data['group']),
+        'propeller1': float(data['propeller1']),
+        'propeller2': float(data['propeller2']),
+        'propeller3': float(data['propeller3']),
+        'propeller4': float(data['propeller4']),
+        'propeller5': float(data['propeller5']),
+    }
 
 # -----------------------------------------------------------------------
-def update_total_all(total_sum):
+def parse_query_date(value):
+    # Fechas de los parámetros de consulta: 'YYYY-MM-DD' o 'YYYY-MM-DD HH:MM:SS'
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(value)
 
-    total_object = TotalAll.query.first()
+def current_wall():
+    # Muro de la petición (?wall_id=N); todas las consultas se limitan a él
+    return request.args.get('wall_id', DEFAULT_WALL_ID, type=int)
 
-    # Si no existe un objeto crear uno nuevo
-    # Esto solo debería pasar la primera vez que se corre el programa
-    if total_object is None:
-        new_total_all = TotalAll(total=total_sum)
-        db.session.add(new_total_all)
-        db.session.commit()
-    
-    # Si ya existe un objeto con la fecha de hoy, actualizarlo
-    else:
-        total_object.total += total_sum
-        db.session.commit()
+# -----------------------------------------------------------------------
+def fold_totals(rows, days=None, months=None, total_all=None):
+    # Acumula en memoria los incrementos de TotalDay y TotalMonth por
+    # (muro, fecha) y de TotalAll por muro para un conjunto de lecturas, así
+    # se escribe una sola vez por día/mes. Si se pasan days/months/total_all
+    # se acumula sobre ellos (importación por bloques).
+    days = {} if days is None else days
+    months = {} if months is None else months
+    total_all = {} if total_all is None else total_all
+
+    for row in rows:
+        total_sum = row['propeller1'] + row['propeller2'] + row['propeller3'] + row['propeller4'] + row['propeller5']
+        wall_id = row['wall_id']
+        day = row['date'].date()
+        month = (wall_id, day.replace(day=1))
+
+        day_totals = days.setdefault((wall_id, day), [0, 0, 0, 0])
+        day_totals[0] += total_sum
+        day_totals[1] += row['propeller1'] + row['propeller2']
+        day_totals[2] += row['propeller3']
+        day_totals[3] += row['propeller4'] + row['propeller5']
+
+        months[month] = months.get(month, 0) + total_sum
+        total_all[wall_id] = total_all.get(wall_id, 0) + total_sum
+
+    return days, months, total_all
+
+# -----------------------------------------------------------------------
+def fold_minutes(rows, minutes=None):
+    # Acumula en memoria los incrementos de TotalMinute por (muro, inicio del
+    # minuto, grupo): lecturas, suma de cada hélice y de su potencia
+    # p**2/216*1000. Si se pasa `minutes` se acumula sobre él.
+    minutes = {} if minutes is None else minutes
+
+    for row in rows:
+        p1, p2, p3, p4, p5 = row['propeller1'], row['propeller2'], row['propeller3'], row['propeller4'], row['propeller5']
+        key = (row['wall_id'], row['date'].replace(second=0, microsecond=0), row['group'])
+        sums = minutes.get(key)
+        if sums is None:
+            sums = minutes[key] = [0] * 11
+        sums[0] += 1
+        sums[1] += p1
+        sums[2] += p2
+        sums[3] += p3
+        sums[4] += p4
+        sums[5] += p5
+        sums[6] += p1 ** 2/216 * 1000
+        sums[7] += p2 ** 2/216 * 1000
+        sums[8] += p3 ** 2/216 * 1000
+        sums[9] += p4 ** 2/216 * 1000
+        sums[10] += p5 ** 2/216 * 1000
+
+    return minutes
+
+def hours_from_minutes(minutes):
+    # TotalHour es la suma de los minutos de cada hora
+    hours = {}
+    for (wall_id, minute_start, group), sums in minutes.items():
+        hour_sums = hours.setdefault((wall_id, minute_start.replace(minute=0), group), [0] * 11)
+        for i, value in enumerate(sums):
+            hour_sums[i] += value
+    return hours
+
+def fold_buckets(rows):
+    # Incrementos de TotalMinute y TotalHour de un conjunto de lecturas
+    minutes = fold_minutes(rows)
+    return minutes, hours_from_minutes(minutes)
+
+# -----------------------------------------------------------------------
+def update_buckets(model, buckets, session=None):
+    # Suma los incrementos con INSERT ... ON CONFLICT DO UPDATE, sin commit.
+    # A diferencia de update_totals aquí no se necesita RETURNING, así que
+    # se manda una sola sentencia con executemany: se compila una vez sin
+    # importar cuántos buckets sean (una importación puede traer decenas de miles).
+    if not buckets:
+        return
+    session = session or db.session
+
+    columns = ['readings'] + [f'propeller{i}' for i in range(1, 6)] + [f'power{i}' for i in range(1, 6)]
+    bucket_values = [
+        dict(zip(columns, sums), wall_id=wall_id, bucket_start=bucket_start, group=group)
+        for (wall_id, bucket_start, group), sums in buckets.items()
+    ]
+
+    stmt = upsert_insert(model.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[model.wall_id, model.bucket_start, model.group],
+        set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in columns}
+    )
+    session.connection().execute(stmt, bucket_values)
+
+# -----------------------------------------------------------------------
+def update_rollups(rows, session=None):
+    # Actualiza todos los acumulados (día, mes, general, minuto y hora)
+    # de un conjunto de lecturas. No hace commit.
+    days, months, total_all = fold_totals(rows)
+    totals = update_totals(days, months, total_all, session)
+
+    minutes, hours = fold_buckets(rows)
+    update_buckets(TotalMinute, minutes, session)
+    update_buckets(TotalHour, hours, session)
+
+    return totals
+
+# -----------------------------------------------------------------------
+def update_temp_latest(rows, session=None):
+    # Reemplaza la última lectura de cada grupo de cada muro en TempWallData.
+    # Cada renglón debe traer el id que le tocó en WallData. No hace commit.
+    session = session or db.session
+    latest = {}
+    for row in rows:
+        key = (row['wall_id'], row['group'])
+        if key not in latest or row['id'] > latest[key]['id']:
+            latest[key] = row
+
+    columns = ['reading_id', 'date', 'propeller1', 'propeller2', 'propeller3', 'propeller4', 'propeller5']
+    stmt = upsert_insert(TempWallData).values([
+        dict({column: row[column] for column in columns[1:] + ['wall_id', 'group']}, reading_id=row['id'])
+        for row in latest.values()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TempWallData.wall_id, TempWallData.group],
+        set_={column: getattr(stmt.excluded, column) for column in columns}
+    )
+    session.execute(stmt)
+
+# -----------------------------------------------------------------------
+def store_readings(rows, session=None):
+    # Inserta las lecturas, actualiza TempWallData, los acumulados y la
+    # versión de los datos. No hace commit. Regresa las lecturas con su id
+    # y los totales actualizados.
+    session = session or db.session
+    ids = session.execute(
+        insert(WallData).returning(WallData.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    rows = [dict(row, id=wall_id) for row, wall_id in zip(rows, ids)]
+    update_temp_latest(rows, session)
+
+    totals = update_rollups(rows, session)
+
+    bump_data_version(session)
+    return rows, totals
+
+# -----------------------------------------------------------------------
+def save_readings(rows):
+    # Inserta las lecturas y actualiza los totales en una sola transacción
+    rows, totals = store_readings(rows)
+    db.session.commit()
+    invalidate_cache()
+    publish_readings(rows, totals)
+
+# -----------------------------------------------------------------------
+def list_response(query, fields, id_column, descending=False, convert=None):
+    # Respuesta común para las consultas que pueden regresar toda una tabla.
+    # `query` es un select() de columnas (no de modelos) en el orden de `fields`;
+    # `convert(rows)` puede ajustar un bloque de renglones antes de enviarlo.
+    #   ?limit=N&after_id=X  -> una página con paginación por llave (keyset) sobre el id
+    #   ?format=ndjson       -> un objeto JSON por línea (con limit, el siguiente
+    #                           after_id va en el header X-Next-After-Id)
+    #   ?format=columnar     -> una página por columnas: {"data": {"id": [...], ...}}
+    #   sin parámetros       -> la misma lista JSON de siempre, pero enviada por bloques
+    # En los casos sin página se lee con yield_per, así la memoria no crece con la tabla.
+    limit = request.args.get('limit', type=int)
+    after_id = request.args.get('after_id', type=int)
+    output_format = request.args.get('format', 'json')
+
+    if output_format not in ('json', 'ndjson', 'columnar'):
+        return jsonify({'error': "Invalid format. Use 'json', 'ndjson' or 'columnar'"}), 400
+
+    if after_id is not None:
+        query = query.where(id_column < after_id if descending else id_column > after_id)
+    query = query.order_by(id_column.desc() if descending else id_column)
+    convert = convert or (lambda rows: rows)
+
+    # El formato por columnas siempre va por páginas
+    if output_format == 'columnar' and limit is None:
+        limit = MAX_PAGE_SIZE
+
+    if limit is not None:
+        if limit <= 0 or limit > MAX_PAGE_SIZE:
+            return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+        page = convert(count_rows(db.session.execute(query.limit(limit)).all()))
+        next_after_id = page[-1][0] if len(page) == limit else None
+        if output_format == 'ndjson':
+            response = Response(render_chunk([dict(zip(fields, row)) for row in page], 'ndjson', True) if page else '',
+                                mimetype='application/x-ndjson')
+            if next_after_id is not None:
+                response.headers['X-Next-After-Id'] = str(next_after_id)
+            return response
+        if output_format == 'columnar':
+            columns = list(zip(*page)) or [()] * len(fields)
+            data = {field: list(values) for field, values in zip(fields, columns)}
+        else:
+            data = [dict(zip(fields, row)) for row in page]
+        return jsonify({'data': data, 'next_after_id': next_after_id})
+
+    def generate():
+        first = True
+
+        if output_format == 'json':
+            yield '['
+
+        result = db.session.connection().execution_options(yield_per=STREAM_CHUNK).execute(query)
+        for rows in result.partitions():
+            chunk = [dict(zip(fields, row)) for row in convert(count_rows(rows))]
+            yield render_chunk(chunk, output_format, first)
+            first = False
+
+        if output_format == 'json':
+            yield ']'
+
+    mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def render_chunk(chunk, output_format, first):
+    # Un bloque se codifica con una sola llamada al encoder
+    if output_format == 'ndjson':
+        return '\n'.join(app.json.dumps(item) for item in chunk) + '\n'
+    return ('' if first else ',') + app.json.dumps(chunk)[1:-1]
+
+# -----------------------------------------------------------------------
+mexico_offsets = {}
+
+def format_mexico_times(values):
+    # Fechas UTC -> texto 'YYYY-MM-DD HH:MM:SS' en hora de México. El
+    # desplazamiento solo cambia en horas completas, así que se calcula una
+    # vez por hora (con pytz) y no por renglón.
+    if len(mexico_offsets) > 100000:
+        mexico_offsets.clear()
+
+    formatted = []
+    for value in values:
+        hour = value.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+        offset = mexico_offsets.get(hour)
+        if offset is None:
+            offset = mexico_offsets[hour] = pytz.utc.localize(hour).astimezone(mexico_tz).utcoffset()
+        formatted.append((value.replace(tzinfo=None) + offset).isoformat(' ', 'seconds'))
+    return formatted
 
 # -----------------------------------------------------------------------
 # FIN DE | FUNCIONES
 # -----------------------------------------------------------------------
 
+# -----------------------------------------------------------------------
+# MÉTRICAS
+# -----------------------------------------------------------------------
+# Por cada petición se mide el tiempo total, cuántas sentencias SQL se
+# ejecutaron, cuánto tardaron y cuántos renglones se leyeron. Se regresa en
+# el header Server-Timing y se acumula por endpoint para /metrics.
+# Los renglones se cuentan al leerlos y no con cursor.rowcount, que en un
+# SELECT de SQLite o con cursores del lado del servidor vale -1: los objetos
+# que carga el ORM con el evento 'load' y los renglones de Core con
+# count_rows() en las rutas que los leen por columnas.
+
+metrics_lock = threading.Lock()
+endpoint_metrics = {}
+ingest_counters = {'accepted': 0, 'rejected': 0}
+
+def new_histogram():
+    return {'buckets': [0] * len(METRICS_BUCKETS), 'sum': 0.0, 'count': 0}
+
+def observe(histogram, value):
+    for i, bound in enumerate(METRICS_BUCKETS):
+        if value <= bound:
+            histogram['buckets'][i] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+def count_ingest(accepted, rejected):
+    with metrics_lock:
+        ingest_counters['accepted'] += accepted
+        ingest_counters['rejected'] += rejected
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql' in g:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and 'sql' in g):
+        return
+
+    sql = g.sql
+    sql['statements'] += 1
+    sql['seconds'] += time.perf_counter() - conn.info['query_start'].pop()
+    sql['repeated'][statement] = sql['repeated'].get(statement, 0) + 1
+
+@event.listens_for(Engine, 'handle_error')
+def handle_cursor_error(exception_context):
+    # Una sentencia que falla no llega a after_cursor_execute: sin esto su
+    # inicio se quedaría en la pila y la siguiente mediría desde ahí
+    conn = exception_context.connection
+    if conn is not None:
+        conn.info.pop('query_start', None)
+
+@event.listens_for(db.Model, 'load', propagate=True)
+def count_loaded_row(target, context):
+    if has_request_context() and 'sql' in g:
+        g.sql['rows'] += 1
+
+def count_rows(rows):
+    # Suma a la petición los renglones de Core que se acaban de leer. Regresa rows.
+    if has_request_context() and 'sql' in g:
+        g.sql['rows'] += len(rows)
+    return rows
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.sql = {'statements': 0, 'seconds': 0.0, 'rows': 0, 'repeated': {}}
+
+@app.after_request
+def finish_request_metrics(response):
+    if 'sql' not in g:
+        return response
+
+    elapsed = time.perf_counter() - g.request_start
+    sql = g.sql
+    response.headers['Server-Timing'] = (
+        f'app;dur={elapsed * 1000:.2f}, '
+        f'db;dur={sql["seconds"] * 1000:.2f};desc="{sql["statements"]} queries"'
+    )
+
+    # En las respuestas por bloques las consultas siguen después de este
+    # punto, así que se registra cuando se cierra la respuesta
+    endpoint = request.endpoint or 'unknown'
+    request_start = g.request_start
+    response.call_on_close(lambda: record_request_metrics(endpoint, request_start, sql))
+    return response
+
+def record_request_metrics(endpoint, request_start, sql):
+    elapsed = time.perf_counter() - request_start
+
+    with metrics_lock:
+        metrics = endpoint_metrics.setdefault(endpoint, {
+            'duration': new_histogram(),
+            'sql_duration': new_histogram(),
+            'sql_statements': 0,
+            'rows': 0,
+        })
+        observe(metrics['duration'], elapsed)
+        observe(metrics['sql_duration'], sql['seconds'])
+        metrics['sql_statements'] += sql['statements']
+        metrics['rows'] += sql['rows']
+
+    repeated = [(statement, times) for statement, times in sql['repeated'].items() if times >= N_PLUS_ONE_THRESHOLD]
+    for statement, times in repeated:
+        app.logger.warning('Posible N+1 en %s: la misma consulta se ejecutó %d veces: %s', endpoint, times, statement[:200])
+
+    if sql['rows'] > ROWS_WARNING_THRESHOLD:
+        app.logger.warning('%s leyó %d renglones en una sola petición', endpoint, sql['rows'])
+
+@app.route(BASE_URL + '/metrics', methods=['GET'])
+def get_metrics():
+    lines = []
+
+    def histogram_lines(name, help_text, key):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for endpoint, metrics in sorted(endpoint_metrics.items()):
+            histogram = metrics[key]
+            for bound, value in zip(METRICS_BUCKETS, histogram['buckets']):
+                lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {value}')
+            lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {histogram["sum"]:.6f}')
+            lines.append(f'{name}_count{{endpoint="{endpoint}"}} {histogram["count"]}')
+
+    def counter_lines(name, help_text, key):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for endpoint, metrics in sorted(endpoint_metrics.items()):
+            lines.append(f'{name}{{endpoint="{endpoint}"}} {metrics[key]}')
+
+    with metrics_lock:
+        histogram_lines('muro_request_duration_seconds', 'Tiempo total de la petición', 'duration')
+        histogram_lines('muro_sql_duration_seconds', 'Tiempo en SQL por petición', 'sql_duration')
+        counter_lines('muro_sql_statements_total', 'Sentencias SQL ejecutadas', 'sql_statements')
+        counter_lines('muro_rows_fetched_total', 'Renglones leídos de la base de datos', 'rows')
+
+        lines.append('# HELP muro_ingest_readings_total Lecturas recibidas por /new y /newBatch')
+        lines.append('# TYPE muro_ingest_readings_total counter')
+        lines.append(f'muro_ingest_readings_total{{result="accepted"}} {ingest_counters["accepted"]}')
+        lines.append(f'muro_ingest_readings_total{{result="rejected"}} {ingest_counters["rejected"]}')
+
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# -----------------------------------------------------------------------
+# CACHÉ DE RESPUESTAS
+# -----------------------------------------------------------------------
+# Las respuestas se guardan con una llave "generación:endpoint?args". Cada
+# escritura sube la generación, así nada de lo que se leyó antes de la
+# escritura se vuelve a servir aunque se guarde tarde.
+
+class LocalCacheBackend:
+    # LRU con TTL en memoria del proceso
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.current_generation = 0
+        self.lock = threading.Lock()
+
+    def generation(self):
+        return self.current_generation
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        with self.lock:
+            self.current_generation += 1
+            self.entries.clear()
+
+class RedisCacheBackend:
+    # Mismo contrato que LocalCacheBackend pero compartido por todos los workers.
+    # El desalojo LRU lo hace Redis (maxmemory-policy allkeys-lru).
+    GENERATION_KEY = 'muro_eolico:cache:generation'
+
+    def __init__(self, url):
+        import redis  # Solo se necesita si se configura CACHE_REDIS_URL
+        self.client = redis.Redis.from_url(url)
+
+    def generation(self):
+        return int(self.client.get(self.GENERATION_KEY) or 0)
+
+    def get(self, key):
+        return self.client.get('muro_eolico:cache:' + key)
+
+    def set(self, key, value, ttl):
+        self.client.setex('muro_eolico:cache:' + key, ttl, value)
+
+    def invalidate(self):
+        self.client.incr(self.GENERATION_KEY)
+
+cache_backend = RedisCacheBackend(CACHE_REDIS_URL) if CACHE_REDIS_URL else LocalCacheBackend(CACHE_MAX_ENTRIES)
+cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def cached_response(view):
+    # Decorador para GETs que solo cambian cuando se escriben lecturas o se borran datos
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if CACHE_TTL <= 0:
+            return view(*args, **kwargs)
+
+        # El ETag (versión de los datos + día) también va en la llave, así otro
+        # worker que ya vio una escritura nunca sirve una respuesta anterior
+        generation = cache_backend.generation()
+        key = f'{generation}:{g.get("etag", "")}:{request.full_path}'
+
+        body = cache_backend.get(key)
+        if body is not None:
+            cache_stats['hits'] += 1
+            return Response(body, mimetype='application/json')
+
+        cache_stats['misses'] += 1
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            cache_backend.set(key, response.get_data(), CACHE_TTL)
+        return response
+
+    return wrapper
+
+def invalidate_cache():
+    # Se llama después de cada commit que cambia WallData o los totales
+    cache_backend.invalidate()
+    cache_stats['invalidations'] += 1
+
+# -----------------------------------------------------------------------
+# ETAG
+# -----------------------------------------------------------------------
+# El ETag de cualquier GET sale de la versión de los datos y de la fecha de hoy
+# (varios endpoints dependen del día actual). Si el cliente manda el mismo
+# ETag en If-None-Match se responde 304 sin hacer las consultas del endpoint.
+
+ETAG_EXEMPT = {'get_ingest_status', 'get_cache_status', 'get_status', 'stream_readings', 'get_metrics', 'get_delete_job'}  # Cambian sin escrituras
+
+# La versión se guarda en memoria del proceso y DataVersion solo se vuelve a
+# leer cuando este proceso confirma una transacción que la subió, cuando cambia
+# la generación del caché (con Redis, también por escrituras de otros workers)
+# o pasados DATA_VERSION_TTL segundos.
+
+data_version_commits = itertools.count(1)
+data_version_epoch = 0  # Cambia con cada commit de este proceso que subió la versión
+data_version_memo = None  # (generación del caché, época, versión, expira)
+
+@event.listens_for(Session, 'after_commit')
+def forget_data_version(session):
+    global data_version_epoch
+    if session.info.pop('data_version_bumped', False):
+        data_version_epoch = next(data_version_commits)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_data_version_bump(session):
+    session.info.pop('data_version_bumped', None)
+
+def current_data_version():
+    global data_version_memo
+    # La generación y la época se leen antes que la versión: si entre las dos
+    # se confirma una escritura, la siguiente petición ve otra llave y la relee
+    generation, epoch = cache_backend.generation(), data_version_epoch
+    memo = data_version_memo
+    if memo is not None and memo[:2] == (generation, epoch) and memo[3] > time.monotonic():
+        return memo[2]
+
+    version = db.session.execute(
+        select(DataVersion.version).where(DataVersion.id == DATA_VERSION_ID)
+    ).scalar() or 0
+    data_version_memo = (generation, epoch, version, time.monotonic() + DATA_VERSION_TTL)
+    return version
+
+@app.before_request
+def check_etag():
+    if request.method != 'GET' or request.endpoint is None or request.endpoint in ETAG_EXEMPT:
+        return None
+
+    version = current_data_version()
+    today = datetime.now(mexico_tz).strftime('%Y%m%d')
+    g.etag = f'v{version}-{today}'
+
+    if request.if_none_match.contains(g.etag):
+        response = Response(status=304)
+        response.set_etag(g.etag)
+        return response
+
+    return None
+
+@app.after_request
+def set_etag(response):
+    etag = g.get('etag')
+    if etag and response.status_code == 200:
+        response.set_etag(etag)
+    return response
+
+@app.route(BASE_URL + '/cacheStatus', methods=['GET'])
+def get_cache_status():
+    lookups = cache_stats['hits'] + cache_stats['misses']
+    return jsonify({
+        'backend': 'redis' if CACHE_REDIS_URL else 'local',
+        'ttl': CACHE_TTL,
+        'hits': cache_stats['hits'],
+        'misses': cache_stats['misses'],
+        'invalidations': cache_stats['invalidations'],
+        'hit_ratio': round(cache_stats['hits'] / lookups, 4) if lookups else 0,
+    })
+
 # --- MAIN -------------------------------------------------------------
 @app.route('/')
 def index():
@@ -267,11 +1336,8 @@ def create():
     # Definir la fecha de hoy
     date = datetime.now(mexico_tz) # Fecha que irá en WallData
 
-    date_time = date.strftime('%Y-%m-%d %H:%M:%S') # Fecha que irá en WallData
-    today = date.strftime('%Y-%m-%d') # Fecha que irá en TotalDay
-    month = date.strftime('%Y-%m') # Fecha que irá en TotalMonth
+    date_time = date.replace(tzinfo=None, microsecond=0) # Fecha que irá en WallData
 
-    print(date)
     # Obtener los datos del request
     data = request.get_json()
 
@@ -280,51 +1346,90 @@ def create():
 
     else:
 
+        # Validar y convertir la lectura completa antes de sumar: un
+        # "propeller1": "a" es un 400, no un error al calcular el total, y el
+        # grupo queda entero (el stream lo compara con el ?group= de cada cliente)
+        try:
+            row = parse_reading(data)
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid reading: {e}'}), 400
+        row['date'] = date_time
+
         # Sacar el total generado para actualizar los demás
-        total_sum = data['propeller1'] + data['propeller2'] + data['propeller3'] + data['propeller4'] + data['propeller5']
-
-        # Crear un nuevo objeto WallData
-        new_wall_data = WallData(
-            date=date_time,
-            group=data['group'],
-            propeller1=data['propeller1'],
-            propeller2=data['propeller2'],
-            propeller3=data['propeller3'],
-            propeller4=data['propeller4'],
-            propeller5=data['propeller5']
-        )
-        new_TempWall_data = TempWallData(
-            date=date_time,
-            group=data['group'],
-            propeller1=data['propeller1'],
-            propeller2=data['propeller2'],
-            propeller3=data['propeller3'],
-            propeller4=data['propeller4'],
-            propeller5=data['propeller5']
-        )
+        total_sum = row['propeller1'] + row['propeller2'] + row['propeller3'] + row['propeller4'] + row['propeller5']
 
         if total_sum >= 0.2:
+            if INGEST_BUFFER_ENABLED:
+                try:
+                    ingest_queue.put_nowait(row)
+                except queue.Full:
+                    return jsonify({'error': 'Ingest buffer is full, try again later'}), 503
+
+                count_ingest(1, 0)
+                return jsonify(dict(row, date=date_time.strftime('%Y-%m-%d %H:%M:%S'))), 202
+
+            # Crear un nuevo objeto WallData
+            new_wall_data = WallData(**row)
+
             # Guardar el objeto en la base de datos
             db.session.add(new_wall_data)
-            db.session.add(new_TempWall_data)
-
-            # Actualizar el total del día
-            sum_group1 = data['propeller1'] + data['propeller2'] 
-            sum_group2 = data['propeller3']
-            sum_group3 = data['propeller4'] + data['propeller5']
+            db.session.flush()  # Para tener el id que también va en TempWallData
 
-            update_total_day(today, total_sum, sum_group1, sum_group2, sum_group3)
+            row['id'] = new_wall_data.id
+            update_temp_latest([row])
 
-            # Actualizar el total del mes
-            update_total_month(month, total_sum)
+            # Actualizar los totales (día, mes, general, minuto y hora) en la misma transacción
+            totals = update_rollups([row])
 
-            # Actualizar el total general
-            update_total_all(total_sum)
+            bump_data_version()
+            db.session.commit()
+            invalidate_cache()
+            publish_readings([row], totals)
+            count_ingest(1, 0)
 
             return jsonify(new_wall_data.to_json())
         else:
+            count_ingest(0, 1)
             return jsonify({'message': 'Data not saved. Total sum is less than 0.2'})
 
+@app.route(BASE_URL + '/newBatch', methods=['POST'])
+def create_batch():
+    data = request.get_json(silent=True)
+
+    # Se acepta una lista de lecturas o un objeto con la llave 'readings'
+    # (y opcionalmente 'wall_id' para todas las lecturas del lote)
+    wall_id = DEFAULT_WALL_ID
+    if isinstance(data, dict):
+        wall_id = data.get('wall_id', DEFAULT_WALL_ID)
+        data = data.get('readings')
+
+    if not isinstance(data, list) or len(data) == 0:
+        abort(400)
+
+    try:
+        readings = [parse_reading(dict({'wall_id': wall_id}, **item)) for item in data]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid reading: {e}'}), 400
+
+    # Aplicar el mismo umbral que /new
+    accepted = [
+        row for row in readings
+        if row['propeller1'] + row['propeller2'] + row['propeller3'] + row['propeller4'] + row['propeller5'] >= 0.2
+    ]
+
+    if accepted:
+        # Insertar todas las lecturas en un solo executemany y actualizar
+        # los totales una vez por día/mes del lote
+        save_readings(accepted)
+
+    count_ingest(len(accepted), len(readings) - len(accepted))
+
+    return jsonify({
+        'received': len(readings),
+        'saved': len(accepted),
+        'rejected': len(readings) - len(accepted)
+    })
+
 @app.route(BASE_URL + "/update", methods=["POST"])
 def update_status():
     try:
@@ -336,42 +1441,1489 @@ def update_status():
         if new_status not in [0, 1]:
             return jsonify({"error": "Invalid status value. Must be 0 or 1"}), 400
 
-        # Guardar el nuevo estado con timestamp actual
-        new_log = SystemStatus(status=new_status)
-        db.session.add(new_log)
-        db.session.commit()
+        device = str(data.get("device", DEFAULT_DEVICE))
+        wall_id = int(data.get("wall_id", DEFAULT_WALL_ID))
+
+        # Actualizar el estado en memoria, solo se escribe en la base si cambió
+        last_update = record_heartbeat(device, new_status, wall_id=wall_id)
 
         return jsonify({
             "message": "New status recorded",
             "status": new_status,
-            "lastUpdate": new_log.last_update.strftime('%Y-%m-%d %H:%M:%S')
+            "lastUpdate": last_update.strftime('%Y-%m-%d %H:%M:%S')
         }), 200
 
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 
+# --- HEARTBEAT ---------------------------------------------------------
+# El último estado de cada dispositivo vive en memoria, con llave (muro, dispositivo). En la base solo se
+# escribe un renglón de SystemStatus cuando el estado cambia (0→1, 1→0) y el
+# renglón de DeviceStatus se refresca cada HEARTBEAT_PERSIST_SECONDS para que
+# los otros workers y el monitor vean la última señal.
+
+device_states = {}
+device_states_lock = threading.Lock()
+monitor_lock = None  # Candado del proceso que revisa los timeouts
+
+def load_device_state(device, session=None, wall_id=DEFAULT_WALL_ID):
+    row = (session or db.session).get(DeviceStatus, (wall_id, device))
+    if row is None:
+        return None
+
+    last_update = row.last_update.replace(tzinfo=pytz.utc)
+    return {'status': row.status, 'last_update': last_update, 'persisted': last_update, 'synced_at': time.monotonic()}
+
+def get_device_state(device, session=None, wall_id=DEFAULT_WALL_ID):
+    # Si la copia en memoria es vieja se vuelve a leer de la base, por si
+    # la señal llegó a otro worker
+    key = (wall_id, device)
+    with device_states_lock:
+        state = device_states.get(key)
+
+    if state is None or time.monotonic() - state['synced_at'] > HEARTBEAT_PERSIST_SECONDS:
+        loaded = load_device_state(device, session, wall_id)
+        with device_states_lock:
+            current = device_states.get(key)
+            if loaded is not None and (current is None or loaded['last_update'] >= current['last_update']):
+                device_states[key] = loaded
+            elif current is not None:
+                current['synced_at'] = time.monotonic()
+            state = device_states.get(key)
+
+    return dict(state) if state else None
+
+def record_heartbeat(device, status, session=None, wall_id=DEFAULT_WALL_ID):
+    session = session or db.session
+    now = datetime.now(pytz.utc)
+    previous = get_device_state(device, session, wall_id)
+
+    transition = previous is None or previous['status'] != status
+    persist = transition or (now - previous['persisted']).total_seconds() >= HEARTBEAT_PERSIST_SECONDS
+
+    if persist:
+        stmt = upsert_insert(DeviceStatus).values(wall_id=wall_id, device=device, status=status, last_update=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DeviceStatus.wall_id, DeviceStatus.device],
+            set_={'status': stmt.excluded.status, 'last_update': stmt.excluded.last_update}
+        )
+        session.execute(stmt)
+
+        # El historial solo guarda los cambios de estado, y solo ellos cambian
+        # lo que responden los GET (un latido repetido no invalida los ETag)
+        if transition:
+            session.add(SystemStatus(status=status, device=device, wall_id=wall_id))
+            bump_data_version(session)
+
+        session.commit()
+
+    with device_states_lock:
+        device_states[(wall_id, device)] = {
+            'status': status,
+            'last_update': now,
+            'persisted': now if persist else previous['persisted'],
+            'synced_at': time.monotonic(),
+        }
+
+    return now
+
+def acquire_monitor_lock():
+    # Solo un proceso revisa los timeouts: en PostgreSQL con un advisory lock,
+    # si no con un candado de archivo (sirve para los workers de gunicorn)
+    global monitor_lock
+    if monitor_lock is not None:
+        return True
+
+    # Con PgBouncer en modo transacción el advisory lock (de sesión) se
+    # quedaría en una conexión del servidor que usan otros clientes
+    if db.engine.dialect.name == 'postgresql' and not DB_PGBOUNCER:
+        connection = db.engine.connect()
+        if connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': MONITOR_LOCK_KEY}).scalar():
+            monitor_lock = connection
+            return True
+        connection.close()
+        return False
+
+    if fcntl is None:
+        monitor_lock = True  # Sin fcntl (Windows) se asume un solo proceso
+        return True
+
+    handle = open(os.path.join(tempfile.gettempdir(), 'muro_eolico_status_monitor.lock'), 'w')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+
+    monitor_lock = handle
+    return True
+
+def check_heartbeat_timeouts():
+    now = datetime.now(pytz.utc)
+
+    for row in DeviceStatus.query.filter_by(status=1).all():
+        state = get_device_state(row.device, wall_id=row.wall_id)
+        last_update = max(row.last_update.replace(tzinfo=pytz.utc), state['last_update'])
+
+        # Si han pasado más de HEARTBEAT_TIMEOUT sin recibir un 1, guardar un 0
+        if state['status'] == 1 and now - last_update > HEARTBEAT_TIMEOUT:
+            print(f"⚠️ No se ha recibido señal de {row.device} desde {last_update}. Registrando estado 0...")
+            record_heartbeat(row.device, 0, wall_id=row.wall_id)
+
 def monitor_xiao_status():
     while True:
-        time.sleep(60)  # Revisar cada 1 minuto
+        time.sleep(HEARTBEAT_CHECK_SECONDS)
         with app.app_context():
-            latest_status = SystemStatus.query.order_by(SystemStatus.last_update.desc()).first()
-            
-            if latest_status:
-                now = datetime.now(pytz.utc)  # Ahora en UTC
-                last_update = latest_status.last_update.replace(tzinfo=pytz.utc)  # Asegurar que tenga UTC
-
-                print(f"Última actualización recibida: {last_update} | Hora actual: {now}")
-
-                # Si han pasado más de 3 minutos sin recibir un 1, guardar un 0
-                if latest_status.status == 1 and (now - last_update) > timedelta(minutes=3):
-                    print("⚠️ No se ha recibido señal de la Xiao en más de 3 minutos. Registrando estado 0...")
-                    
-                    new_log = SystemStatus(status=0)
-                    db.session.add(new_log)
-                    db.session.commit()
-                    
-                    print("✅ Estado cambiado a 0 por inactividad de la Xiao.")
+            try:
+                if acquire_monitor_lock():
+                    check_heartbeat_timeouts()
+                    maintain_partitions()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️ Error al revisar el estado de los dispositivos: {e}")
+
+# --- BUFFER DE INGESTA ------------------------------------------------
+
+ingest_queue = queue.Queue(maxsize=INGEST_BUFFER_SIZE)
+ingest_stop = threading.Event()
+ingest_lock = threading.Lock()  # Evita que el hilo y el atexit escriban al mismo tiempo
+ingest_retry = {'rows': [], 'attempts': 0, 'retry_at': 0}  # Lote que falló y se vuelve a intentar
+ingest_stats = {
+    'flushes': 0,
+    'rows_flushed': 0,
+    'errors': 0,
+    'rows_dropped': 0,
+    'last_flush_ms': 0,
+    'max_flush_ms': 0,
+    'total_flush_ms': 0,
+}
+
+def flush_ingest_buffer(max_rows):
+    # Saca hasta max_rows lecturas de la cola y las escribe en una transacción.
+    # Si la escritura falla el lote se guarda en ingest_retry y se vuelve a
+    # intentar (antes que la cola) con espera exponencial; al sensor ya se le
+    # respondió 202, así que solo se descarta después de INGEST_RETRY_LIMIT intentos.
+    with ingest_lock:
+        if ingest_retry['rows']:
+            if time.monotonic() < ingest_retry['retry_at']:
+                return 0
+            rows = ingest_retry['rows']
+        else:
+            rows = []
+            while len(rows) < max_rows:
+                try:
+                    rows.append(ingest_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+        if not rows:
+            return 0
+
+        start = time.perf_counter()
+        with app.app_context():
+            try:
+                save_readings(rows)
+            except Exception as e:
+                db.session.rollback()
+                ingest_stats['errors'] += 1
+                ingest_retry['attempts'] += 1
+                if ingest_retry['attempts'] >= INGEST_RETRY_LIMIT:
+                    ingest_stats['rows_dropped'] += len(rows)
+                    ingest_retry.update(rows=[], attempts=0, retry_at=0)
+                    print(f"⚠️ Se descartan {len(rows)} lecturas del buffer tras {INGEST_RETRY_LIMIT} intentos: {e}")
+                else:
+                    backoff = INGEST_RETRY_BACKOFF_MS * 2 ** (ingest_retry['attempts'] - 1) / 1000
+                    ingest_retry.update(rows=rows, retry_at=time.monotonic() + backoff)
+                    print(f"⚠️ Error al escribir {len(rows)} lecturas del buffer, se reintenta en {backoff:.1f} s: {e}")
+                return 0
+
+        ingest_retry.update(rows=[], attempts=0, retry_at=0)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        ingest_stats['flushes'] += 1
+        ingest_stats['rows_flushed'] += len(rows)
+        ingest_stats['last_flush_ms'] = elapsed_ms
+        ingest_stats['max_flush_ms'] = max(ingest_stats['max_flush_ms'], elapsed_ms)
+        ingest_stats['total_flush_ms'] += elapsed_ms
+        return len(rows)
+
+def ingest_flusher():
+    # Vacía la cola cada INGEST_FLUSH_MS o en cuanto junta INGEST_FLUSH_ROWS lecturas
+    while not ingest_stop.is_set():
+        deadline = time.monotonic() + INGEST_FLUSH_MS / 1000
+        while ingest_queue.qsize() < INGEST_FLUSH_ROWS and time.monotonic() < deadline:
+            if ingest_stop.wait(0.01):
+                break
+        flush_ingest_buffer(INGEST_FLUSH_ROWS)
+
+def shutdown_ingest_buffer():
+    # Al apagar el proceso se escribe todo lo que quede en la cola
+    # (el lote pendiente se sigue reintentando hasta que entra o se descarta)
+    ingest_stop.set()
+    while ingest_retry['rows'] or not ingest_queue.empty():
+        if not flush_ingest_buffer(INGEST_FLUSH_ROWS):
+            time.sleep(max(0, ingest_retry['retry_at'] - time.monotonic()))
+
+@app.route(BASE_URL + '/ingestStatus', methods=['GET'])
+def get_ingest_status():
+    stats = dict(ingest_stats)
+
+    return jsonify({
+        'enabled': INGEST_BUFFER_ENABLED,
+        'queue_depth': ingest_queue.qsize(),
+        'queue_capacity': INGEST_BUFFER_SIZE,
+        'flushes': stats['flushes'],
+        'rows_flushed': stats['rows_flushed'],
+        'errors': stats['errors'],
+        'retry_pending': len(ingest_retry['rows']),
+        'rows_dropped': stats['rows_dropped'],
+        'last_flush_ms': round(stats['last_flush_ms'], 3),
+        'max_flush_ms': round(stats['max_flush_ms'], 3),
+        'avg_flush_ms': round(stats['total_flush_ms'] / stats['flushes'], 3) if stats['flushes'] else 0,
+    })
+
+# --- STREAM EN VIVO (SSE) ---------------------------------------------
+# Cada lectura guardada se publica una sola vez y se reparte a todos los
+# clientes conectados a /stream. Cada cliente tiene una cola limitada; si
+# se llena (cliente lento) se le desconecta en vez de frenar la ingesta.
+# El reparto es dentro del proceso: cada worker transmite lo que él guarda.
+
+class StreamSubscriber:
+    def __init__(self, wall_id, group, notify=None):
+        self.wall_id = wall_id
+        self.group = group
+        self.queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.dropped = False
+        self.notify = notify  # Avisa que hay algo en la cola (lo usa el /stream de asgi.py)
+
+class StreamBroker:
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def has_subscribers(self):
+        return bool(self.subscribers)
+
+    def subscribe(self, wall_id, group, notify=None):
+        subscriber = StreamSubscriber(wall_id, group, notify)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, wall_id, group, message):
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            if subscriber.wall_id != wall_id or (subscriber.group is not None and subscriber.group != group):
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+            if subscriber.notify:
+                subscriber.notify()
+
+stream_broker = StreamBroker()
+
+def publish_readings(rows, totals):
+    # Se llama después del commit con las lecturas guardadas y los totales
+    # que regresó update_rollups
+    if not stream_broker.has_subscribers():
+        return
+
+    for row in rows:
+        wall_id = row['wall_id']
+        day = row['date'].date()
+        stream_broker.publish(wall_id, row['group'], app.json.dumps({
+            'reading': {
+                'id': row['id'],
+                'wall_id': wall_id,
+                'date': row['date'].strftime('%Y-%m-%d %H:%M:%S'),
+                'group': row['group'],
+                'propeller1': row['propeller1'],
+                'propeller2': row['propeller2'],
+                'propeller3': row['propeller3'],
+                'propeller4': row['propeller4'],
+                'propeller5': row['propeller5'],
+            },
+            'totals': {
+                'day': totals['day'].get((wall_id, day)),
+                'month': totals['month'].get((wall_id, day.replace(day=1))),
+                'all': totals['all'].get(wall_id),
+            }
+        }))
+
+@app.route(BASE_URL + '/stream', methods=['GET'])
+def stream_readings():
+    group = request.args.get('group', type=int)
+    subscriber = stream_broker.subscribe(current_wall(), group)
+
+    def generate():
+        try:
+            yield ': connected\n\n'
+            while not subscriber.dropped:
+                try:
+                    message = subscriber.queue.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+
+                if subscriber.dropped:
+                    break
+                yield f'event: reading\ndata: {message}\n\n'
+        finally:
+            stream_broker.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+# -----------------------------------------------------------------------
+# RECONSTRUCCIÓN DE ACUMULADOS
+# -----------------------------------------------------------------------
+# Recalcula TotalDay, TotalMinute y TotalHour desde WallData con
+# INSERT ... SELECT ... GROUP BY, por bloques de ROLLUP_CHUNK_DAYS días (un
+# commit por bloque), sin pasar las lecturas por Python. TotalMonth sale de
+# TotalDay, TotalCalendar de los dos y TotalAll de la suma de TotalMonth.
+# Se usa después de borrar lecturas (solo los días afectados) y desde
+# `flask rebuild-rollups` o /rebuildRollups para recalcular todo.
+# Con wall_id solo se toca ese muro; sin él, todos los muros a la vez.
+
+def bucket_expression(column, unit):
+    # Inicio del día, mes, hora o minuto de una columna de fecha, en SQL
+    if db.engine.dialect.name == 'postgresql':
+        bucket = func.date_trunc(literal_column(f"'{unit}'"), column)
+        return cast(bucket, Date) if unit in ('day', 'month') else bucket
+
+    # En SQLite las fechas son texto con el formato de SQLAlchemy
+    formats = {
+        'day': '%Y-%m-%d',
+        'month': '%Y-%m-01',
+        'hour': '%Y-%m-%d %H:00:00.000000',
+        'minute': '%Y-%m-%d %H:%M:00.000000',
+    }
+    bucket = func.strftime(literal_column(f"'{formats[unit]}'"), column)
+    return type_coerce(bucket, Date if unit in ('day', 'month') else DateTime)
+
+def day_start(day):
+    return datetime(day.year, day.month, day.day)
+
+def as_day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+def wall_filter(model, wall_id):
+    # Condición para limitar una consulta a un muro (None = todos los muros)
+    return [model.wall_id == wall_id] if wall_id is not None else []
+
+def day_ranges(days):
+    # Agrupa días sueltos en rangos consecutivos [inicio, fin)
+    ranges = []
+    for day in sorted(set(days)):
+        if ranges and ranges[-1][1] == day:
+            ranges[-1][1] = day + timedelta(days=1)
+        else:
+            ranges.append([day, day + timedelta(days=1)])
+    return ranges
+
+def rebuild_day_range(first_day, end_day, wall_id=None):
+    # Reemplaza TotalDay, TotalMinute y TotalHour de [first_day, end_day).
+    # No hace commit. Regresa cuántas lecturas se procesaron.
+    start, end = day_start(first_day), day_start(end_day)
+    lock_wall = ROLLUP_LOCK_ALL_WALLS if wall_id is None else wall_id
+    lock_rollup_days([(lock_wall, as_day(first_day) + timedelta(days=i)) for i in range((end - start).days)], exclusive=True)
+    in_range = (WallData.date >= start, WallData.date < end, *wall_filter(WallData, wall_id))
+    propellers = [WallData.propeller1, WallData.propeller2, WallData.propeller3, WallData.propeller4, WallData.propeller5]
+
+    db.session.execute(
+        delete(TotalDay).where(TotalDay.date >= first_day, TotalDay.date < end_day, *wall_filter(TotalDay, wall_id)),
+        execution_options={'synchronize_session': False}
+    )
+    day = bucket_expression(WallData.date, 'day')
+    db.session.execute(insert(TotalDay).from_select(
+        ['wall_id', 'date', 'total', 'group1', 'group2', 'group3'],
+        select(
+            WallData.wall_id,
+            day,
+            func.sum(sum(propellers)),
+            func.sum(WallData.propeller1 + WallData.propeller2),
+            func.sum(WallData.propeller3),
+            func.sum(WallData.propeller4 + WallData.propeller5),
+        ).where(*in_range).group_by(WallData.wall_id, day)
+    ))
+
+    columns = ['wall_id', 'bucket_start', 'group', 'readings'] + [f'propeller{i}' for i in range(1, 6)] + [f'power{i}' for i in range(1, 6)]
+    for model, unit in ((TotalMinute, 'minute'), (TotalHour, 'hour')):
+        db.session.execute(
+            delete(model).where(model.bucket_start >= start, model.bucket_start < end, *wall_filter(model, wall_id)),
+            execution_options={'synchronize_session': False}
+        )
+        bucket = bucket_expression(WallData.date, unit)
+        db.session.execute(insert(model).from_select(columns, select(
+            WallData.wall_id,
+            bucket,
+            WallData.group,
+            func.count(),
+            *[func.sum(propeller) for propeller in propellers],
+            *[func.sum(propeller * propeller) / 216 * 1000 for propeller in propellers],
+        ).where(*in_range).group_by(WallData.wall_id, bucket, WallData.group)))
+
+    return db.session.execute(
+        select(func.coalesce(func.sum(TotalHour.readings), 0))
+        .where(TotalHour.bucket_start >= start, TotalHour.bucket_start < end, *wall_filter(TotalHour, wall_id))
+    ).scalar()
+
+def rebuild_months(first_month=None, end_month=None, wall_id=None):
+    # Reemplaza TotalMonth de [first_month, end_month) sumando TotalDay,
+    # sin límites reemplaza toda la tabla (o todo el muro). No hace commit.
+    days_filter = wall_filter(TotalDay, wall_id)
+    months_filter = wall_filter(TotalMonth, wall_id)
+    if first_month is not None:
+        days_filter += [TotalDay.date >= first_month, TotalDay.date < end_month]
+        months_filter += [TotalMonth.date >= first_month, TotalMonth.date < end_month]
+
+    db.session.execute(delete(TotalMonth).where(*months_filter), execution_options={'synchronize_session': False})
+    month = bucket_expression(TotalDay.date, 'month')
+    db.session.execute(insert(TotalMonth).from_select(
+        ['wall_id', 'date', 'total'],
+        select(TotalDay.wall_id, month, func.sum(TotalDay.total)).where(*days_filter).group_by(TotalDay.wall_id, month)
+    ))
+
+def rebuild_calendar(wall_id=None):
+    # Reemplaza TotalCalendar con GROUP BY sobre TotalDay y TotalMonth. No hace commit.
+    db.session.execute(delete(TotalCalendar).where(*wall_filter(TotalCalendar, wall_id)), execution_options={'synchronize_session': False})
+    for kind, model in (('day', TotalDay), ('month', TotalMonth)):
+        number = extract(kind, model.date)
+        db.session.execute(insert(TotalCalendar).from_select(
+            ['wall_id', 'kind', 'number', 'total'],
+            select(model.wall_id, literal_column(f"'{kind}'"), number, func.sum(model.total))
+            .where(*wall_filter(model, wall_id)).group_by(model.wall_id, number)
+        ))
+
+def rebuild_total_all(wall_id=None):
+    # TotalAll de cada muro = suma de sus meses. No hace commit.
+    db.session.execute(delete(TotalAll).where(*wall_filter(TotalAll, wall_id)), execution_options={'synchronize_session': False})
+    db.session.execute(insert(TotalAll).from_select(
+        ['wall_id', 'total'],
+        select(TotalMonth.wall_id, func.sum(TotalMonth.total)).where(*wall_filter(TotalMonth, wall_id)).group_by(TotalMonth.wall_id)
+    ))
+
+def rebuild_rollups(first_day=None, last_day=None, days=None, chunk_days=ROLLUP_CHUNK_DAYS, progress=None, wall_id=None):
+    # Recalcula los acumulados:
+    #   days=[...]                -> solo esos días (y sus meses)
+    #   first_day/last_day        -> el rango [first_day, last_day]
+    #   sin argumentos            -> todo lo que hay en WallData y en los acumulados
+    #   wall_id                   -> solo ese muro (sin él, todos)
+    # Los días que ya archivó la retención no se recalculan: sus lecturas ya
+    # no están en WallData, así que sus acumulados se quedan como están.
+    # progress(inicio, fin, lecturas, segundos) se llama después de cada bloque.
+    started = time.perf_counter()
+    full = days is None and first_day is None and last_day is None
+    horizon = archived_through(wall_id)
+
+    if days is not None:
+        ranges = day_ranges([day for day in days if horizon is None or as_day(day) > horizon])
+    else:
+        if first_day is None or last_day is None:
+            bounds = [
+                db.session.execute(select(func.min(WallData.date), func.max(WallData.date)).where(*wall_filter(WallData, wall_id))).one(),
+                db.session.execute(select(func.min(TotalHour.bucket_start), func.max(TotalHour.bucket_start)).where(*wall_filter(TotalHour, wall_id))).one(),
+                db.session.execute(select(func.min(TotalDay.date), func.max(TotalDay.date)).where(*wall_filter(TotalDay, wall_id))).one(),
+            ]
+            starts = [as_day(low) for low, _ in bounds if low is not None]
+            ends = [as_day(high) for _, high in bounds if high is not None]
+            first_day = first_day or (min(starts) if starts else None)
+            last_day = last_day or (max(ends) if ends else None)
+        if horizon is not None and first_day is not None:
+            first_day = max(first_day, horizon + timedelta(days=1))
+        ranges = [[first_day, last_day + timedelta(days=1)]] if first_day and last_day and first_day <= last_day else []
+
+    rows = 0
+    rebuilt_days = 0
+    months = set()
+    for range_start, range_end in ranges:
+        chunk_start = range_start
+        while chunk_start < range_end:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days), range_end)
+            rows += rebuild_day_range(chunk_start, chunk_end, wall_id)
+            rebuilt_days += (chunk_end - chunk_start).days
+            bump_data_version()
+            db.session.commit()
+            if progress:
+                progress(chunk_start, chunk_end, rows, time.perf_counter() - started)
+            chunk_start = chunk_end
+
+        month = range_start.replace(day=1)
+        while month < range_end:
+            months.add(month)
+            month = (month + timedelta(days=32)).replace(day=1)
+
+    if full:
+        rebuild_months(wall_id=wall_id)
+    else:
+        for month in months:
+            rebuild_months(month, (month + timedelta(days=32)).replace(day=1), wall_id)
+    rebuild_calendar(wall_id)
+    rebuild_total_all(wall_id)
+    bump_data_version()
+    db.session.commit()
+    invalidate_cache()
+
+    seconds = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'days': rebuilt_days,
+        'months': len(months),
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0,
+    }
+
+@app.cli.command('rebuild-rollups')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='Primer día a recalcular')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Último día a recalcular (incluido)')
+@click.option('--day', 'days', type=click.DateTime(['%Y-%m-%d']), multiple=True, help='Recalcular solo este día (se puede repetir)')
+@click.option('--chunk-days', type=int, default=ROLLUP_CHUNK_DAYS, show_default=True, help='Días por transacción')
+@click.option('--wall-id', type=int, help='Recalcular solo este muro (por omisión todos)')
+def rebuild_rollups_command(start, end, days, chunk_days, wall_id):
+    """Recalcula TotalDay, TotalMonth, TotalAll, TotalMinute y TotalHour desde WallData."""
+    def progress(chunk_start, chunk_end, rows, seconds):
+        rate = rows / seconds if seconds else 0
+        click.echo(f'{chunk_start} - {chunk_end}: {rows} lecturas, {rate:.0f} lecturas/s')
+
+    result = rebuild_rollups(
+        first_day=start.date() if start else None,
+        last_day=end.date() if end else None,
+        days=[day.date() for day in days] or None,
+        chunk_days=chunk_days,
+        progress=progress,
+        wall_id=wall_id,
+    )
+    click.echo(f"Listo: {result['rows']} lecturas, {result['days']} días, {result['months']} meses "
+               f"en {result['seconds']} s ({result['rows_per_second']} lecturas/s)")
+
+@app.route(BASE_URL + '/rebuildRollups', methods=['POST'])
+def rebuild_rollups_endpoint():
+    # Cuerpo opcional: {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"} o {"days": ["YYYY-MM-DD", ...]},
+    # más "wall_id" para recalcular un solo muro
+    data = request.get_json(silent=True) or {}
+    try:
+        start = datetime.strptime(data['start'], '%Y-%m-%d').date() if data.get('start') else None
+        end = datetime.strptime(data['end'], '%Y-%m-%d').date() if data.get('end') else None
+        days = [datetime.strptime(day, '%Y-%m-%d').date() for day in data['days']] if 'days' in data else None
+        wall_id = int(data['wall_id']) if data.get('wall_id') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Dates must use the format YYYY-MM-DD and wall_id must be an integer'}), 400
+
+    # Puede tardar minutos: corre como trabajo en segundo plano, sin borrar nada
+    return start_delete_job('rebuildRollups', None, finish=lambda: rebuild_rollups(
+        first_day=start, last_day=end, days=days, wall_id=wall_id
+    ))
+
+# -----------------------------------------------------------------------
+# BORRADOS EN SEGUNDO PLANO
+# -----------------------------------------------------------------------
+# resetAll, deleteAllZeros y deleteRangeWallData borran WallData por bloques
+# de DELETE_BATCH_SIZE ids, con un commit por bloque, en un hilo aparte. Cada
+# bloque descuenta de los acumulados lo que aportaban las lecturas borradas
+# (DELETE ... RETURNING), así los totales quedan bien en todo momento y la
+# ingesta nunca espera a un bloqueo largo. Solo se borran lecturas que ya
+# existían al iniciar el trabajo; lo que llegue mientras tanto se queda.
+# /rebuildRollups usa la misma maquinaria sin criterios: no borra nada y
+# solo corre su finish().
+
+def subtract_rollups(rows):
+    # Resta de todos los acumulados el aporte de las lecturas borradas y quita
+    # los minutos, horas, días y meses que se quedaron sin lecturas. No hace commit.
+    days, months, total_all = fold_totals(rows)
+    update_totals(
+        {day: [-value for value in sums] for day, sums in days.items()},
+        {month: -total for month, total in months.items()},
+        {wall_id: -total for wall_id, total in total_all.items()}
+    )
+
+    minutes, hours = fold_buckets(rows)
+    for model, buckets in ((TotalMinute, minutes), (TotalHour, hours)):
+        update_buckets(model, {key: [-value for value in sums] for key, sums in buckets.items()})
+        if buckets:
+            starts = [bucket_start for _, bucket_start, _ in buckets]
+            db.session.execute(
+                delete(model).where(model.bucket_start >= min(starts), model.bucket_start <= max(starts), model.readings <= 0),
+                execution_options={'synchronize_session': False}
+            )
+
+    for wall_id, day in days:
+        start = day_start(day)
+        remaining = db.session.execute(
+            select(TotalHour.id).where(
+                TotalHour.wall_id == wall_id, TotalHour.bucket_start >= start, TotalHour.bucket_start < start + timedelta(days=1)
+            ).limit(1)
+        ).first()
+        if remaining is None:
+            db.session.execute(
+                delete(TotalDay).where(TotalDay.wall_id == wall_id, TotalDay.date == day),
+                execution_options={'synchronize_session': False}
+            )
+
+    for wall_id, month in months:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        remaining = db.session.execute(
+            select(TotalDay.id).where(TotalDay.wall_id == wall_id, TotalDay.date >= month, TotalDay.date < next_month).limit(1)
+        ).first()
+        if remaining is None:
+            db.session.execute(
+                delete(TotalMonth).where(TotalMonth.wall_id == wall_id, TotalMonth.date == month),
+                execution_options={'synchronize_session': False}
+            )
+
+def delete_batch(criteria, after_id, max_id, batch_size):
+    # Borra el siguiente bloque de lecturas (ids en (after_id, fin del bloque])
+    # y descuenta su aporte. No hace commit. Regresa (borradas, fin del bloque).
+    pending = (*criteria, WallData.id > after_id, WallData.id <= max_id)
+    batch_end = db.session.execute(
+        select(WallData.id).where(*pending).order_by(WallData.id).offset(batch_size - 1).limit(1)
+    ).scalar() or max_id
+
+    rows = db.session.execute(
+        delete(WallData).where(*pending, WallData.id <= batch_end).returning(
+            WallData.id, WallData.wall_id, WallData.date, WallData.group, WallData.propeller1, WallData.propeller2,
+            WallData.propeller3, WallData.propeller4, WallData.propeller5
+        ),
+        execution_options={'synchronize_session': False}
+    ).mappings().all()
+    subtract_rollups(rows)
+
+    return len(rows), batch_end
+
+def reset_wall_rollups(wall_id):
+    # Al terminar resetAll los acumulados del muro se borran completos: restar
+    # lectura por lectura deja residuos de punto flotante (-4.6e-14) en vez de
+    # cero. Las lecturas que llegaron mientras corría el trabajo se vuelven a
+    # sumar. También se olvidan los archivos de la retención (se quedan en
+    # disco), si no /getAllMinutes los seguiría leyendo. No hace commit.
+    for model in (TotalDay, TotalMonth, TotalAll, TotalCalendar, TotalMinute, TotalHour, ArchiveFile):
+        db.session.execute(delete(model).where(model.wall_id == wall_id), execution_options={'synchronize_session': False})
+
+    rows = db.session.execute(select(
+        WallData.wall_id, WallData.date, WallData.group, WallData.propeller1, WallData.propeller2,
+        WallData.propeller3, WallData.propeller4, WallData.propeller5
+    ).where(WallData.wall_id == wall_id)).mappings().all()
+    if rows:
+        update_rollups(rows)
+
+def run_delete_job(job_id, criteria, max_id, batch_size, finish=None):
+    # finish() corre en la misma transacción que marca el trabajo como terminado
+    with app.app_context():
+        after_id = 0
+        try:
+            while after_id < max_id:
+                deleted, after_id = delete_batch(criteria, after_id, max_id, batch_size)
+                job = db.session.get(DeleteJob, job_id)
+                job.deleted += deleted
+                job.batches += 1
+                bump_data_version()
+                db.session.commit()
+                invalidate_cache()
+                time.sleep(DELETE_BATCH_PAUSE_MS / 1000)
+
+            if finish:
+                finish()
+                bump_data_version()
+            job = db.session.get(DeleteJob, job_id)
+            job.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error en el borrado {job_id}: {e}")
+            job = db.session.get(DeleteJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+
+        job.finished_at = datetime.now(pytz.utc)
+        db.session.commit()
+        invalidate_cache()
+
+def start_delete_job(kind, criteria, finish=None):
+    # Registra el trabajo y lo arranca en un hilo. `criteria` son las
+    # condiciones sobre WallData de las lecturas a borrar (None: no se borra nada).
+    batch_size = request.args.get('batch_size', DELETE_BATCH_SIZE, type=int)
+    if batch_size <= 0:
+        return jsonify({'error': 'batch_size must be a positive integer'}), 400
+
+    max_id = 0
+    if criteria is not None:
+        max_id = db.session.execute(select(func.max(WallData.id)).where(*criteria)).scalar() or 0
+    job = DeleteJob(id=uuid.uuid4().hex, kind=kind, status='running', deleted=0, batches=0,
+                    created_at=datetime.now(pytz.utc))
+    db.session.add(job)
+    db.session.commit()
+
+    threading.Thread(target=run_delete_job, args=(job.id, criteria, max_id, batch_size, finish), daemon=True).start()
+
+    return jsonify({
+        'message': 'Delete job started' if criteria is not None else 'Job started',
+        'job': job.to_json(),
+        'status_url': BASE_URL + '/jobs/' + job.id
+    }), 202
+
+@app.route(BASE_URL + '/jobs/<job_id>', methods=['GET'])
+def get_delete_job(job_id):
+    job = db.session.get(DeleteJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_json())
+
+# -----------------------------------------------------------------------
+# PARTICIONES
+# -----------------------------------------------------------------------
+# En PostgreSQL wall_data está particionada por mes (RANGE sobre date), con
+# una partición wall_data_pYYYYMM por mes y wall_data_default para lo que
+# no caiga en ninguna. Así las consultas por rango de fechas solo leen los
+# meses que tocan y borrar un mes viejo es un DROP TABLE en lugar de un
+# DELETE de millones de renglones. El monitor crea el mes actual y los
+# PARTITION_MONTHS_AHEAD siguientes; `flask create-partitions` y
+# `flask drop-partitions` son para hacerlo a mano. En SQLite no hace nada.
+
+partitions_checked_at = 0.0
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f'wall_data_p{month:%Y%m}'
+
+def wall_data_partitioned():
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    return db.session.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'wall_data'::regclass)"
+    )).scalar()
+
+def wall_data_partitions():
+    # {primer día del mes: nombre} de las particiones mensuales que existen
+    rows = db.session.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'wall_data'::regclass AND c.relname LIKE 'wall\\_data\\_p%'"
+    )).scalars()
+    return {datetime.strptime(name[-6:], '%Y%m').date(): name for name in rows}
+
+def ensure_wall_data_partitions(first_month, last_month):
+    # Crea las particiones que falten de first_month a last_month (incluido).
+    # Las lecturas de ese mes que ya estén en wall_data_default se pasan a la
+    # partición nueva antes de conectarla. Hace commit. Regresa las creadas.
+    if not wall_data_partitioned():
+        return []
+
+    existing = wall_data_partitions()
+    created = []
+    month = first_month.replace(day=1)
+    while month <= last_month:
+        if month not in existing:
+            name = partition_name(month)
+            end = add_months(month, 1)
+            db.session.execute(text(f'CREATE TABLE {name} (LIKE wall_data INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+            db.session.execute(text(
+                f'WITH moved AS (DELETE FROM wall_data_default WHERE date >= :start AND date < :end RETURNING *) '
+                f'INSERT INTO {name} SELECT * FROM moved'
+            ), {'start': month, 'end': end})
+            db.session.execute(text(f"ALTER TABLE wall_data ATTACH PARTITION {name} FOR VALUES FROM ('{month}') TO ('{end}')"))
+            created.append(name)
+        month = add_months(month, 1)
+
+    db.session.commit()
+    return created
+
+def drop_wall_data_partitions(before_month, only_empty=False):
+    # Desconecta y borra las particiones de los meses anteriores a before_month
+    # (con only_empty, solo las que ya no tienen lecturas). Los acumulados no
+    # se tocan: los totales de esos meses se quedan aunque ya no estén las
+    # lecturas. Para que rebuild_rollups no los recalcule desde un WallData
+    # vacío, los meses que tenían lecturas se registran en ArchiveFile como
+    # archivados (formato 'dropped', sin archivo). Hace commit. Regresa las borradas.
+    if not wall_data_partitioned():
+        return []
+
+    dropped = []
+    emptied = []  # Meses cuyas lecturas se perdieron con la partición
+    for month, name in sorted(wall_data_partitions().items()):
+        if month >= before_month:
+            continue
+        has_rows = db.session.execute(text(f'SELECT EXISTS (SELECT 1 FROM {name})')).scalar()
+        if only_empty and has_rows:
+            continue
+        db.session.execute(text(f'ALTER TABLE wall_data DETACH PARTITION {name}'))
+        db.session.execute(text(f'DROP TABLE {name}'))
+        dropped.append(name)
+        if has_rows:
+            emptied.append(month)
+
+    if emptied:
+        through = add_months(max(emptied), 1) - timedelta(days=1)
+        now = datetime.now(pytz.utc)
+        for wall_id in db.session.execute(select(TotalDay.wall_id).where(TotalDay.date <= through).distinct()).scalars().all():
+            db.session.add(ArchiveFile(
+                wall_id=wall_id, date=through, path='', format='dropped', first_id=0, last_id=0, rows=0, created_at=now
+            ))
+        bump_data_version()
+
+    db.session.commit()
+    if emptied:
+        invalidate_cache()
+    return dropped
+
+def maintain_partitions():
+    # Lo llama el monitor: cada PARTITION_CHECK_SECONDS se asegura de que
+    # existan el mes actual y los PARTITION_MONTHS_AHEAD siguientes
+    global partitions_checked_at
+    if time.monotonic() - partitions_checked_at < PARTITION_CHECK_SECONDS:
+        return
+    partitions_checked_at = time.monotonic()
+
+    this_month = datetime.now(mexico_tz).date().replace(day=1)
+    created = ensure_wall_data_partitions(this_month, add_months(this_month, PARTITION_MONTHS_AHEAD))
+    if created:
+        print(f"Particiones creadas: {', '.join(created)}")
+
+def parse_month(value):
+    return datetime.strptime(value, '%Y-%m').date()
+
+@app.cli.command('create-partitions')
+@click.option('--start', help='Primer mes (YYYY-MM), por omisión el actual')
+@click.option('--end', help='Último mes (YYYY-MM), por omisión PARTITION_MONTHS_AHEAD meses después de --start')
+def create_partitions_command(start, end):
+    """Crea las particiones mensuales de WallData que falten (PostgreSQL)."""
+    if not wall_data_partitioned():
+        raise click.ClickException('wall_data is not partitioned (PostgreSQL only, run flask db upgrade)')
+    try:
+        first_month = parse_month(start) if start else datetime.now(mexico_tz).date().replace(day=1)
+        last_month = parse_month(end) if end else add_months(first_month, PARTITION_MONTHS_AHEAD)
+    except ValueError:
+        raise click.UsageError('Months must use the format YYYY-MM')
+
+    created = ensure_wall_data_partitions(first_month, last_month)
+    click.echo(f"{len(created)} particiones creadas" + (f": {', '.join(created)}" if created else ''))
+
+@app.cli.command('drop-partitions')
+@click.option('--before', required=True, help='Borrar los meses anteriores a este (YYYY-MM)')
+@click.confirmation_option(prompt='Se borran las lecturas de esos meses (los acumulados se quedan). ¿Continuar?')
+def drop_partitions_command(before):
+    """Borra las particiones de WallData anteriores a un mes (PostgreSQL)."""
+    if not wall_data_partitioned():
+        raise click.ClickException('wall_data is not partitioned (PostgreSQL only, run flask db upgrade)')
+    try:
+        before_month = parse_month(before)
+    except ValueError:
+        raise click.UsageError('Months must use the format YYYY-MM')
+
+    dropped = drop_wall_data_partitions(before_month)
+    click.echo(f"{len(dropped)} particiones borradas" + (f": {', '.join(dropped)}" if dropped else ''))
+
+# -----------------------------------------------------------------------
+# EXPORTACIÓN
+# -----------------------------------------------------------------------
+# /export y `flask export-data` sacan WallData o TotalDay de un rango de
+# fechas como CSV, Parquet o Arrow IPC (estos dos solo con pyarrow). Se lee
+# con yield_per por bloques de EXPORT_CHUNK renglones (cursor del lado del
+# servidor en PostgreSQL) y cada bloque se escribe y se envía antes
+# de leer el siguiente, así la memoria no depende del tamaño del rango.
+# La fecha sale ya formateada desde SQL, sin strftime por renglón.
+
+EXPORT_TABLES = {
+    'wall_data': (WallData, ['id', 'wall_id', 'date', 'group', 'propeller1', 'propeller2', 'propeller3', 'propeller4', 'propeller5']),
+    'total_day': (TotalDay, ['id', 'wall_id', 'date', 'total', 'group1', 'group2', 'group3']),
+}
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+def date_text(column, with_time):
+    # La fecha como texto 'YYYY-MM-DD[ HH:MM:SS]', formateada por la base de datos
+    if db.engine.dialect.name == 'postgresql':
+        fmt = 'YYYY-MM-DD HH24:MI:SS' if with_time else 'YYYY-MM-DD'
+        return func.to_char(column, literal_column(f"'{fmt}'"))
+    fmt = '%Y-%m-%d %H:%M:%S' if with_time else '%Y-%m-%d'
+    return func.strftime(literal_column(f"'{fmt}'"), column)
+
+def export_query(table, start=None, end=None, wall_id=None):
+    # Rango [start, end) sobre la fecha; sin límites se exporta toda la tabla.
+    # Con wall_id solo las de ese muro
+    model, columns = EXPORT_TABLES[table]
+    with_time = model is WallData
+    if not with_time:
+        start = start.date() if start else None
+        end = end.date() if end else None
+
+    query = select(*[
+        date_text(model.date, with_time).label('date') if column == 'date' else getattr(model, column)
+        for column in columns
+    ]).where(*wall_filter(model, wall_id)).order_by(model.date, model.id)
+    if start:
+        query = query.where(model.date >= start)
+    if end:
+        query = query.where(model.date < end)
+    return query
+
+def export_batches(query):
+    # Bloques de renglones de Core (sin objetos del ORM) con yield_per
+    result = db.session.connection().execution_options(yield_per=EXPORT_CHUNK).execute(query)
+    try:
+        for rows in result.partitions():
+            yield count_rows(rows)
+    finally:
+        result.close()
+
+def export_schema(table):
+    model, columns = EXPORT_TABLES[table]
+    types = {'id': pa.int64(), 'wall_id': pa.int64(), 'group': pa.int64(), 'date': pa.timestamp('s') if model is WallData else pa.date32()}
+    return pa.schema([(column, types.get(column, pa.float64())) for column in columns])
+
+class ExportSink:
+    # Archivo de solo escritura para pyarrow: guarda lo escrito hasta que se
+    # envía con drain(), pero tell() sigue contando desde el inicio porque
+    # Parquet lo usa para los offsets del footer
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def export_stream(table, output_format, start=None, end=None, wall_id=None):
+    # Generador de bytes con el archivo exportado, bloque por bloque
+    return encode_export(table, output_format, export_batches(export_query(table, start, end, wall_id)))
+
+def encode_export(table, output_format, batches):
+    # Convierte los bloques de renglones de export_query a CSV, Parquet o Arrow
+    columns = EXPORT_TABLES[table][1]
+
+    if output_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in batches:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+        return
+
+    schema = export_schema(table)
+    sink = ExportSink()
+    output = pa.PythonFile(sink, mode='w')
+    writer = pq.ParquetWriter(output, schema) if output_format == 'parquet' else pa.ipc.new_stream(output, schema)
+    for rows in batches:
+        arrays = [
+            pa.array(values, pa.string()).cast(field.type) if field.name == 'date' else pa.array(values, field.type)
+            for values, field in zip(zip(*rows), schema)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def parse_export_args(table, output_format, start, end):
+    # Regresa (start, end) ya convertidos o lanza ValueError con el mensaje de error
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"table must be one of {', '.join(EXPORT_TABLES)}")
+    if output_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if output_format != 'csv' and pa is None:
+        raise ValueError(f'{output_format} export requires pyarrow to be installed')
+    try:
+        return (parse_query_date(start) if start else None, parse_query_date(end) if end else None)
+    except ValueError:
+        raise ValueError('Invalid date format. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS')
+
+@app.route(BASE_URL + '/export', methods=['GET'])
+def export_data():
+    # /export?table=wall_data|total_day&start=YYYY-MM-DD&end=YYYY-MM-DD&format=csv|parquet|arrow&wall_id=N
+    table = request.args.get('table', 'wall_data')
+    wall_id = current_wall()
+    output_format = request.args.get('format', 'csv')
+    try:
+        start, end = parse_export_args(table, output_format, request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    mimetype, extension = EXPORT_FORMATS[output_format]
+    filename = '_'.join([table, f'wall{wall_id}'] + [value.strftime('%Y%m%d') for value in (start, end) if value]) + '.' + extension
+    return Response(
+        stream_with_context(export_stream(table, output_format, start, end, wall_id)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.cli.command('export-data')
+@click.option('--table', default='wall_data', show_default=True, help='wall_data o total_day')
+@click.option('--start', help='Inicio del rango (YYYY-MM-DD o YYYY-MM-DD HH:MM:SS)')
+@click.option('--end', help='Fin del rango, sin incluir')
+@click.option('--format', 'output_format', default='csv', show_default=True, help='csv, parquet o arrow')
+@click.option('--output', required=True, type=click.Path(dir_okay=False), help='Archivo de salida')
+@click.option('--wall-id', type=int, help='Exportar solo este muro (por omisión todos)')
+def export_data_command(table, start, end, output_format, output, wall_id):
+    """Exporta WallData o TotalDay de un rango de fechas a CSV, Parquet o Arrow."""
+    try:
+        start, end = parse_export_args(table, output_format, start, end)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    started = time.perf_counter()
+    size = 0
+    with open(output, 'wb') as out:
+        for data in export_stream(table, output_format, start, end, wall_id):
+            out.write(data)
+            size += len(data)
+    click.echo(f'{output}: {size / 1024 / 1024:.1f} MB en {time.perf_counter() - started:.2f} s')
+
+# -----------------------------------------------------------------------
+# IMPORTACIÓN
+# -----------------------------------------------------------------------
+# /import y `flask import-data` cargan lecturas históricas con su propia
+# fecha desde CSV (encabezado date,group,propeller1..5 y wall_id opcional;
+# otras columnas como el id de /export se ignoran) o NDJSON (un objeto por
+# línea). Las lecturas sin wall_id van al muro por omisión. Se aplica el
+# mismo umbral de 0.2 que /new, se inserta por bloques de IMPORT_CHUNK con
+# COPY en PostgreSQL o executemany en SQLite, y los acumulados se juntan en
+# memoria para escribirlos una sola vez al final. Todo va en una sola
+# transacción: si una lectura es inválida no se guarda nada.
+
+IMPORT_COLUMNS = ['wall_id', 'date', 'group', 'propeller1', 'propeller2', 'propeller3', 'propeller4', 'propeller5']
+
+def read_import_records(stream, input_format):
+    # Diccionarios con las lecturas de un archivo de texto
+    if input_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+def parse_import_record(record, wall_id=DEFAULT_WALL_ID):
+    # Como parse_reading, pero la fecha es obligatoria. fromisoformat acepta
+    # 'YYYY-MM-DD HH:MM:SS' igual que strptime y es mucho más rápido
+    date = datetime.fromisoformat(record['date'])
+    if date.tzinfo is not None:
+        date = date.astimezone(mexico_tz).replace(tzinfo=None)
+
+    return {
+        'wall_id': int(record.get('wall_id') or wall_id),
+        'date': date,
+        'group': int(record['group']),
+        'propeller1': float(record['propeller1']),
+        'propeller2': float(record['propeller2']),
+        'propeller3': float(record['propeller3']),
+        'propeller4': float(record['propeller4']),
+        'propeller5': float(record['propeller5']),
+    }
+
+def insert_import_chunk(rows):
+    # COPY en PostgreSQL, executemany en SQLite, los dos directo en el cursor
+    # del driver dentro de la transacción de la sesión. No hace commit.
+    columns = 'wall_id, date, "group", propeller1, propeller2, propeller3, propeller4, propeller5'
+    cursor = db.session.connection().connection.cursor()
+    if db.engine.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([row[column] for column in IMPORT_COLUMNS] for row in rows)
+        buffer.seek(0)
+        cursor.copy_expert(f'COPY wall_data ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+    else:
+        # SQLAlchemy guarda las fechas en SQLite como 'YYYY-MM-DD HH:MM:SS.ffffff'
+        cursor.executemany(f'INSERT INTO wall_data ({columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [
+            (row['wall_id'], row['date'].isoformat(' ', 'microseconds'), row['group'], row['propeller1'], row['propeller2'],
+             row['propeller3'], row['propeller4'], row['propeller5'])
+            for row in rows
+        ])
+    cursor.close()
+
+def update_temp_latest_from_import(latest):
+    # Las lecturas importadas solo reemplazan a TempWallData si son más
+    # recientes que la que ya tiene cada grupo de cada muro
+    current = {
+        (wall_id, group): date
+        for wall_id, group, date in db.session.execute(select(TempWallData.wall_id, TempWallData.group, TempWallData.date))
+    }
+    newer = []
+    for (wall_id, group), row in latest.items():
+        if (wall_id, group) in current and current[(wall_id, group)] >= row['date']:
+            continue
+        reading_id = db.session.execute(
+            select(func.max(WallData.id)).where(WallData.wall_id == wall_id, WallData.group == group, WallData.date == row['date'])
+        ).scalar()
+        newer.append(dict(row, id=reading_id))
+
+    if newer:
+        update_temp_latest(newer)
+
+def import_readings(stream, input_format, wall_id=DEFAULT_WALL_ID):
+    # Regresa el resumen de la importación. Lanza ValueError si una lectura
+    # es inválida (después de hacer rollback). wall_id es el muro de las
+    # lecturas que no traen el suyo.
+    started = time.perf_counter()
+    received = saved = 0
+    days, months, total_all, minutes = {}, {}, {}, {}
+    latest = {}
+    chunk = []
+
+    def flush(chunk):
+        insert_import_chunk(chunk)
+        fold_totals(chunk, days, months, total_all)
+        fold_minutes(chunk, minutes)
+
+    try:
+        for number, record in enumerate(read_import_records(stream, input_format), start=1):
+            received += 1
+            try:
+                row = parse_import_record(record, wall_id)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                raise ValueError(f'Invalid reading at record {number}: {e}')
+
+            # Mismo umbral que /new
+            if row['propeller1'] + row['propeller2'] + row['propeller3'] + row['propeller4'] + row['propeller5'] < 0.2:
+                continue
+
+            saved += 1
+            key = (row['wall_id'], row['group'])
+            if key not in latest or row['date'] >= latest[key]['date']:
+                latest[key] = row
+            chunk.append(row)
+            if len(chunk) == IMPORT_CHUNK:
+                flush(chunk)
+                chunk = []
+
+        if chunk:
+            flush(chunk)
+
+        if saved:
+            update_totals(days, months, total_all)
+            update_buckets(TotalMinute, minutes)
+            update_buckets(TotalHour, hours_from_minutes(minutes))
+            update_temp_latest_from_import(latest)
+            bump_data_version()
+        db.session.commit()
+    except (ValueError, csv.Error) as e:
+        db.session.rollback()
+        raise ValueError(str(e))
+
+    if saved:
+        invalidate_cache()
+
+    seconds = time.perf_counter() - started
+    return {
+        'received': received,
+        'saved': saved,
+        'rejected': received - saved,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(received / seconds, 1) if seconds else 0,
+    }
+
+@app.route(BASE_URL + '/import', methods=['POST'])
+def import_data():
+    # El archivo puede venir como multipart (campo 'file') o como el cuerpo
+    # de la petición. El formato sale de ?format=, de la extensión o del Content-Type.
+    upload = request.files.get('file')
+    input_format = request.args.get('format')
+    if input_format is None:
+        name = upload.filename if upload else ''
+        content_type = upload.mimetype if upload else request.mimetype
+        input_format = 'ndjson' if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type else 'csv'
+    if input_format not in ('csv', 'ndjson'):
+        return jsonify({'error': "format must be 'csv' or 'ndjson'"}), 400
+
+    stream = io.TextIOWrapper(upload.stream if upload else request.stream, encoding='utf-8', newline='')
+    try:
+        return jsonify(import_readings(stream, input_format, current_wall()))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.cli.command('import-data')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'input_format', type=click.Choice(['csv', 'ndjson']),
+              help='Por omisión sale de la extensión del archivo')
+@click.option('--wall-id', type=int, default=DEFAULT_WALL_ID, show_default=True,
+              help='Muro de las lecturas que no traen columna wall_id')
+def import_data_command(path, input_format, wall_id):
+    """Importa lecturas históricas desde un archivo CSV o NDJSON."""
+    input_format = input_format or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as stream:
+        try:
+            result = import_readings(stream, input_format, wall_id)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    click.echo(f"{result['saved']} lecturas guardadas, {result['rejected']} rechazadas "
+               f"en {result['seconds']} s ({result['rows_per_second']} lecturas/s)")
+
+# -----------------------------------------------------------------------
+# RETENCIÓN
+# -----------------------------------------------------------------------
+# WallData solo guarda los últimos RETENTION_RAW_DAYS días de lecturas
+# crudas. Todos los días (a las RETENTION_CRON, con APScheduler, o a mano
+# con `flask apply-retention`) cada día más viejo de cada muro:
+#   1. recalcula sus acumulados (minuto, hora, día, mes) desde las lecturas,
+#   2. escribe las lecturas en RETENTION_ARCHIVE_DIR (CSV con gzip o
+#      Parquet) y registra el archivo en ArchiveFile,
+#   3. las borra de WallData por bloques de RETENTION_BATCH_SIZE, sin
+#      descontarlas de los acumulados.
+# Después borra los TotalMinute de más de RETENTION_MINUTE_DAYS días (solo
+# de días ya archivados; TotalHour se queda siempre) y, en PostgreSQL, las
+# particiones que quedaron vacías. /getAllMinutes lee del archivo las horas
+# que ya no tienen minutos. Así la tabla caliente y sus índices se quedan
+# del tamaño de la ventana de retención.
+
+def archived_through(wall_id=None):
+    # Último día archivado (de ese muro o de cualquiera), None si no hay
+    return db.session.execute(select(func.max(ArchiveFile.date)).where(*wall_filter(ArchiveFile, wall_id))).scalar()
+
+def archive_path(wall_id, day, first_id, last_id, output_format):
+    extension = 'csv.gz' if output_format == 'csv' else 'parquet'
+    return os.path.join(f'wall{wall_id}', f'{day:%Y}', f'{day:%m}', f'wall_data_{day:%Y%m%d}_{first_id}-{last_id}.{extension}')
+
+def write_archive(query, path, output_format):
+    # Se escribe en un temporal y se renombra al final, así nunca queda un
+    # archivo a medias con el nombre definitivo
+    full_path = os.path.join(RETENTION_ARCHIVE_DIR, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    temporary = full_path + '.tmp'
+    with open(temporary, 'wb') as raw:
+        out = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) if output_format == 'csv' else raw
+        for data in encode_export('wall_data', output_format, export_batches(query)):
+            out.write(data)
+        if out is not raw:
+            out.close()  # Escribe el final del gzip sin cerrar el archivo
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(temporary, full_path)
+
+def delete_in_batches(model, criteria, batch_size):
+    # Borra por bloques de ids con un commit por bloque, sin tocar los
+    # acumulados. Regresa cuántos renglones se borraron.
+    max_id = db.session.execute(select(func.max(model.id)).where(*criteria)).scalar()
+    deleted = 0
+    after_id = 0
+    while max_id is not None and after_id < max_id:
+        pending = (*criteria, model.id > after_id, model.id <= max_id)
+        batch_end = db.session.execute(
+            select(model.id).where(*pending).order_by(model.id).offset(batch_size - 1).limit(1)
+        ).scalar() or max_id
+        deleted += db.session.execute(
+            delete(model).where(*pending, model.id <= batch_end),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        bump_data_version()
+        db.session.commit()
+        invalidate_cache()
+        after_id = batch_end
+        time.sleep(DELETE_BATCH_PAUSE_MS / 1000)
+    return deleted
+
+def archive_day(wall_id, day, output_format, batch_size):
+    # Archiva y borra las lecturas de un día de un muro. Si el día ya tiene
+    # archivos (una corrida anterior que se interrumpió, o lecturas que
+    # llegaron después) solo se archivan las que no están en ninguno.
+    # Regresa (lecturas archivadas, lecturas borradas, ruta o None).
+    start = day_start(day)
+    in_day = (WallData.wall_id == wall_id, WallData.date >= start, WallData.date < start + timedelta(days=1))
+    archived_id = db.session.execute(
+        select(func.max(ArchiveFile.last_id)).where(ArchiveFile.wall_id == wall_id, ArchiveFile.date == day)
+    ).scalar()
+    horizon = archived_through(wall_id)
+    if archived_id is None and (horizon is None or day > horizon):
+        # Última oportunidad de calcular los acumulados desde las lecturas
+        # crudas: el día y su mes. TotalCalendar y TotalAll se recalculan una
+        # sola vez al final de run_retention.
+        month = day.replace(day=1)
+        rebuild_day_range(day, day + timedelta(days=1), wall_id)
+        rebuild_months(month, add_months(month, 1), wall_id)
+        bump_data_version()
+        db.session.commit()
+
+    first_id, last_id, rows = db.session.execute(
+        select(func.min(WallData.id), func.max(WallData.id), func.count()).where(*in_day, WallData.id > (archived_id or 0))
+    ).one()
+    path = None
+    if rows:
+        path = archive_path(wall_id, day, first_id, last_id, output_format)
+        query = export_query('wall_data', wall_id=wall_id).where(*in_day, WallData.id >= first_id, WallData.id <= last_id)
+        write_archive(query, path, output_format)
+        db.session.add(ArchiveFile(
+            wall_id=wall_id, date=day, path=path, format=output_format, first_id=first_id, last_id=last_id,
+            rows=rows, created_at=datetime.now(pytz.utc)
+        ))
+        db.session.commit()
+        archived_id = last_id
+    if archived_id is None:
+        return 0, 0, None
+
+    deleted = delete_in_batches(WallData, [*in_day, WallData.id <= archived_id], batch_size)
+    return rows, deleted, path
+
+def run_retention(raw_days=RETENTION_RAW_DAYS, minute_days=RETENTION_MINUTE_DAYS, output_format=RETENTION_ARCHIVE_FORMAT,
+                  batch_size=RETENTION_BATCH_SIZE, progress=None):
+    # Aplica la retención completa. progress(muro, día, archivadas, borradas)
+    # se llama después de cada día. Lanza ValueError si la configuración no sirve.
+    if raw_days <= 0:
+        raise ValueError('raw_days must be a positive number of days')
+    if output_format not in ('csv', 'parquet'):
+        raise ValueError("format must be 'csv' or 'parquet'")
+    if output_format == 'parquet' and pa is None:
+        raise ValueError('parquet archives require pyarrow to be installed')
+
+    started = time.perf_counter()
+    today = datetime.now(mexico_tz).date()
+    cutoff = today - timedelta(days=raw_days)
+    summary = {'days': 0, 'archived': 0, 'deleted': 0, 'minutes_deleted': 0, 'partitions_dropped': []}
+
+    # Del día más viejo al más nuevo, así lo archivado siempre es un prefijo
+    # de la historia y rebuild_rollups puede saltarse todo lo anterior
+    since = None
+    walls = set()
+    while True:
+        pending = [WallData.date < day_start(cutoff)] + ([WallData.date >= since] if since else [])
+        oldest = db.session.execute(
+            select(WallData.date).where(*pending).order_by(WallData.date).limit(1)
+        ).scalar()
+        if oldest is None:
+            break
+        day = oldest.date()
+        since = day_start(day) + timedelta(days=1)
+
+        for wall_id in db.session.execute(
+            select(WallData.wall_id).where(WallData.date >= day_start(day), WallData.date < since).distinct()
+        ).scalars().all():
+            archived, deleted, _ = archive_day(wall_id, day, output_format, batch_size)
+            walls.add(wall_id)
+            summary['days'] += 1
+            summary['archived'] += archived
+            summary['deleted'] += deleted
+            if progress:
+                progress(wall_id, day, archived, deleted)
+
+    for wall_id in walls:
+        rebuild_calendar(wall_id)
+        rebuild_total_all(wall_id)
+    if walls:
+        bump_data_version()
+        db.session.commit()
+        invalidate_cache()
+
+    if minute_days > 0:
+        minute_cutoff = day_start(today - timedelta(days=max(minute_days, raw_days)))
+        summary['minutes_deleted'] = delete_in_batches(TotalMinute, [TotalMinute.bucket_start < minute_cutoff], batch_size)
+
+    summary['partitions_dropped'] = drop_wall_data_partitions(cutoff.replace(day=1), only_empty=True)
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    return summary
+
+def retention_job():
+    # Lo llama APScheduler en cada worker, pero solo corre en el proceso que
+    # tiene el candado del monitor
+    with app.app_context():
+        try:
+            if acquire_monitor_lock():
+                summary = run_retention()
+                print(f"Retención: {summary['archived']} lecturas archivadas de {summary['days']} días, "
+                      f"{summary['minutes_deleted']} minutos borrados en {summary['seconds']} s")
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Error en la retención: {e}")
+
+def start_retention_scheduler():
+    scheduler = BackgroundScheduler(timezone=mexico_tz)
+    scheduler.add_job(retention_job, CronTrigger.from_crontab(RETENTION_CRON, timezone=mexico_tz),
+                      max_instances=1, coalesce=True)
+    scheduler.start()
+    atexit.register(scheduler.shutdown, wait=False)
+    return scheduler
+
+@lru_cache(maxsize=ARCHIVE_CACHE_DAYS)
+def archived_day_minutes(day, files):
+    # Potencia por minuto (1440 x 5) y lecturas por minuto de un día, desde
+    # sus archivos. `files` es una tupla de (ruta, formato).
+    dates, speeds = [], []
+    for path, output_format in files:
+        full_path = os.path.join(RETENTION_ARCHIVE_DIR, path)
+        if output_format == 'parquet':
+            table = pq.read_table(full_path, columns=['date'] + [f'propeller{i}' for i in range(1, 6)])
+            dates.append(table.column('date').to_numpy().astype('datetime64[s]'))
+            speeds.append(np.column_stack([table.column(f'propeller{i}').to_numpy() for i in range(1, 6)]))
+        else:
+            with gzip.open(full_path, 'rt', newline='') as stream:
+                reader = csv.reader(stream)
+                header = next(reader)
+                columns = [header.index('date')] + [header.index(f'propeller{i}') for i in range(1, 6)]
+                rows = [[row[i] for i in columns] for row in reader]
+            dates.append(np.array([row[0] for row in rows], dtype='datetime64[s]'))
+            speeds.append(np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), 5))
+
+    dates = np.concatenate(dates)
+    speeds = np.concatenate(speeds)
+    minute = ((dates - np.datetime64(day, 's')) // np.timedelta64(1, 'm')).astype(np.int64)
+    powers = speeds ** 2 / 216 * 1000
+    counts = np.bincount(minute, minlength=1440)
+    return np.column_stack([np.bincount(minute, weights=powers[:, i], minlength=1440) for i in range(5)]), counts
+
+def archived_minutes(wall_id, hour_start):
+    # Renglones (inicio del minuto, potencia 1..5) de una hora que ya solo
+    # está en los archivos, igual que los que salen de TotalMinute
+    day = hour_start.date()
+    files = tuple(db.session.execute(
+        select(ArchiveFile.path, ArchiveFile.format)
+        .where(ArchiveFile.wall_id == wall_id, ArchiveFile.date == day, ArchiveFile.format != 'dropped').order_by(ArchiveFile.id)
+    ).all())
+    if not files:
+        return []
+
+    powers, counts = archived_day_minutes(day, tuple(tuple(row) for row in files))
+    first = hour_start.hour * 60
+    return [
+        (hour_start + timedelta(minutes=minute), *powers[first + minute].tolist())
+        for minute in range(60) if counts[first + minute]
+    ]
+
+@app.cli.command('apply-retention')
+@click.option('--raw-days', type=int, default=RETENTION_RAW_DAYS, show_default=True, help='Días de lecturas crudas que se quedan en WallData')
+@click.option('--minute-days', type=int, default=RETENTION_MINUTE_DAYS, show_default=True, help='Días de TotalMinute (0 = sin límite)')
+@click.option('--format', 'output_format', type=click.Choice(['csv', 'parquet']), default=RETENTION_ARCHIVE_FORMAT, show_default=True)
+@click.option('--batch-size', type=int, default=RETENTION_BATCH_SIZE, show_default=True, help='Lecturas borradas por transacción')
+def apply_retention_command(raw_days, minute_days, output_format, batch_size):
+    """Archiva y borra de WallData las lecturas más viejas que --raw-days."""
+    def progress(wall_id, day, archived, deleted):
+        click.echo(f'muro {wall_id} {day}: {archived} archivadas, {deleted} borradas')
+
+    try:
+        summary = run_retention(raw_days, minute_days, output_format, batch_size, progress)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    click.echo(f"{summary['archived']} lecturas archivadas de {summary['days']} días, "
+               f"{summary['minutes_deleted']} minutos borrados, "
+               f"{len(summary['partitions_dropped'])} particiones borradas en {summary['seconds']} s")
 
 # ---GET----------------------------------------------------------------
 
@@ -379,33 +2931,29 @@ def monitor_xiao_status():
 
 @app.route(BASE_URL + "/statusHistory", methods=["GET"])
 def get_status_history():
-    logs = SystemStatus.query.order_by(SystemStatus.last_update.desc()).all()
+    # Del más reciente al más antiguo. Los ids crecen con last_update,
+    # así que se ordena por id para poder paginar con ?after_id=
+    def convert(rows):
+        dates = format_mexico_times([row[2] for row in rows])
+        return [(row[0], row[1], date) for row, date in zip(rows, dates)]
 
-    history = [
-        {
-            "id": log.id,
-            "status": log.status,
-            "lastUpdate": log.last_update.replace(tzinfo=pytz.utc).astimezone(mexico_tz).strftime('%Y-%m-%d %H:%M:%S')
-        }
-        for log in logs
-    ]
-
-    return jsonify(history), 200
+    query = select(SystemStatus.id, SystemStatus.status, SystemStatus.last_update).where(SystemStatus.wall_id == current_wall())
+    return list_response(query, ['id', 'status', 'lastUpdate'], SystemStatus.id, descending=True, convert=convert)
 
 
 
 @app.route(BASE_URL + "/status", methods=["GET"])
 def get_status():
-    system_status = SystemStatus.query.order_by(SystemStatus.last_update.desc()).first()
+    state = get_device_state(request.args.get('device', DEFAULT_DEVICE), wall_id=current_wall())
     
-    if not system_status:
+    if not state:
         return jsonify({"status": 0, "message": "No status found"}), 404
 
-    last_update_mx = system_status.last_update.replace(tzinfo=pytz.utc).astimezone(mexico_tz)
+    last_update_mx = state['last_update'].astimezone(mexico_tz)
     formatted_last_update = last_update_mx.strftime('%Y-%m-%d %H:%M:%S')
 
     return jsonify({
-        "status": system_status.status,
+        "status": state['status'],
         "lastUpdate": formatted_last_update
     }), 200
 
@@ -414,8 +2962,18 @@ def get_status():
 @app.route(BASE_URL + "/resetStatusHistory", methods=["DELETE"])
 def reset_status_history():
     try:
-        db.session.query(SystemStatus).delete()
+        # Solo el historial y los dispositivos del muro de ?wall_id=
+        wall_id = current_wall()
+        devices = db.session.execute(select(DeviceStatus.device).where(DeviceStatus.wall_id == wall_id)).scalars().all()
+        db.session.query(SystemStatus).filter_by(wall_id=wall_id).delete()
+        db.session.query(DeviceStatus).filter_by(wall_id=wall_id).delete()
+        bump_data_version()
         db.session.commit()
+
+        with device_states_lock:
+            for device in devices:
+                device_states.pop((wall_id, device), None)
+
         return jsonify({"message": "Status history deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -426,20 +2984,28 @@ def reset_status_history():
 
 @app.route(BASE_URL + '/readTempLatest/<number>', methods=['GET'])
 def readTempLatest(number):
-    latest_data = TempWallData.query.filter_by(group=number).order_by(TempWallData.id.desc()).first()
+    # TempWallData tiene un solo renglón por grupo de cada muro
+    latest_data = TempWallData.query.filter_by(wall_id=current_wall(), group=number).first()
+    if latest_data is None:
+        return jsonify({'message': 'No data found'}), 404
     return jsonify(latest_data.to_json())
 
 # -----------------------------------------------------------------------
 
 @app.route(BASE_URL + '/readLatest', methods=['GET'])
 def readLatest():
-    latest_data = WallData.query.order_by(WallData.id.desc()).first()
+    latest_data = WallData.query.filter_by(wall_id=current_wall()).order_by(WallData.id.desc()).first()
     return jsonify(latest_data.to_json())
 # -----------------------------------------------------------------------
 @app.route(BASE_URL + '/readAll', methods=['GET'])
 def readAll():
-    all_data = WallData.query.all()
-    return jsonify([data.to_json() for data in all_data])
+    # La fecha sale ya formateada desde SQL, igual que en /export
+    query = select(
+        WallData.id, WallData.wall_id, date_text(WallData.date, True), WallData.group, WallData.propeller1,
+        WallData.propeller2, WallData.propeller3, WallData.propeller4, WallData.propeller5
+    ).where(WallData.wall_id == current_wall())
+    fields = ['id', 'wall_id', 'date', 'group', 'propeller1', 'propeller2', 'propeller3', 'propeller4', 'propeller5']
+    return list_response(query, fields, WallData.id)
 # -----------------------------------------------------------------------
 @app.route(BASE_URL + '/getAllHours', methods=['GET'])
 def get_all_hours():
@@ -452,14 +3018,28 @@ def get_all_hours():
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
 
-    all_data = WallData.query.filter(cast(WallData.date, Date) == date).all()
+    day_start = datetime.combine(date, datetime.min.time())
+
+    # Se lee de TotalHour, que ya tiene la potencia acumulada por hora y grupo
+    results = (
+        db.session.query(
+            TotalHour.bucket_start,
+            func.sum(TotalHour.power1 + TotalHour.power2 + TotalHour.power3 + TotalHour.power4 + TotalHour.power5)
+        )
+        .filter(
+            TotalHour.wall_id == current_wall(),
+            TotalHour.bucket_start >= day_start,
+            TotalHour.bucket_start < day_start + timedelta(days=1)
+        )
+        .group_by(TotalHour.bucket_start)
+        .all()
+    )
+    count_rows(results)
 
     hourly_totals = {hour: 0 for hour in range(24)}
 
-    for data in all_data:
-        hour = data.date.hour
-        total = ((data.propeller1 ** 2/216 * 1000) + (data.propeller2 ** 2/216 * 1000) + (data.propeller3 ** 2/216 * 1000) + (data.propeller4 ** 2/216 * 1000) + (data.propeller5 ** 2/216 * 1000))
-        hourly_totals[hour] += total
+    for bucket_start, power in results:
+        hourly_totals[bucket_start.hour] = power
 
     return jsonify(hourly_totals)
 
@@ -476,12 +3056,31 @@ def get_all_minutes():
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD HH:MM:SS'}), 400
 
 
-    all_data = WallData.query.filter(
-        WallData.date >= date.replace(minute=0, second=0, microsecond=0),
-        WallData.date < date.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-    ).all()
-    
-    print(all_data)
+    hour_start = date.replace(minute=0, second=0, microsecond=0)
+
+    # Se lee de TotalMinute, que ya tiene la potencia acumulada por minuto y grupo
+    results = (
+        db.session.query(
+            TotalMinute.bucket_start,
+            func.sum(TotalMinute.power1),
+            func.sum(TotalMinute.power2),
+            func.sum(TotalMinute.power3),
+            func.sum(TotalMinute.power4),
+            func.sum(TotalMinute.power5)
+        )
+        .filter(
+            TotalMinute.wall_id == current_wall(),
+            TotalMinute.bucket_start >= hour_start,
+            TotalMinute.bucket_start < hour_start + timedelta(hours=1)
+        )
+        .group_by(TotalMinute.bucket_start)
+        .all()
+    )
+    count_rows(results)
+    if not results:
+        # Si la retención ya borró los minutos de esa hora, salen del archivo
+        results = archived_minutes(current_wall(), hour_start)
+
     minute_totals = {minute: {
         'propeller1': 0,
         'propeller2': 0,
@@ -491,15 +3090,15 @@ def get_all_minutes():
         'total': 0
     } for minute in range(60)}
 
-    print(all_data)
-    for data in all_data:
-        minute = data.date.minute
-        minute_totals[minute]['propeller1'] += data.propeller1 ** 2/216 * 1000
-        minute_totals[minute]['propeller2'] += data.propeller2 ** 2/216 * 1000
-        minute_totals[minute]['propeller3'] += data.propeller3 ** 2/216 * 1000
-        minute_totals[minute]['propeller4'] += data.propeller4 ** 2/216 * 1000
-        minute_totals[minute]['propeller5'] += data.propeller5 ** 2/216 * 1000
-        minute_totals[minute]['total'] += ((data.propeller1 ** 2/216 * 1000) + (data.propeller2 ** 2/216 * 1000) + (data.propeller3 ** 2/216 * 1000) + (data.propeller4 ** 2/216 * 1000) + (data.propeller5 ** 2/216 * 1000))
+    for bucket_start, *powers in results:
+        minute_totals[bucket_start.minute] = {
+            'propeller1': powers[0],
+            'propeller2': powers[1],
+            'propeller3': powers[2],
+            'propeller4': powers[3],
+            'propeller5': powers[4],
+            'total': sum(powers)
+        }
 
     return jsonify(minute_totals)
 # -----------------------------------------------------------------------
@@ -507,32 +3106,39 @@ def get_all_minutes():
 def get_hour_by_number(number):
 
     today = datetime.now(mexico_tz).date()
-    all_data = WallData.query.filter(cast(WallData.date, Date) == today).all()
+    hour_start = datetime.combine(today, datetime.min.time()) + timedelta(hours=int(number))
 
-    total = 0
-
-    for data in all_data:
-        if data.date.hour == int(number):
-            total += data.propeller1 + data.propeller2 + data.propeller3 + data.propeller4 + data.propeller5
+    # Suma de velocidades de la hora pedida, ya acumulada en TotalHour
+    total = (
+        db.session.query(
+            func.sum(TotalHour.propeller1 + TotalHour.propeller2 + TotalHour.propeller3 + TotalHour.propeller4 + TotalHour.propeller5)
+        )
+        .filter(TotalHour.wall_id == current_wall(), TotalHour.bucket_start == hour_start)
+        .scalar()
+    ) or 0
 
     return jsonify({'hour': number, 'total': total})
 
 # -----------------------------------------------------------------------
 @app.route(BASE_URL + '/get_totals', methods=['GET'])
+@cached_response
 def get_totals():
-    # Realiza una consulta para sumar los propellers por grupo
+    # Suma los propellers por grupo desde TotalHour, que sigue completo
+    # aunque la retención ya haya sacado las lecturas crudas de WallData
     results = (
         db.session.query(
-            WallData.group,
+            TotalHour.group,
             func.sum(
-                WallData.propeller1 +
-                WallData.propeller2 +
-                WallData.propeller3 +
-                WallData.propeller4 +
-                WallData.propeller5
+                TotalHour.propeller1 +
+                TotalHour.propeller2 +
+                TotalHour.propeller3 +
+                TotalHour.propeller4 +
+                TotalHour.propeller5
             ).label('total')
         )
-        .group_by(WallData.group)
+        .filter(TotalHour.wall_id == current_wall())
+        .group_by(TotalHour.group)
+        .having(func.sum(TotalHour.readings) > 0)  # Grupos cuyas lecturas ya se borraron
         .all()
     )
     
@@ -540,21 +3146,119 @@ def get_totals():
     totals = {f'group{row[0]}': row[1] for row in results}
     
     return jsonify(totals)
+# -----------------------------------------------------------------------
+def propeller_statistics(timestamps, speeds, unit, percentiles):
+    # timestamps: segundos (ordenados), speeds: matriz (lecturas x 5 hélices).
+    # Todo se calcula por bucket con operaciones de NumPy, sin recorrer renglones.
+    buckets = timestamps.astype('datetime64[s]').astype(f'datetime64[{unit}]')
+    keys, starts, bucket_index, counts = np.unique(buckets, return_index=True, return_inverse=True, return_counts=True)
+    powers = speeds ** 2 / 216 * 1000
+
+    # Para los percentiles cada columna se ordena dentro de su bucket con un
+    # solo np.sort: los buckets ya vienen en orden, así que basta con sumarle
+    # a cada valor un desplazamiento por bucket mayor que el rango de los datos
+    low = speeds.min()
+    offset = (bucket_index * (speeds.max() - low + 1))[:, None]
+    ordered_speeds = np.sort(speeds - low + offset, axis=0) - offset + low
+
+    propellers = {}
+    for i in range(speeds.shape[1]):
+        speed = speeds[:, i]
+        power_sum = np.add.reduceat(powers[:, i], starts)
+        stats = {
+            'mean': np.add.reduceat(speed, starts) / counts,
+            'min': np.minimum.reduceat(speed, starts),
+            'max': np.maximum.reduceat(speed, starts),
+        }
+
+        # Percentiles con interpolación lineal dentro de cada bucket
+        ordered = ordered_speeds[:, i]
+        for q in percentiles:
+            position = starts + (counts - 1) * q / 100
+            lower = np.floor(position).astype(np.int64)
+            upper = np.ceil(position).astype(np.int64)
+            stats[f'p{q:g}'] = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+        # Igual que TotalHour: la energía es la suma de la potencia de las lecturas
+        stats['power'] = power_sum / counts
+        stats['energy'] = power_sum
+
+        propellers[f'propeller{i + 1}'] = {name: np.round(values, 4).tolist() for name, values in stats.items()}
+
+    labels = np.char.replace(np.datetime_as_string(keys.astype('datetime64[s]')), 'T', ' ')
+    return labels.tolist(), counts.tolist(), propellers
+
+@app.route(BASE_URL + '/stats', methods=['GET'])
+@cached_response
+def get_stats():
+    # /stats?start=YYYY-MM-DD&end=YYYY-MM-DD&group=N&bucket=hour
+    # Rango [start, end); por omisión el día de hoy. La respuesta va por columnas:
+    # una lista por estadística con un valor por bucket.
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in STATS_BUCKETS:
+        return jsonify({'error': f"bucket must be one of {', '.join(STATS_BUCKETS)}"}), 400
+
+    try:
+        start = parse_query_date(request.args['start']) if request.args.get('start') else day_start(datetime.now(mexico_tz).date())
+        end = parse_query_date(request.args['end']) if request.args.get('end') else start + timedelta(days=1)
+        percentiles = [float(q) for q in request.args.get('percentiles', '').split(',') if q] or STATS_PERCENTILES
+    except ValueError:
+        return jsonify({'error': 'Invalid parameters. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS dates and numeric percentiles'}), 400
+    group = request.args.get('group', type=int)
+
+    if end <= start:
+        return jsonify({'error': "'end' must be after 'start'"}), 400
+    if end - start > timedelta(days=STATS_MAX_DAYS):
+        return jsonify({'error': f'The range cannot be longer than {STATS_MAX_DAYS} days'}), 400
+    if any(q < 0 or q > 100 for q in percentiles):
+        return jsonify({'error': 'Percentiles must be between 0 and 100'}), 400
+
+    # Una sola consulta por columnas: fecha en segundos y las 5 hélices. Se lee
+    # directo del cursor del driver (tuplas de floats) para no crear un objeto
+    # Row por lectura, y de ahí pasa completo a una matriz de NumPy.
+    query = select(
+        cast(extract('epoch', WallData.date), Float), WallData.propeller1, WallData.propeller2,
+        WallData.propeller3, WallData.propeller4, WallData.propeller5
+    ).where(WallData.wall_id == current_wall(), WallData.date >= start, WallData.date < end).order_by(WallData.date)
+    if group is not None:
+        query = query.where(WallData.group == group)
+
+    result = db.session.connection().execute(query)
+    rows = count_rows(result.cursor.fetchall())
+    result.close()
+    data = np.array(rows, dtype=np.float64).reshape(len(rows), 6)
+
+    response = {
+        'start': start.strftime('%Y-%m-%d %H:%M:%S'),
+        'end': end.strftime('%Y-%m-%d %H:%M:%S'),
+        'bucket': bucket,
+        'group': group,
+        'readings': len(rows),
+        'buckets': [],
+        'count': [],
+        'propellers': {},
+    }
+    if len(rows):
+        labels, counts, propellers = propeller_statistics(data[:, 0].astype(np.int64), data[:, 1:], STATS_BUCKETS[bucket], percentiles)
+        response.update(buckets=labels, count=counts, propellers=propellers)
+
+    return jsonify(response)
 #- Fin de GET para WallData-----------------------------------------------
 
 # GETs | TotalDay -------------------------------------------------------
 
 @app.route(BASE_URL + '/readAllDays', methods=['GET'])
 def readAllDays():
-    all_data = TotalDay.query.all()
+    all_data = TotalDay.query.filter_by(wall_id=current_wall()).all()
     return jsonify([data.to_json() for data in all_data])
 
 # -----------------------------------------------------------------------
 
 @app.route(BASE_URL + '/getCurrentDay', methods=['GET'])
+@cached_response
 def get_current_day():
     today = datetime.now(mexico_tz).date()
-    today_object = TotalDay.query.filter_by(date=today).first()
+    today_object = TotalDay.query.filter_by(wall_id=current_wall(), date=today).first()
 
 
 
@@ -565,30 +3269,38 @@ def get_current_day():
 
 # -----------------------------------------------------------------------
 @app.route(BASE_URL + '/read30days', methods=['GET'])
+@cached_response
 def read30days():
 
     # Hacer un diccionario del 1 al 30 que tenga el total de cada día
     today = datetime.now(mexico_tz).date()
     thirty_days_ago = today - timedelta(days=30)
-    all_data = TotalDay.query.filter(TotalDay.date >= thirty_days_ago, TotalDay.date <= today).all()
 
     # Crear un diccionario con los últimos 30 días, inicializando en 0
-    day_totals = { (thirty_days_ago + timedelta(days=i)).strftime('%d'): 0 for i in range(31) }
-
-    # Actualizar el diccionario con los valores reales
-    for day in all_data:
-        day_totals[day.date.strftime('%d')] = day.total
+    day_totals = {f'{(thirty_days_ago + timedelta(days=i)).day:02d}': 0 for i in range(31)}
+
+    # Actualizar el diccionario con los valores reales. El número del día sale
+    # de SQL y se ordena por fecha: si un número se repite gana el más reciente
+    day_number = extract('day', TotalDay.date)
+    results = db.session.execute(
+        select(day_number, TotalDay.total)
+        .where(TotalDay.wall_id == current_wall(), TotalDay.date >= thirty_days_ago, TotalDay.date < today + timedelta(days=1))
+        .order_by(TotalDay.date)
+    )
+    for number, total in results:
+        day_totals[f'{int(number):02d}'] = total
 
     return jsonify(day_totals)
 # -----------------------------------------------------------------------
 
 @app.route(BASE_URL + '/getWeek', methods=['GET'])
+@cached_response
 def get_week():
     today = datetime.now(mexico_tz).date()
     week_start = today - timedelta(days=today.weekday())
     week_end = week_start + timedelta(days=6)
 
-    week_data = TotalDay.query.filter(TotalDay.date >= week_start, TotalDay.date <= week_end).all()
+    week_data = TotalDay.query.filter(TotalDay.wall_id == current_wall(), TotalDay.date >= week_start, TotalDay.date < week_end + timedelta(days=1)).all()
 
     week_totals = {day.date.strftime('%A, %Y-%m-%d'): (day.total ** 2/216 * 1000) for day in week_data}
     total_week = sum(day.total for day in week_data)
@@ -600,14 +3312,12 @@ def get_week():
 @app.route(BASE_URL + '/getDayByNumber/<number>', methods=['GET'])
 def get_day_by_number(number):
 
-    today = datetime.now(mexico_tz).date()
-    all_data = TotalDay.query.all()
-
-    total = 0
-
-    for data in all_data:
-        if data.date.day == int(number):
-            total += data.total
+    # Un solo renglón de TotalCalendar, sin importar cuántos años haya
+    total = db.session.execute(
+        select(TotalCalendar.total).where(
+            TotalCalendar.wall_id == current_wall(), TotalCalendar.kind == 'day', TotalCalendar.number == int(number)
+        )
+    ).scalar() or 0
 
     return jsonify({'day': number, 'total': total})
 
@@ -616,10 +3326,11 @@ def get_day_by_number(number):
 # GETs | TotalMonth -----------------------------------------------------
 
 @app.route(BASE_URL + '/getCurrentMonth', methods=['GET'])
+@cached_response
 def get_current_month():
     today = datetime.now(mexico_tz).date()
     month_start = today.replace(day=1)
-    month_object = TotalMonth.query.filter_by(date=month_start).first()
+    month_object = TotalMonth.query.filter_by(wall_id=current_wall(), date=month_start).first()
 
     if month_object is None:
         return jsonify({'total': 0})
@@ -628,30 +3339,32 @@ def get_current_month():
     
 # -----------------------------------------------------------------------
 @app.route(BASE_URL + '/readAllMonths', methods=['GET'])
+@cached_response
 def readAllMonths():
-    all_data = TotalMonth.query.all()
-
     #Crear un diccionario de meses del 1 al 12 que tenga el total de cada mes
     month_totals = {month: 0 for month in range(1, 13)}
 
-    for data in all_data:
-        month = data.date.month
-        month_totals[month] += data.total
+    results = db.session.execute(
+        select(TotalCalendar.number, TotalCalendar.total).where(TotalCalendar.wall_id == current_wall(), TotalCalendar.kind == 'month')
+    )
+    for month, total in results:
+        month_totals[month] += total
 
     return jsonify(month_totals)
 
 # -----------------------------------------------------------------------
 @app.route(BASE_URL + '/getMonthsObjects', methods=['GET'])
 def get_months_objects():
-    all_data = TotalMonth.query.all()
+    all_data = TotalMonth.query.filter_by(wall_id=current_wall()).all()
     return jsonify([data.to_json() for data in all_data])
 
 #- Fin de GET para TotalMonth --------------------------------------------
 
 # GETs | TotalAll -------------------------------------------------------
 @app.route(BASE_URL + '/getTotal', methods=['GET'])
+@cached_response
 def get_total():
-    total_object = TotalAll.query.first()
+    total_object = TotalAll.query.filter_by(wall_id=current_wall()).first()
 
     if total_object is None:
         return jsonify({'total': 0})
@@ -665,32 +3378,31 @@ def get_total():
 # ---DELETE-------------------------------------------------------------
 @app.route(BASE_URL + '/resetAll', methods=['DELETE'])
 def resetAll():
-    db.session.query(WallData).delete()
-    db.session.query(TotalDay).delete()
-    db.session.query(TotalMonth).delete()
-    db.session.query(TotalAll).delete()
-    db.session.commit()
-    return jsonify({'message': 'All data has been deleted'})
+    # Los acumulados se van descontando conforme se borran las lecturas y al
+    # final se borran los del muro (quedan solo los de lecturas nuevas)
+    wall_id = current_wall()
+    return start_delete_job('resetAll', [WallData.wall_id == wall_id], finish=lambda: reset_wall_rollups(wall_id))
 # -----------------------------------------------------------------------
 @app.route(BASE_URL + '/resetTempWallData', methods=['DELETE'])
 def resetTempWallData():
-    db.session.query(TempWallData).delete()
+    db.session.query(TempWallData).filter_by(wall_id=current_wall()).delete()
+    bump_data_version()
     db.session.commit()
     return jsonify({'message': 'All data has been deleted'})
 # -----------------------------------------------------------------------
 @app.route(BASE_URL + '/deleteAllZeros', methods=['DELETE'])
 def deleteAllZeros():
-    db.session.query(WallData).filter(WallData.propeller1 == 0, WallData.propeller2 == 0, WallData.propeller3 == 0, WallData.propeller4 == 0, WallData.propeller5 == 0).delete()
-    db.session.commit()
-    return jsonify({'message': 'All zeros have been deleted'})
+    zeros = [WallData.wall_id == current_wall(), WallData.propeller1 == 0, WallData.propeller2 == 0, WallData.propeller3 == 0, WallData.propeller4 == 0, WallData.propeller5 == 0]
+    return start_delete_job('deleteAllZeros', zeros)
 # -----------------------------------------------------------------------
 
 @app.route(BASE_URL + '/deleteLastStatus', methods=['DELETE'])
 def delete_last_status():
     try:
-        last_entry = SystemStatus.query.order_by(SystemStatus.id.desc()).first()
+        last_entry = SystemStatus.query.filter_by(wall_id=current_wall()).order_by(SystemStatus.id.desc()).first()
         if last_entry:
             db.session.delete(last_entry)
+            bump_data_version()
             db.session.commit()
             return jsonify({"message": "Last status entry deleted", "deleted_entry": last_entry.to_json()}), 200
         else:
@@ -702,11 +3414,22 @@ def delete_last_status():
 @app.route(BASE_URL + '/deleteLastWallData', methods=['DELETE'])
 def delete_last_wall_data():
     try:
-        last_entry = WallData.query.order_by(WallData.id.desc()).first()
+        last_entry = WallData.query.filter_by(wall_id=current_wall()).order_by(WallData.id.desc()).first()
         if last_entry:
-            db.session.delete(last_entry)
+            deleted_entry = last_entry.to_json()
+            rows = db.session.execute(
+                delete(WallData).where(WallData.id == last_entry.id).returning(
+                    WallData.id, WallData.wall_id, WallData.date, WallData.group, WallData.propeller1, WallData.propeller2,
+                    WallData.propeller3, WallData.propeller4, WallData.propeller5
+                ),
+                execution_options={'synchronize_session': False}
+            ).mappings().all()
+            # Se descuenta solo esa lectura, igual que en los borrados por bloques
+            subtract_rollups(rows)
+            bump_data_version()
             db.session.commit()
-            return jsonify({"message": "Last WallData entry deleted", "deleted_entry": last_entry.to_json()}), 200
+            invalidate_cache()
+            return jsonify({"message": "Last WallData entry deleted", "deleted_entry": deleted_entry}), 200
         else:
             return jsonify({"message": "No WallData entries found"}), 404
     except Exception as e:
@@ -723,14 +3446,15 @@ def delete_range_wall_data():
         if start_id is None or end_id is None:
             return jsonify({"error": "Missing 'start_id' or 'end_id' in request"}), 400
 
-        # Eliminar el rango especificado
-        deleted = WallData.query.filter(WallData.id >= start_id, WallData.id <= end_id).delete(synchronize_session=False)
-        db.session.commit()
+        try:
+            start_id, end_id = int(start_id), int(end_id)
+        except (TypeError, ValueError):
+            return jsonify({"error": "'start_id' and 'end_id' must be integers"}), 400
 
-        return jsonify({
-            "message": f"{deleted} entries deleted from WallData",
-            "range": f"{start_id} to {end_id}"
-        }), 200
+        # Eliminar el rango especificado en segundo plano
+        return start_delete_job('deleteRangeWallData', [
+            WallData.wall_id == current_wall(), WallData.id >= start_id, WallData.id <= end_id
+        ])
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -748,6 +3472,7 @@ def update_status_range():
 
         # Filtrar solo los registros con status = 0 dentro del rango
         entries = SystemStatus.query.filter(
+            SystemStatus.wall_id == current_wall(),
             SystemStatus.id >= start_id,
             SystemStatus.id <= end_id,
             SystemStatus.status == 0
@@ -760,6 +3485,7 @@ def update_status_range():
             updated_ids.append(entry.id)
             # No se actualiza last_update
 
+        bump_data_version()
         db.session.commit()
 
         return jsonify({
@@ -775,6 +3501,13 @@ def update_status_range():
 # Ejecutar la función en un hilo separado para no bloquear la API
 threading.Thread(target=monitor_xiao_status, daemon=True).start()
 
+if INGEST_BUFFER_ENABLED:
+    threading.Thread(target=ingest_flusher, daemon=True).start()
+    atexit.register(shutdown_ingest_buffer)
+
+if RETENTION_RAW_DAYS > 0:
+    start_retention_scheduler()
+
 
 if __name__ == '__main__':
     with app.app_context():
@@ -0,0 +1,275 @@
+#   Variante asíncrona (ASGI) de la API de la Pared Eólica
+#
+#   /new, /update, /status y /readTempLatest/<number> se atienden con el
+#   motor asyncio de SQLAlchemy (asyncpg o aiosqlite), así una conexión que
+#   espera a la base de datos no ocupa un hilo y un solo proceso aguanta
+#   miles de dispositivos conectados a la vez. /stream también es nativo:
+#   cada cliente del SSE se queda conectado y en el pool de hilos ocuparía
+#   uno para siempre. Todas las demás rutas pasan a la app de Flask de
+#   app.py (en un pool de hilos), con las mismas URLs.
+#
+#   La lógica de escritura es la misma de app.py: store_readings y
+#   record_heartbeat corren sobre la sesión asíncrona con run_sync.
+#
+#   Uso:
+#       uvicorn asgi:asgi_app --host 0.0.0.0 --port 8000
+#       SQLALCHEMY_DATABASE_URI=postgresql://... uvicorn asgi:asgi_app --workers 2
+
+import asyncio
+import contextlib
+import os
+import queue
+import uuid
+from datetime import datetime
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app, BASE_URL, DEFAULT_DEVICE, DEFAULT_WALL_ID, INGEST_BUFFER_ENABLED, DB_PGBOUNCER, DB_STATEMENT_TIMEOUT_MS,
+    STREAM_KEEPALIVE_SECONDS, TempWallData, mexico_tz, engine_options, sqlite_pragmas, parse_reading, ingest_queue,
+    store_readings, record_heartbeat, get_device_state, invalidate_cache, publish_readings, count_ingest, stream_broker,
+)
+
+WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '10'))  # Hilos para las rutas que atiende Flask
+
+# -----------------------------------------------------------------------
+# MOTOR ASÍNCRONO
+# -----------------------------------------------------------------------
+
+def async_database_uri(uri):
+    # Mismo SQLALCHEMY_DATABASE_URI, con el driver asíncrono de cada dialecto
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        return url.set(drivername='sqlite+aiosqlite')
+    if url.get_backend_name() == 'postgresql':
+        url = url.set(drivername='postgresql+asyncpg')
+        if DB_PGBOUNCER:
+            # Caché de sentencias preparadas de SQLAlchemy para asyncpg
+            url = url.update_query_dict({'prepared_statement_cache_size': '0'})
+        return url
+    raise ValueError(f'No async driver for {url.get_backend_name()!r}')
+
+def async_engine_options(uri):
+    # Las opciones del perfil de app.py (DB_PROFILE) con los connect_args de asyncpg
+    options = engine_options(uri)
+    if make_url(uri).get_backend_name() == 'sqlite':
+        return options  # aiosqlite le pasa el timeout a sqlite3.connect
+
+    connect_args = options.pop('connect_args')
+    server_settings = {'application_name': connect_args['application_name']}
+    if not DB_PGBOUNCER:
+        # asyncpg no tiene keepalives del lado del cliente; se piden al servidor
+        server_settings.update(tcp_keepalives_idle='30', tcp_keepalives_interval='10', tcp_keepalives_count='5')
+        if DB_STATEMENT_TIMEOUT_MS:
+            server_settings['statement_timeout'] = str(DB_STATEMENT_TIMEOUT_MS)
+
+    options['connect_args'] = {'server_settings': server_settings}
+    if DB_PGBOUNCER:
+        # asyncpg prepara cada sentencia; en modo transacción de PgBouncer la
+        # siguiente transacción puede caer en otra conexión del servidor, así
+        # que no se reutilizan y cada una lleva un nombre único
+        options['connect_args'].update(
+            statement_cache_size=0,
+            prepared_statement_name_func=lambda: f'__asyncpg_{uuid.uuid4()}__',
+        )
+    return options
+
+database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+async_engine = create_async_engine(async_database_uri(database_uri), **async_engine_options(database_uri))
+Session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# SQLite admite un solo escritor: en lugar de que decenas de transacciones
+# esperen el candado del archivo (y fallen al pasar el busy_timeout), las
+# escrituras de este proceso se forman en la cola del event loop
+write_lock = asyncio.Lock() if async_engine.dialect.name == 'sqlite' else contextlib.nullcontext()
+
+if async_engine.dialect.name == 'sqlite':
+    @event.listens_for(async_engine.sync_engine, 'connect')
+    def set_async_sqlite_pragmas(dbapi_connection, connection_record):
+        # Los mismos pragmas que app.py aplica a las conexiones de sqlite3
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+        cursor.close()
+
+# -----------------------------------------------------------------------
+# ENDPOINTS
+# -----------------------------------------------------------------------
+# Las funciones de app.py usan db.engine para elegir el INSERT ... ON CONFLICT
+# de cada dialecto, por eso las escrituras corren dentro de app.app_context().
+
+async def create(request):
+    date_time = datetime.now(mexico_tz).replace(tzinfo=None, microsecond=0)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(400)
+    if not isinstance(data, dict) or 'propeller1' not in data:
+        raise HTTPException(400)
+
+    # Validar y convertir la lectura completa antes de sumar
+    try:
+        row = parse_reading(data)
+    except (KeyError, TypeError, ValueError) as e:
+        return JSONResponse({'error': f'Invalid reading: {e}'}, status_code=400)
+    row['date'] = date_time
+
+    total_sum = row['propeller1'] + row['propeller2'] + row['propeller3'] + row['propeller4'] + row['propeller5']
+    if total_sum < 0.2:
+        count_ingest(0, 1)
+        return JSONResponse({'message': 'Data not saved. Total sum is less than 0.2'})
+
+    if INGEST_BUFFER_ENABLED:
+        try:
+            ingest_queue.put_nowait(row)
+        except queue.Full:
+            return JSONResponse({'error': 'Ingest buffer is full, try again later'}, status_code=503)
+
+        count_ingest(1, 0)
+        return JSONResponse(dict(row, date=date_time.strftime('%Y-%m-%d %H:%M:%S')), status_code=202)
+
+    with app.app_context():
+        async with write_lock, Session() as session:
+            rows, totals = await session.run_sync(lambda sync_session: store_readings([row], sync_session))
+            await session.commit()
+
+    invalidate_cache()
+    publish_readings(rows, totals)
+    count_ingest(1, 0)
+
+    return JSONResponse(dict(rows[0], date=date_time.strftime('%Y-%m-%d %H:%M:%S')))
+
+async def update_status(request):
+    try:
+        data = await request.json()
+        if "status" not in data:
+            return JSONResponse({"error": "Missing 'status' field"}, status_code=400)
+
+        new_status = int(data["status"])
+        if new_status not in [0, 1]:
+            return JSONResponse({"error": "Invalid status value. Must be 0 or 1"}, status_code=400)
+
+        device = str(data.get("device", DEFAULT_DEVICE))
+        wall_id = int(data.get("wall_id", DEFAULT_WALL_ID))
+
+        # Si el estado no cambió y ya se guardó hace poco, no se toca la base
+        with app.app_context():
+            async with write_lock, Session() as session:
+                last_update = await session.run_sync(lambda sync_session: record_heartbeat(device, new_status, sync_session, wall_id))
+
+        return JSONResponse({
+            "message": "New status recorded",
+            "status": new_status,
+            "lastUpdate": last_update.strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+async def get_status(request):
+    device = request.query_params.get('device', DEFAULT_DEVICE)
+    try:
+        wall_id = int(request.query_params.get('wall_id', DEFAULT_WALL_ID))
+    except ValueError:
+        wall_id = DEFAULT_WALL_ID  # Igual que current_wall() en app.py
+
+    async with Session() as session:
+        state = await session.run_sync(lambda sync_session: get_device_state(device, sync_session, wall_id))
+
+    if not state:
+        return JSONResponse({"status": 0, "message": "No status found"}, status_code=404)
+
+    return JSONResponse({
+        "status": state['status'],
+        "lastUpdate": state['last_update'].astimezone(mexico_tz).strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+async def read_temp_latest(request):
+    # asyncpg no convierte texto a entero como psycopg2, el grupo y el muro se validan aquí
+    try:
+        group = int(request.path_params['number'])
+        wall_id = int(request.query_params.get('wall_id', DEFAULT_WALL_ID))
+    except ValueError:
+        return JSONResponse({'message': 'No data found'}, status_code=404)
+
+    async with Session() as session:
+        latest_data = (await session.execute(select(TempWallData).filter_by(wall_id=wall_id, group=group))).scalars().first()
+
+    if latest_data is None:
+        return JSONResponse({'message': 'No data found'}, status_code=404)
+    return JSONResponse(latest_data.to_json())
+
+async def stream_readings(request):
+    # Mismo SSE que /stream de app.py. Las lecturas se publican desde otros
+    # hilos (Flask, buffer de ingesta) o desde este event loop; el broker
+    # avisa con call_soon_threadsafe y aquí se espera sin ocupar un hilo.
+    try:
+        wall_id = int(request.query_params.get('wall_id', DEFAULT_WALL_ID))
+    except ValueError:
+        wall_id = DEFAULT_WALL_ID
+    try:
+        group = int(request.query_params['group']) if 'group' in request.query_params else None
+    except ValueError:
+        group = None  # Igual que request.args.get(type=int) en app.py
+
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+
+    def notify():
+        with contextlib.suppress(RuntimeError):  # El event loop ya se cerró
+            loop.call_soon_threadsafe(ready.set)
+
+    subscriber = stream_broker.subscribe(wall_id, group, notify)
+
+    async def generate():
+        try:
+            yield ': connected\n\n'
+            while not subscriber.dropped:
+                try:
+                    message = subscriber.queue.get_nowait()
+                except queue.Empty:
+                    ready.clear()
+                    if subscriber.queue.empty() and not subscriber.dropped:
+                        try:
+                            await asyncio.wait_for(ready.wait(), STREAM_KEEPALIVE_SECONDS)
+                        except asyncio.TimeoutError:
+                            yield ': keepalive\n\n'
+                    continue
+
+                if subscriber.dropped:
+                    break
+                yield f'event: reading\ndata: {message}\n\n'
+        finally:
+            stream_broker.unsubscribe(subscriber)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+# -----------------------------------------------------------------------
+
+@contextlib.asynccontextmanager
+async def lifespan(_):
+    yield
+    await async_engine.dispose()
+
+asgi_app = Starlette(
+    routes=[
+        Route(BASE_URL + '/new', create, methods=['POST']),
+        Route(BASE_URL + '/update', update_status, methods=['POST']),
+        Route(BASE_URL + '/status', get_status, methods=['GET']),
+        Route(BASE_URL + '/readTempLatest/{number}', read_temp_latest, methods=['GET']),
+        Route(BASE_URL + '/stream', stream_readings, methods=['GET']),
+        Mount('', app=WSGIMiddleware(app, workers=WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,133 @@
+#   Benchmark de la app síncrona (gunicorn + Flask) contra la asíncrona
+#   (uvicorn + asgi.py) con muchos dispositivos conectados a la vez
+#
+#   Cada dispositivo virtual abre una conexión por petición (como la Xiao),
+#   manda --per-device peticiones seguidas y todos corren al mismo tiempo.
+#   Se mide cada endpoint de la variante asíncrona:
+#     - update:         heartbeat de un dispositivo distinto por conexión
+#     - status:         estado del dispositivo
+#     - readTempLatest: última lectura del grupo 1
+#     - new:            una lectura nueva por petición
+#
+#   Uso:
+#       python bench/bench_async.py --devices 2000 --per-device 5
+#       BENCH_DATABASE_URI=postgresql://... python bench/bench_async.py --workers 8 --drop
+#
+#   El resultado (p50/p95/p99, throughput y errores por servidor y endpoint)
+#   se imprime como JSON.
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from common import add_database_arguments, configure_database, summarize, wait_for_port, ROOT
+
+parser = argparse.ArgumentParser(description='Benchmark de la app síncrona contra la asíncrona')
+parser.add_argument('--devices', type=int, default=1000, help='Conexiones simultáneas')
+parser.add_argument('--per-device', type=int, default=5, help='Peticiones seguidas de cada dispositivo')
+parser.add_argument('--workers', type=int, default=4, help='Workers de gunicorn (app síncrona)')
+parser.add_argument('--asgi-workers', type=int, default=1, help='Procesos de uvicorn (app asíncrona)')
+parser.add_argument('--port', type=int, default=8767)
+parser.add_argument('--timeout', type=float, default=60, help='Segundos antes de contar una petición como error')
+parser.add_argument('--servers', default='sync,async', help='Servidores a medir separados por comas')
+parser.add_argument('--endpoints', default='update,status,readTempLatest,new', help='Endpoints a medir separados por comas')
+add_database_arguments(parser)
+args = parser.parse_args()
+
+database_uri = configure_database('bench_async', args)
+
+from app import app, db, BASE_URL  # noqa: E402
+
+READING = {'group': 1, 'propeller1': 1.5, 'propeller2': 2.0, 'propeller3': 0.5, 'propeller4': 1.0, 'propeller5': 0.75}
+
+ENDPOINTS = {
+    'update': lambda device: ('POST', BASE_URL + '/update', {'status': 1, 'device': f'bench-{device}'}),
+    'status': lambda device: ('GET', BASE_URL + f'/status?device=bench-{device}', None),
+    'readTempLatest': lambda device: ('GET', BASE_URL + '/readTempLatest/1', None),
+    'new': lambda device: ('POST', BASE_URL + '/new', READING),
+}
+
+SERVERS = {
+    'sync': lambda: [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-b', f'127.0.0.1:{args.port}', 'app:app'],
+    'async': lambda: [sys.executable, '-m', 'uvicorn', '--workers', str(args.asgi_workers), '--host', '127.0.0.1',
+                      '--port', str(args.port), '--log-level', 'warning', 'asgi:asgi_app'],
+}
+
+
+async def http_request(method, path, body):
+    # HTTP/1.1 mínimo con Connection: close, una conexión por petición
+    payload = json.dumps(body).encode() if body is not None else b''
+    reader, writer = await asyncio.open_connection('127.0.0.1', args.port)
+    try:
+        writer.write(
+            f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n'.encode() + payload
+        )
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def run_endpoint(name):
+    timings = []
+    errors = 0
+
+    async def device_loop(device):
+        nonlocal errors
+        for _ in range(args.per_device):
+            method, path, body = ENDPOINTS[name](device)
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(http_request(method, path, body), args.timeout)
+                failed = status >= 400
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                failed = True
+            timings.append(time.perf_counter() - start)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(device_loop(device) for device in range(args.devices)))
+    return summarize(timings, errors, time.perf_counter() - started)
+
+
+def run_server(name, endpoints):
+    server = subprocess.Popen(
+        SERVERS[name](), cwd=ROOT, env=dict(os.environ, SQLALCHEMY_DATABASE_URI=database_uri),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(args.port)
+        # Una lectura para que /readTempLatest/1 tenga algo que regresar
+        asyncio.run(http_request('POST', BASE_URL + '/new', READING))
+        return {endpoint: asyncio.run(run_endpoint(endpoint)) for endpoint in endpoints}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+# Cada dispositivo necesita un descriptor de archivo por conexión
+soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+with app.app_context():
+    db.drop_all()
+    db.create_all()
+    dialect = db.engine.dialect.name
+
+endpoints = args.endpoints.split(',')
+report = {
+    'dialect': dialect,
+    'devices': args.devices,
+    'per_device': args.per_device,
+    'workers': {'sync': args.workers, 'async': args.asgi_workers},
+    'results': {name: run_server(name, endpoints) for name in args.servers.split(',')},
+}
+
+print(json.dumps(report, indent=2))
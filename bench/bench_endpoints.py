@@ -0,0 +1,207 @@
+#   Benchmark de carga para la ingesta y los endpoints de los dashboards
+#
+#   Siembra la base de datos (SQLite temporal, o la de --database-uri,
+#   por ejemplo un PostgreSQL local) con lecturas, totales e historial de
+#   estado, y luego manda peticiones a /new, /getAllHours, /getAllMinutes,
+#   /readAll, /read30days y /status:
+#     - client:   con el test client de Flask, en el mismo proceso
+#     - gunicorn: contra un proceso real de gunicorn, con varios hilos
+#
+#   Uso:
+#       python bench/bench_endpoints.py --rows 1000000 --mode both
+#       BENCH_DATABASE_URI=postgresql://... python bench/bench_endpoints.py --rows 50000000 --drop
+#       python bench/bench_endpoints.py --database-uri postgresql://... --skip-seed --out resultados.json
+#
+#   El resultado (p50/p95/p99, throughput y memoria pico) se imprime como JSON
+#   para poder comparar una corrida con otra.
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from common import add_database_arguments, configure_database, seed_readings, seed_status, summarize, wait_for_port, ROOT
+
+parser = argparse.ArgumentParser(description='Benchmark de los endpoints de la API')
+parser.add_argument('--rows', type=int, default=1_000_000, help='Lecturas de WallData a sembrar')
+parser.add_argument('--days', type=int, default=60, help='Días que cubren las lecturas (renglones de TotalDay)')
+parser.add_argument('--walls', type=int, default=1, help='Muros entre los que se reparten las lecturas (se consulta el 1)')
+parser.add_argument('--status-rows', type=int, default=10_000, help='Renglones de SystemStatus a sembrar')
+parser.add_argument('--requests', type=int, default=200, help='Peticiones por endpoint')
+parser.add_argument('--concurrency', type=int, default=8, help='Hilos que mandan peticiones a gunicorn')
+parser.add_argument('--workers', type=int, default=4, help='Workers de gunicorn')
+parser.add_argument('--port', type=int, default=8765)
+parser.add_argument('--readall-limit', type=int, default=1000, help='?limit= para /readAll (0 = tabla completa)')
+parser.add_argument('--mode', choices=['client', 'gunicorn', 'both'], default='both')
+parser.add_argument('--skip-seed', action='store_true', help='Usar los datos que ya tiene la base')
+parser.add_argument('--out', help='Archivo donde guardar el JSON además de imprimirlo')
+add_database_arguments(parser)
+args = parser.parse_args()
+
+database_uri = configure_database('bench_endpoints', args, drops=not args.skip_seed)
+
+from app import app, db, BASE_URL  # noqa: E402
+
+
+def endpoints(day, hour):
+    # (nombre, método, ruta, cuerpo) de cada endpoint que se mide
+    read_all = BASE_URL + '/readAll' + (f'?limit={args.readall_limit}' if args.readall_limit else '')
+    return [
+        ('new', 'POST', BASE_URL + '/new', {
+            'group': 1, 'propeller1': 1.5, 'propeller2': 2.0, 'propeller3': 0.5, 'propeller4': 1.0, 'propeller5': 0.75,
+        }),
+        ('getAllHours', 'GET', BASE_URL + '/getAllHours?date=' + day.strftime('%Y-%m-%d'), None),
+        ('getAllMinutes', 'GET', BASE_URL + '/getAllMinutes?date=' + hour.strftime('%Y-%m-%d%%20%H:%M:%S'), None),
+        ('readAll', 'GET', read_all, None),
+        ('read30days', 'GET', BASE_URL + '/read30days', None),
+        ('status', 'GET', BASE_URL + '/status', None),
+    ]
+
+
+def run_client(targets):
+    client = app.test_client()
+    results = {}
+
+    for name, method, path, body in targets:
+        timings = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.open(path.replace('%20', ' '), method=method, json=body)
+            response.get_data()  # Consumir las respuestas que van por bloques
+            timings.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+        results[name] = summarize(timings, errors, time.perf_counter() - started)
+
+    # ru_maxrss está en KB en Linux
+    results['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return results
+
+
+def process_tree(pid):
+    children = [pid]
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                if int(stat.read().rsplit(')', 1)[1].split()[1]) == pid:
+                    children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+
+def peak_rss_mb(pids):
+    # VmHWM es la memoria residente máxima de cada proceso
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return round(total / 1024, 1)
+
+
+def run_gunicorn(targets):
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI=database_uri)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-b', f'127.0.0.1:{args.port}', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        wait_for_port(args.port)
+        base = f'http://127.0.0.1:{args.port}'
+        results = {}
+        lock = threading.Lock()
+
+        for name, method, path, body in targets:
+            timings = []
+            errors = [0]
+
+            def request_once(_):
+                data = json.dumps(body).encode() if body is not None else None
+                request = urllib.request.Request(base + path, data=data, method=method)
+                if data is not None:
+                    request.add_header('Content-Type', 'application/json')
+
+                start = time.perf_counter()
+                failed = False
+                try:
+                    with urllib.request.urlopen(request, timeout=60) as response:
+                        response.read()
+                except (urllib.error.URLError, OSError):
+                    failed = True
+                elapsed = time.perf_counter() - start
+
+                with lock:
+                    timings.append(elapsed)
+                    errors[0] += failed
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                list(pool.map(request_once, range(args.requests)))
+            results[name] = summarize(timings, errors[0], time.perf_counter() - started)
+
+        results['peak_rss_mb'] = peak_rss_mb(process_tree(server.pid))
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+with app.app_context():
+    seed_seconds = None
+    if not args.skip_seed:
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        start, end = seed_readings(args.rows, args.days, walls=args.walls)
+        seed_status(args.status_rows)
+        seed_seconds = round(time.perf_counter() - started, 2)
+    else:
+        from app import WallData
+        end = db.session.query(db.func.max(WallData.date)).scalar()
+        start = end - timedelta(days=args.days)
+    dialect = db.engine.dialect.name
+
+# Un día y una hora que sí tienen lecturas
+middle = start + (end - start) / 2
+targets = endpoints(middle.date(), middle.replace(minute=0, second=0, microsecond=0))
+
+report = {
+    'dialect': dialect,
+    'walls': args.walls,
+    'rows': args.rows,
+    'days': args.days,
+    'status_rows': args.status_rows,
+    'requests_per_endpoint': args.requests,
+    'seed_seconds': seed_seconds,
+    'results': {},
+}
+
+if args.mode in ('client', 'both'):
+    report['results']['client'] = run_client(targets)
+
+if args.mode in ('gunicorn', 'both'):
+    report['results']['gunicorn'] = dict(run_gunicorn(targets), workers=args.workers, concurrency=args.concurrency)
+
+output = json.dumps(report, indent=2)
+print(output)
+if args.out:
+    with open(args.out, 'w') as out:
+        out.write(output)
@@ -0,0 +1,123 @@
+#   Benchmark de índices para las consultas por tiempo de WallData
+#
+#   Llena una base de datos con N lecturas y mide las consultas calientes
+#   (rango de un día en WallData, última lectura de un grupo y último
+#   SystemStatus) sin los índices de la migración 0dced0b11672 y con ellos.
+#
+#   Uso:
+#       python bench/bench_indexes.py --rows 10000000
+#       BENCH_DATABASE_URI=postgresql://... python bench/bench_indexes.py --drop
+#
+#   El resultado se imprime como JSON.
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from common import add_database_arguments, configure_database
+
+parser = argparse.ArgumentParser(description='Benchmark de índices de WallData')
+parser.add_argument('--rows', type=int, default=10_000_000, help='Lecturas de WallData a insertar')
+parser.add_argument('--repeat', type=int, default=20, help='Repeticiones por consulta')
+parser.add_argument('--chunk', type=int, default=100_000, help='Lecturas por executemany')
+add_database_arguments(parser)
+args = parser.parse_args()
+
+configure_database('bench_indexes', args)
+
+from app import app, db, WallData, SystemStatus  # noqa: E402
+from sqlalchemy import insert, text  # noqa: E402
+
+START = datetime(2024, 1, 1)
+STEP = timedelta(seconds=2)
+
+# Índices de WallData y SystemStatus (los de 0dced0b11672, ya por muro)
+INDEXES = [
+    index
+    for model in (WallData, SystemStatus)
+    for index in model.__table__.indexes
+]
+
+QUERIES = {
+    'wall_data_day_range': (
+        'SELECT COUNT(*), SUM(propeller1) FROM wall_data WHERE wall_id = :wall AND date >= :start AND date < :end',
+        lambda: {'wall': 1, 'start': START + timedelta(days=30), 'end': START + timedelta(days=31)},
+    ),
+    'wall_data_latest_group': (
+        'SELECT * FROM wall_data WHERE wall_id = :wall AND "group" = :group ORDER BY id DESC LIMIT 1',
+        lambda: {'wall': 1, 'group': 2},
+    ),
+    'system_status_latest': (
+        'SELECT * FROM system_status WHERE wall_id = :wall ORDER BY id DESC LIMIT 1',
+        lambda: {'wall': 1},
+    ),
+}
+
+
+def seed():
+    for start in range(0, args.rows, args.chunk):
+        rows = [
+            {
+                'date': START + STEP * i,
+                'group': 1 + i % 3,
+                'propeller1': (i % 7) * 0.5,
+                'propeller2': (i % 5) * 0.5,
+                'propeller3': (i % 3) * 0.5,
+                'propeller4': (i % 11) * 0.25,
+                'propeller5': (i % 13) * 0.25,
+            }
+            for i in range(start, min(start + args.chunk, args.rows))
+        ]
+        db.session.execute(insert(WallData), rows)
+        db.session.execute(insert(SystemStatus), [
+            {'status': i % 2, 'last_update': row['date']} for i, row in enumerate(rows[::60])
+        ])
+        db.session.commit()
+
+
+def run_queries():
+    results = {}
+    with db.engine.connect() as connection:
+        for name, (sql, params) in QUERIES.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                connection.execute(text(sql), params()).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = {
+                'median_ms': round(statistics.median(timings), 3),
+                'max_ms': round(max(timings), 3),
+            }
+    return results
+
+
+with app.app_context():
+    db.drop_all()
+    db.create_all()
+    for index in INDEXES:
+        index.drop(db.engine)
+
+    start = time.perf_counter()
+    seed()
+    seed_seconds = time.perf_counter() - start
+
+    before = run_queries()
+
+    start = time.perf_counter()
+    for index in INDEXES:
+        index.create(db.engine)
+    index_seconds = time.perf_counter() - start
+
+    after = run_queries()
+    dialect = db.engine.dialect.name
+
+print(json.dumps({
+    'dialect': dialect,
+    'rows': args.rows,
+    'seed_seconds': round(seed_seconds, 2),
+    'create_indexes_seconds': round(index_seconds, 2),
+    'before': before,
+    'after': after,
+}, indent=2))
@@ -0,0 +1,158 @@
+#   Benchmark de ingesta (/new) con cada perfil del motor de base de datos
+#
+#   Levanta gunicorn una vez por caso, cada uno con su configuración en las
+#   variables de entorno, y manda lecturas a /new desde varios hilos:
+#     - SQLite:     journal DELETE con synchronous=FULL (lo que había antes),
+#                   WAL con synchronous=FULL y WAL con synchronous=NORMAL
+#     - PostgreSQL: los valores por defecto de SQLAlchemy (sin pre-ping) y los
+#                   perfiles gunicorn, serverless y pgbouncer (NullPool). Con
+#                   --pgbouncer-uri el perfil pgbouncer se conecta a través
+#                   de PgBouncer; si no, directo a PostgreSQL sin pool.
+#
+#   Cada caso empieza con las tablas vacías (en SQLite, con un archivo nuevo).
+#
+#   Uso:
+#       python bench/bench_pool.py --requests 2000 --workers 4 --concurrency 16
+#       BENCH_DATABASE_URI=postgresql://... python bench/bench_pool.py --drop \
+#           --pgbouncer-uri postgresql://...:6432/...
+#
+#   El resultado (p50/p95/p99, throughput, errores y lecturas guardadas por
+#   caso) se imprime como JSON.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from common import add_database_arguments, configure_database, summarize, wait_for_port, ROOT
+
+parser = argparse.ArgumentParser(description='Benchmark de ingesta por perfil del pool de conexiones')
+parser.add_argument('--requests', type=int, default=2000, help='Lecturas que se mandan a /new por caso')
+parser.add_argument('--concurrency', type=int, default=16, help='Hilos que mandan peticiones')
+parser.add_argument('--workers', type=int, default=4, help='Workers de gunicorn')
+parser.add_argument('--port', type=int, default=8766)
+parser.add_argument('--pgbouncer-uri', help='URI de PgBouncer para el perfil pgbouncer (PostgreSQL)')
+parser.add_argument('--cases', help='Casos a correr separados por comas (por defecto todos los del dialecto)')
+add_database_arguments(parser)
+args = parser.parse_args()
+
+database_uri = configure_database('bench_pool', args)
+os.environ['DB_SQLITE_WAL'] = '0'  # El proceso que crea las tablas no cambia el journal del archivo
+
+from sqlalchemy import create_engine, func, select  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+from app import db, BASE_URL, WallData  # noqa: E402
+
+SQLITE_CASES = {
+    'sqlite-delete-full': {'DB_SQLITE_WAL': '0', 'DB_SQLITE_SYNCHRONOUS': 'FULL'},
+    'sqlite-wal-full': {'DB_SQLITE_WAL': '1', 'DB_SQLITE_SYNCHRONOUS': 'FULL'},
+    'sqlite-wal-normal': {'DB_SQLITE_WAL': '1', 'DB_SQLITE_SYNCHRONOUS': 'NORMAL'},
+}
+POSTGRES_CASES = {
+    'sqlalchemy-defaults': {'DB_PROFILE': 'gunicorn', 'DB_POOL_PRE_PING': '0', 'DB_POOL_RECYCLE': '-1'},
+    'gunicorn': {'DB_PROFILE': 'gunicorn'},
+    'serverless': {'DB_PROFILE': 'serverless'},
+    'pgbouncer': {'DB_PROFILE': 'pgbouncer'},
+}
+
+READING = {'group': 1, 'propeller1': 1.5, 'propeller2': 2.0, 'propeller3': 0.5, 'propeller4': 1.0, 'propeller5': 0.75}
+
+
+def case_database(name):
+    # Regresa (URI para crear las tablas, URI que usa gunicorn)
+    if database_uri.startswith('sqlite'):
+        uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), name + '.db')
+        return uri, uri
+    if name == 'pgbouncer' and args.pgbouncer_uri:
+        return database_uri, args.pgbouncer_uri
+    return database_uri, database_uri
+
+
+def reset_tables(uri):
+    engine = create_engine(uri, poolclass=NullPool)
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+
+def stored_readings(uri):
+    engine = create_engine(uri, poolclass=NullPool)
+    with engine.connect() as connection:
+        count = connection.execute(select(func.count()).select_from(WallData)).scalar()
+    engine.dispose()
+    return count
+
+
+def run_case(name, overrides):
+    schema_uri, server_uri = case_database(name)
+    reset_tables(schema_uri)
+
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI=server_uri, **overrides)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-b', f'127.0.0.1:{args.port}', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        wait_for_port(args.port)
+        url = f'http://127.0.0.1:{args.port}{BASE_URL}/new'
+        body = json.dumps(READING).encode()
+        timings = []
+        errors = [0]
+        lock = threading.Lock()
+
+        def request_once(_):
+            request = urllib.request.Request(url, data=body, method='POST')
+            request.add_header('Content-Type', 'application/json')
+
+            start = time.perf_counter()
+            failed = False
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError):
+                failed = True
+            elapsed = time.perf_counter() - start
+
+            with lock:
+                timings.append(elapsed)
+                errors[0] += failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(request_once, range(args.requests)))
+        result = summarize(timings, errors[0], time.perf_counter() - started)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    # Con INGEST_BUFFER=1 las últimas lecturas se escriben al apagar gunicorn
+    result['stored'] = stored_readings(schema_uri)
+    result['env'] = overrides
+    return result
+
+
+cases = SQLITE_CASES if database_uri.startswith('sqlite') else POSTGRES_CASES
+if args.cases:
+    selected = args.cases.split(',')
+    unknown = [name for name in selected if name not in cases]
+    if unknown:
+        parser.error(f'unknown cases {unknown}, expected some of {list(cases)}')
+    cases = {name: cases[name] for name in selected}
+
+report = {
+    'dialect': 'sqlite' if database_uri.startswith('sqlite') else 'postgresql',
+    'requests': args.requests,
+    'workers': args.workers,
+    'concurrency': args.concurrency,
+    'results': {name: run_case(name, overrides) for name, overrides in cases.items()},
+}
+
+print(json.dumps(report, indent=2))
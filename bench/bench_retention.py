@@ -0,0 +1,127 @@
+#   Benchmark de la retención de WallData
+#
+#   Siembra --rows lecturas repartidas en --days días y mide, antes y después
+#   de aplicar la retención (--raw-days días de lecturas crudas):
+#     - el tamaño de la tabla caliente: lecturas en WallData y, en SQLite,
+#       las páginas de wall_data y de sus índices (dbstat)
+#     - /stats y /readTempLatest sobre los días recientes, que siguen en WallData
+#     - /getAllMinutes de una hora reciente y de una hora ya archivada (leída
+#       del archivo la primera vez y de la caché después)
+#   y además cuánto tarda la retención y cuánto ocupan los archivos.
+#
+#   Uso:
+#       python bench/bench_retention.py --rows 2000000 --days 60 --raw-days 7
+#       python bench/bench_retention.py --format parquet
+#       BENCH_DATABASE_URI=postgresql://... python bench/bench_retention.py --drop
+#
+#   El resultado se imprime como JSON.
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+from common import add_database_arguments, configure_database, seed_readings
+
+parser = argparse.ArgumentParser(description='Benchmark de la retención de lecturas crudas')
+parser.add_argument('--rows', type=int, default=1_000_000, help='Lecturas de WallData a sembrar')
+parser.add_argument('--days', type=int, default=60, help='Días que cubren las lecturas')
+parser.add_argument('--raw-days', type=int, default=7, help='Días de lecturas crudas que se quedan en WallData')
+parser.add_argument('--minute-days', type=int, default=14, help='Días de TotalMinute que se quedan')
+parser.add_argument('--format', dest='output_format', choices=['csv', 'parquet'], default='csv')
+parser.add_argument('--repeat', type=int, default=20, help='Repeticiones por consulta')
+add_database_arguments(parser)
+args = parser.parse_args()
+
+configure_database('bench_retention', args)
+os.environ.setdefault('RETENTION_ARCHIVE_DIR', tempfile.mkdtemp(prefix='bench_retention_'))
+os.environ['CACHE_TTL'] = '0'  # Se mide la consulta, no la caché de respuestas
+
+from sqlalchemy import func, select, text  # noqa: E402
+from app import app, db, BASE_URL, RETENTION_ARCHIVE_DIR, WallData, run_retention  # noqa: E402
+
+
+def table_size():
+    size = {'readings': db.session.execute(select(func.count()).select_from(WallData)).scalar()}
+    if db.engine.dialect.name == 'sqlite':
+        try:
+            pages = db.session.execute(text(
+                "SELECT name, SUM(pgsize) FROM dbstat WHERE tbl_name = 'wall_data' GROUP BY name"
+            )).all()
+            size['bytes'] = {name: total for name, total in pages}
+        except Exception:
+            db.session.rollback()  # SQLite sin SQLITE_ENABLE_DBSTAT_VTAB
+    else:
+        size['bytes'] = db.session.execute(text("SELECT pg_total_relation_size('wall_data')")).scalar()
+    return size
+
+
+def measure(path, repeat=args.repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (path, response.status_code)
+    return {'median_ms': round(statistics.median(timings), 3), 'max_ms': round(max(timings), 3)}
+
+
+def queries(recent_day, recent_hour, old_hour):
+    return {
+        'stats_recent_day': measure(BASE_URL + '/stats?start=' + recent_day),
+        'readTempLatest': measure(BASE_URL + '/readTempLatest/1'),
+        'getAllMinutes_recent': measure(BASE_URL + '/getAllMinutes?date=' + recent_hour),
+        'getAllMinutes_old': measure(BASE_URL + '/getAllMinutes?date=' + old_hour),
+    }
+
+
+def archive_bytes():
+    total = 0
+    for folder, _, files in os.walk(RETENTION_ARCHIVE_DIR):
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+    return total
+
+
+client = app.test_client()
+with app.app_context():
+    db.drop_all()
+    db.create_all()
+    start, end = seed_readings(args.rows, args.days)
+
+    recent = end - timedelta(days=1)
+    old = start + timedelta(days=1)
+    recent_day = recent.strftime('%Y-%m-%d')
+    recent_hour = recent.replace(minute=0, second=0).strftime('%Y-%m-%d%%20%H:%M:%S')
+    old_hour = old.replace(minute=0, second=0).strftime('%Y-%m-%d%%20%H:%M:%S')
+
+    before = {'table': table_size(), 'queries': queries(recent_day, recent_hour, old_hour)}
+
+    started = time.perf_counter()
+    summary = run_retention(args.raw_days, args.minute_days, args.output_format)
+    retention_seconds = time.perf_counter() - started
+
+    # La primera lectura de una hora archivada abre el archivo, las demás salen de la caché
+    first_read = measure(BASE_URL + '/getAllMinutes?date=' + old_hour, repeat=1)
+    after = {'table': table_size(), 'queries': queries(recent_day, recent_hour, old_hour)}
+    after['queries']['getAllMinutes_old_first_read'] = first_read
+
+    dialect = db.engine.dialect.name
+
+print(json.dumps({
+    'dialect': dialect,
+    'rows': args.rows,
+    'days': args.days,
+    'raw_days': args.raw_days,
+    'format': args.output_format,
+    'retention': {
+        'seconds': round(retention_seconds, 2),
+        'archived': summary['archived'],
+        'minutes_deleted': summary['minutes_deleted'],
+        'archive_bytes': archive_bytes(),
+    },
+    'before': before,
+    'after': after,
+}, indent=2))
@@ -0,0 +1,101 @@
+#   Benchmark de la serialización de /readAll y /statusHistory
+#
+#   Compara, sobre las mismas tablas:
+#     - orm:      la forma anterior, un objeto del ORM por renglón, to_json()
+#                 con strftime (y astimezone en SystemStatus) y el json de la
+#                 biblioteca estándar
+#     - stream:   /readAll y /statusHistory completos (tuplas de columnas,
+#                 fechas en bloque y orjson si está instalado)
+#     - columnar: las mismas tablas con ?format=columnar, página por página
+#
+#   Uso:
+#       python bench/bench_serialization.py --rows 1000000
+#       python bench/bench_serialization.py --skip-seed --repeat 5
+#
+#   El resultado se imprime como JSON.
+
+import argparse
+import json
+import time
+
+from common import add_database_arguments, configure_database, seed_readings, seed_status
+
+parser = argparse.ArgumentParser(description='Benchmark de serialización de las respuestas grandes')
+parser.add_argument('--rows', type=int, default=1_000_000, help='Renglones de WallData y de SystemStatus')
+parser.add_argument('--repeat', type=int, default=3, help='Repeticiones por caso (se reporta la mediana)')
+parser.add_argument('--skip-seed', action='store_true', help='Usar los datos que ya tiene la base')
+add_database_arguments(parser)
+args = parser.parse_args()
+
+configure_database('bench_serialization', args, drops=not args.skip_seed)
+
+from app import app, db, orjson, BASE_URL, MAX_PAGE_SIZE, WallData, SystemStatus  # noqa: E402
+
+
+def median_seconds(run):
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        size = run()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {'seconds': round(timings[len(timings) // 2], 3), 'bytes': size}
+
+
+def orm_dump(model, order):
+    # Lo que hacía list_response antes: objetos del ORM y to_json() por renglón
+    def run():
+        with app.test_request_context():
+            items = [item.to_json() for item in model.query.order_by(order).yield_per(1000)]
+            return len(json.dumps(items))
+    return run
+
+
+def stream_dump(path):
+    def run():
+        response = client.get(path)
+        return len(response.get_data())
+    return run
+
+
+def columnar_dump(path):
+    def run():
+        size = 0
+        after_id = None
+        while True:
+            query = f'?format=columnar&limit={MAX_PAGE_SIZE}' + (f'&after_id={after_id}' if after_id else '')
+            response = client.get(path + query)
+            size += len(response.get_data())
+            after_id = response.get_json()['next_after_id']
+            if after_id is None:
+                return size
+    return run
+
+
+with app.app_context():
+    if not args.skip_seed:
+        db.drop_all()
+        db.create_all()
+        seed_readings(args.rows, days=60, rollups=False)
+        seed_status(args.rows)
+
+client = app.test_client()
+report = {'rows': args.rows, 'orjson': orjson is not None, 'results': {}}
+
+for name, model, order, path in (
+    ('readAll', WallData, WallData.id, BASE_URL + '/readAll'),
+    ('statusHistory', SystemStatus, SystemStatus.id.desc(), BASE_URL + '/statusHistory'),
+):
+    with app.app_context():
+        orm = median_seconds(orm_dump(model, order))
+    stream = median_seconds(stream_dump(path))
+    columnar = median_seconds(columnar_dump(path))
+    report['results'][name] = {
+        'orm': orm,
+        'stream': stream,
+        'columnar': columnar,
+        'speedup_stream': round(orm['seconds'] / stream['seconds'], 2) if stream['seconds'] else None,
+        'speedup_columnar': round(orm['seconds'] / columnar['seconds'], 2) if columnar['seconds'] else None,
+    }
+
+print(json.dumps(report, indent=2))
@@ -0,0 +1,126 @@
+#   Utilidades compartidas por los benchmarks de bench/
+#
+#   configure_database() se tiene que llamar antes de importar app, porque
+#   app.py lee SQLALCHEMY_DATABASE_URI al importarse. Los benchmarks nunca
+#   usan la SQLALCHEMY_DATABASE_URI del entorno (puede ser la de producción):
+#   la base sale de --database-uri o BENCH_DATABASE_URI, y como los
+#   benchmarks borran las tablas, con una base que no es temporal hace falta --drop.
+
+import os
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def add_database_arguments(parser):
+    parser.add_argument('--database-uri', default=os.getenv('BENCH_DATABASE_URI'),
+                        help='Base de datos del benchmark (por omisión BENCH_DATABASE_URI, si no un SQLite temporal)')
+    parser.add_argument('--drop', action='store_true',
+                        help='Permite borrar las tablas de --database-uri (el benchmark empieza con la base vacía)')
+
+
+def configure_database(name, args, drops=True):
+    # Con --database-uri / BENCH_DATABASE_URI se usa esa base, si no un SQLite
+    # temporal. drops=False si esta corrida no va a borrar las tablas.
+    uri = args.database_uri
+    if not uri:
+        uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), name + '.db')
+    elif drops and not args.drop:
+        sys.exit(f'{name}: el benchmark borra todas las tablas de {uri}; si de verdad es una base de pruebas, agrega --drop')
+
+    os.environ['SQLALCHEMY_DATABASE_URI'] = uri
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    return uri
+
+
+def reading(i, date, walls=1):
+    # Lectura sintética determinista, siempre arriba del umbral de 0.2.
+    # Con walls > 1 las lecturas se reparten entre los muros 1..walls
+    return {
+        'wall_id': 1 + (i // 3) % walls,
+        'date': date,
+        'group': 1 + i % 3,
+        'propeller1': 0.5 + (i % 7) * 0.5,
+        'propeller2': (i % 5) * 0.5,
+        'propeller3': (i % 3) * 0.5,
+        'propeller4': (i % 11) * 0.25,
+        'propeller5': (i % 13) * 0.25,
+    }
+
+
+def seed_readings(rows, days, chunk=100_000, rollups=True, end=None, walls=1):
+    # Inserta `rows` lecturas repartidas en los últimos `days` días (un
+    # renglón de TotalDay por día y muro) y actualiza los acumulados por
+    # bloque. Regresa (inicio, fin) del rango sembrado.
+    from app import db, WallData, TempWallData, update_rollups, update_temp_latest
+    from sqlalchemy import insert
+
+    end = end or datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=days)
+    step = (end - start) / max(rows, 1)
+
+    for offset in range(0, rows, chunk):
+        batch = [reading(i, start + step * i, walls) for i in range(offset, min(offset + chunk, rows))]
+        ids = db.session.execute(
+            insert(WallData).returning(WallData.id, sort_by_parameter_order=True), batch
+        ).scalars().all()
+        batch = [dict(row, id=wall_id) for row, wall_id in zip(batch, ids)]
+        update_temp_latest(batch)
+        if rollups:
+            update_rollups(batch)
+        db.session.commit()
+
+    return start, end
+
+
+def seed_status(rows, end=None):
+    # Historial de SystemStatus alternando 0 y 1, y el estado actual en DeviceStatus
+    from app import db, SystemStatus, DeviceStatus, DEFAULT_DEVICE, DEFAULT_WALL_ID
+    from sqlalchemy import insert
+
+    end = end or datetime.utcnow().replace(microsecond=0)
+    history = [
+        {'device': DEFAULT_DEVICE, 'status': i % 2, 'last_update': end - timedelta(minutes=rows - i)}
+        for i in range(rows)
+    ]
+    if history:
+        db.session.execute(insert(SystemStatus), history)
+        db.session.merge(DeviceStatus(wall_id=DEFAULT_WALL_ID, device=DEFAULT_DEVICE, status=history[-1]['status'], last_update=history[-1]['last_update']))
+    db.session.commit()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(timings, errors, elapsed):
+    # timings en segundos; regresa milisegundos y peticiones por segundo
+    values = sorted(timings)
+    return {
+        'count': len(values),
+        'errors': errors,
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed else 0,
+    }
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'gunicorn did not start on port {port}')
@@ -0,0 +1,41 @@
+"""time query indexes
+
+Revision ID: 0dced0b11672
+Revises: 9f6b5f59575f
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0dced0b11672'
+down_revision = '9f6b5f59575f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los índices únicos de total_day.date y total_month.date ya se crearon en 72d90628dbd8
+    with op.batch_alter_table('wall_data', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_wall_data_date'), ['date'], unique=False)
+        batch_op.create_index('ix_wall_data_group_id', ['group', 'id'], unique=False)
+
+    with op.batch_alter_table('temp_wall_data', schema=None) as batch_op:
+        batch_op.create_index('ix_temp_wall_data_group_id', ['group', 'id'], unique=False)
+
+    with op.batch_alter_table('system_status', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_system_status_last_update'), ['last_update'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('system_status', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_system_status_last_update'))
+
+    with op.batch_alter_table('temp_wall_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_temp_wall_data_group_id')
+
+    with op.batch_alter_table('wall_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_wall_data_group_id')
+        batch_op.drop_index(batch_op.f('ix_wall_data_date'))
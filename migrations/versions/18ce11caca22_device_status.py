@@ -0,0 +1,42 @@
+"""device status
+
+Revision ID: 18ce11caca22
+Revises: 9c3effc18724
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '18ce11caca22'
+down_revision = '9c3effc18724'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('device_status',
+    sa.Column('device', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.Integer(), nullable=False),
+    sa.Column('last_update', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('device')
+    )
+
+    with op.batch_alter_table('system_status', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('device', sa.String(length=64), server_default='xiao', nullable=False))
+
+    # El estado actual de la Xiao es el último renglón del historial
+    op.execute("""
+        INSERT INTO device_status (device, status, last_update)
+        SELECT 'xiao', status, last_update FROM system_status
+        WHERE id = (SELECT id FROM system_status ORDER BY last_update DESC, id DESC LIMIT 1)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('system_status', schema=None) as batch_op:
+        batch_op.drop_column('device')
+
+    op.drop_table('device_status')
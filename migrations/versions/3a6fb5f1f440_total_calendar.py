@@ -0,0 +1,53 @@
+"""total calendar
+
+Revision ID: 3a6fb5f1f440
+Revises: 039a68811f41
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a6fb5f1f440'
+down_revision = '039a68811f41'
+branch_labels = None
+depends_on = None
+
+
+def backfill(kind, table):
+    # Llenar los totales por día del mes / mes del año con lo que ya existe
+    if op.get_bind().dialect.name == 'postgresql':
+        number = f"CAST(EXTRACT({kind} FROM date) AS INTEGER)"
+    else:
+        number = f"CAST(strftime('{'%d' if kind == 'day' else '%m'}', date) AS INTEGER)"
+
+    op.execute(f"""
+        INSERT INTO total_calendar (kind, number, total)
+        SELECT '{kind}', {number}, SUM(total)
+        FROM {table}
+        GROUP BY {number}
+    """)
+
+
+def upgrade():
+    op.create_table('total_calendar',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=8), nullable=False),
+    sa.Column('number', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('total_calendar', schema=None) as batch_op:
+        batch_op.create_index('ix_total_calendar_kind_number', ['kind', 'number'], unique=True)
+
+    backfill('day', 'total_day')
+    backfill('month', 'total_month')
+
+
+def downgrade():
+    with op.batch_alter_table('total_calendar', schema=None) as batch_op:
+        batch_op.drop_index('ix_total_calendar_kind_number')
+
+    op.drop_table('total_calendar')
@@ -0,0 +1,34 @@
+"""temp wall data latest per group
+
+Revision ID: 3eb9acac8882
+Revises: 18ce11caca22
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3eb9acac8882'
+down_revision = '18ce11caca22'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Solo se conserva la última lectura de cada grupo
+    op.execute("""
+        DELETE FROM temp_wall_data
+        WHERE id NOT IN (SELECT MAX(id) FROM temp_wall_data GROUP BY "group")
+    """)
+
+    with op.batch_alter_table('temp_wall_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_temp_wall_data_group_id')
+        batch_op.create_index(batch_op.f('ix_temp_wall_data_group'), ['group'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('temp_wall_data', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_temp_wall_data_group'))
+        batch_op.create_index('ix_temp_wall_data_group_id', ['group', 'id'], unique=False)
@@ -0,0 +1,48 @@
+"""temp wall data reading id
+
+Revision ID: 5c2e8f1d7b40
+Revises: b7d41c2e9a53
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e8f1d7b40'
+down_revision = 'b7d41c2e9a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # El id de la lectura de WallData pasa a su propia columna: si el upsert
+    # reescribe la llave primaria, un id de WallData nuevo puede chocar con el
+    # id viejo que todavía tiene el renglón de otro grupo
+    with op.batch_alter_table('temp_wall_data', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reading_id', sa.Integer(), nullable=True))
+
+    # La última lectura de cada muro y grupo en WallData; si ya no hay, el id que tenía
+    op.execute("""
+        UPDATE temp_wall_data SET reading_id = COALESCE(
+            (SELECT MAX(wall_data.id) FROM wall_data
+             WHERE wall_data.wall_id = temp_wall_data.wall_id AND wall_data."group" = temp_wall_data."group"),
+            temp_wall_data.id
+        )
+    """)
+
+    with op.batch_alter_table('temp_wall_data', schema=None) as batch_op:
+        batch_op.alter_column('reading_id', existing_type=sa.Integer(), nullable=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Los ids se copiaban de WallData, la secuencia propia se quedó atrás
+        op.execute("""
+            SELECT setval(pg_get_serial_sequence('temp_wall_data', 'id'), COALESCE(MAX(id), 0) + 1, false)
+            FROM temp_wall_data
+        """)
+
+
+def downgrade():
+    with op.batch_alter_table('temp_wall_data', schema=None) as batch_op:
+        batch_op.drop_column('reading_id')
@@ -0,0 +1,146 @@
+"""wall id and monthly partitions
+
+Revision ID: 69a379d4e0a9
+Revises: 3a6fb5f1f440
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '69a379d4e0a9'
+down_revision = '3a6fb5f1f440'
+branch_labels = None
+depends_on = None
+
+# Todo lo que ya existe es del muro 1 (DEFAULT_WALL_ID en app.py)
+WALL_TABLES = [
+    'temp_wall_data', 'wall_data', 'total_day', 'total_month', 'total_all',
+    'total_calendar', 'total_minute', 'total_hour', 'device_status', 'system_status',
+]
+
+# Índices que cambian: (tabla, índice anterior, columnas, índice nuevo, columnas, único)
+INDEXES = [
+    ('temp_wall_data', 'ix_temp_wall_data_group', ['group'], 'ix_temp_wall_data_wall_group', ['wall_id', 'group'], True),
+    ('total_day', 'ix_total_day_date', ['date'], 'ix_total_day_wall_date', ['wall_id', 'date'], True),
+    ('total_month', 'ix_total_month_date', ['date'], 'ix_total_month_wall_date', ['wall_id', 'date'], True),
+    ('total_calendar', 'ix_total_calendar_kind_number', ['kind', 'number'],
+     'ix_total_calendar_wall_kind_number', ['wall_id', 'kind', 'number'], True),
+    ('total_minute', 'ix_total_minute_bucket_group', ['bucket_start', 'group'],
+     'ix_total_minute_wall_bucket_group', ['wall_id', 'bucket_start', 'group'], True),
+    ('total_hour', 'ix_total_hour_bucket_group', ['bucket_start', 'group'],
+     'ix_total_hour_wall_bucket_group', ['wall_id', 'bucket_start', 'group'], True),
+]
+
+MONTHS_AHEAD = 2  # Después el monitor de app.py crea los meses siguientes
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_wall_data():
+    # Solo PostgreSQL: wall_data pasa a ser una tabla particionada por mes
+    # (RANGE sobre date) con una partición por cada mes que ya tiene lecturas,
+    # los siguientes MONTHS_AHEAD y wall_data_default para lo demás. La llave
+    # primaria de una tabla particionada tiene que incluir la columna de la
+    # partición, por eso queda (id, date); los ids siguen saliendo de la
+    # misma secuencia.
+    op.execute("ALTER TABLE wall_data RENAME TO wall_data_unpartitioned")
+    op.execute("ALTER TABLE wall_data_unpartitioned RENAME CONSTRAINT wall_data_pkey TO wall_data_unpartitioned_pkey")
+    op.execute("ALTER INDEX ix_wall_data_date RENAME TO ix_wall_data_unpartitioned_date")
+
+    op.execute("CREATE TABLE wall_data (LIKE wall_data_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (date)")
+    op.execute("ALTER TABLE wall_data ADD PRIMARY KEY (id, date)")
+    op.execute("CREATE TABLE wall_data_default PARTITION OF wall_data DEFAULT")
+
+    this_month = date.today().replace(day=1)
+    months = {row[0] for row in op.get_bind().execute(sa.text(
+        "SELECT DISTINCT CAST(date_trunc('month', date) AS DATE) FROM wall_data_unpartitioned"
+    ))}
+    months.update(add_months(this_month, i) for i in range(MONTHS_AHEAD + 1))
+    for month in sorted(months):
+        op.execute(
+            f"CREATE TABLE wall_data_p{month:%Y%m} PARTITION OF wall_data "
+            f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+        )
+
+    op.execute("INSERT INTO wall_data SELECT * FROM wall_data_unpartitioned")
+    op.execute("ALTER SEQUENCE wall_data_id_seq OWNED BY wall_data.id")
+    op.execute("DROP TABLE wall_data_unpartitioned")
+    op.execute("CREATE INDEX ix_wall_data_date ON wall_data (date)")
+
+
+def unpartition_wall_data():
+    # Regresa wall_data a una tabla normal con llave primaria (id)
+    op.execute("CREATE TABLE wall_data_unpartitioned (LIKE wall_data INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO wall_data_unpartitioned SELECT * FROM wall_data")
+    op.execute("ALTER SEQUENCE wall_data_id_seq OWNED BY wall_data_unpartitioned.id")
+    op.execute("DROP TABLE wall_data")  # También borra las particiones
+    op.execute("ALTER TABLE wall_data_unpartitioned RENAME TO wall_data")
+    op.execute("ALTER TABLE wall_data ADD CONSTRAINT wall_data_pkey PRIMARY KEY (id)")
+    op.execute("CREATE INDEX ix_wall_data_date ON wall_data (date)")
+
+
+def upgrade():
+    for table in WALL_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('wall_id', sa.Integer(), server_default='1', nullable=False))
+
+    for table, old_name, _, new_name, new_columns, unique in INDEXES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(old_name)
+            batch_op.create_index(new_name, new_columns, unique=unique)
+
+    with op.batch_alter_table('total_all', schema=None) as batch_op:
+        batch_op.create_index('ix_total_all_wall_id', ['wall_id'], unique=True)
+
+    with op.batch_alter_table('system_status', schema=None) as batch_op:
+        batch_op.create_index('ix_system_status_wall_id', ['wall_id', 'id'], unique=False)
+
+    with op.batch_alter_table('wall_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_wall_data_group_id')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        partition_wall_data()
+
+    # En PostgreSQL se crean en la tabla particionada y de ahí en cada partición
+    with op.batch_alter_table('wall_data', schema=None) as batch_op:
+        batch_op.create_index('ix_wall_data_wall_date', ['wall_id', 'date'], unique=False)
+        batch_op.create_index('ix_wall_data_wall_id', ['wall_id', 'id'], unique=False)
+
+
+def downgrade():
+    # El esquema anterior tiene un solo muro: se quedan solo los datos del muro 1
+    for table in WALL_TABLES:
+        op.execute(f"DELETE FROM {table} WHERE wall_id <> 1")
+
+    with op.batch_alter_table('wall_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_wall_data_wall_id')
+        batch_op.drop_index('ix_wall_data_wall_date')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        unpartition_wall_data()
+
+    with op.batch_alter_table('wall_data', schema=None) as batch_op:
+        batch_op.create_index('ix_wall_data_group_id', ['group', 'id'], unique=False)
+
+    with op.batch_alter_table('system_status', schema=None) as batch_op:
+        batch_op.drop_index('ix_system_status_wall_id')
+
+    with op.batch_alter_table('total_all', schema=None) as batch_op:
+        batch_op.drop_index('ix_total_all_wall_id')
+
+    for table, old_name, old_columns, new_name, _, unique in INDEXES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(new_name)
+            batch_op.create_index(old_name, old_columns, unique=unique)
+
+    for table in WALL_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('wall_id')
@@ -0,0 +1,59 @@
+"""unique rollup dates
+
+Revision ID: 72d90628dbd8
+Revises: e90c82dfdef5
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '72d90628dbd8'
+down_revision = 'e90c82dfdef5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Antes de crear los índices únicos hay que juntar los renglones duplicados
+    # que pudieron crear dos workers al mismo tiempo
+    op.execute("""
+        UPDATE total_day SET
+            total = (SELECT SUM(t.total) FROM total_day t WHERE t.date = total_day.date),
+            group1 = (SELECT SUM(t.group1) FROM total_day t WHERE t.date = total_day.date),
+            group2 = (SELECT SUM(t.group2) FROM total_day t WHERE t.date = total_day.date),
+            group3 = (SELECT SUM(t.group3) FROM total_day t WHERE t.date = total_day.date)
+        WHERE id IN (SELECT MIN(id) FROM total_day GROUP BY date HAVING COUNT(*) > 1)
+    """)
+    op.execute("DELETE FROM total_day WHERE id NOT IN (SELECT MIN(id) FROM total_day GROUP BY date)")
+
+    op.execute("""
+        UPDATE total_month SET
+            total = (SELECT SUM(t.total) FROM total_month t WHERE t.date = total_month.date)
+        WHERE id IN (SELECT MIN(id) FROM total_month GROUP BY date HAVING COUNT(*) > 1)
+    """)
+    op.execute("DELETE FROM total_month WHERE id NOT IN (SELECT MIN(id) FROM total_month GROUP BY date)")
+
+    # TotalAll queda en un solo renglón con id = 1 para poder hacer el upsert
+    op.execute("""
+        UPDATE total_all SET total = (SELECT SUM(t.total) FROM total_all t)
+        WHERE id = (SELECT MIN(id) FROM total_all)
+    """)
+    op.execute("DELETE FROM total_all WHERE id <> (SELECT MIN(id) FROM total_all)")
+    op.execute("UPDATE total_all SET id = 1")
+
+    with op.batch_alter_table('total_day', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_total_day_date'), ['date'], unique=True)
+
+    with op.batch_alter_table('total_month', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_total_month_date'), ['date'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('total_month', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_total_month_date'))
+
+    with op.batch_alter_table('total_day', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_total_day_date'))
@@ -0,0 +1,83 @@
+"""minute and hour rollups
+
+Revision ID: 9f6b5f59575f
+Revises: 72d90628dbd8
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f6b5f59575f'
+down_revision = '72d90628dbd8'
+branch_labels = None
+depends_on = None
+
+
+def bucket_columns():
+    return [
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('group', sa.Integer(), nullable=False),
+        sa.Column('readings', sa.Integer(), nullable=False),
+        sa.Column('propeller1', sa.Float(), nullable=False),
+        sa.Column('propeller2', sa.Float(), nullable=False),
+        sa.Column('propeller3', sa.Float(), nullable=False),
+        sa.Column('propeller4', sa.Float(), nullable=False),
+        sa.Column('propeller5', sa.Float(), nullable=False),
+        sa.Column('power1', sa.Float(), nullable=False),
+        sa.Column('power2', sa.Float(), nullable=False),
+        sa.Column('power3', sa.Float(), nullable=False),
+        sa.Column('power4', sa.Float(), nullable=False),
+        sa.Column('power5', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    ]
+
+
+def backfill(table, unit):
+    # Llenar los buckets con el histórico que ya existe en wall_data
+    if op.get_bind().dialect.name == 'postgresql':
+        bucket = f"date_trunc('{unit}', date)"
+    elif unit == 'minute':
+        bucket = "strftime('%Y-%m-%d %H:%M:00.000000', date)"
+    else:
+        bucket = "strftime('%Y-%m-%d %H:00:00.000000', date)"
+
+    op.execute(f"""
+        INSERT INTO {table} (bucket_start, "group", readings,
+            propeller1, propeller2, propeller3, propeller4, propeller5,
+            power1, power2, power3, power4, power5)
+        SELECT {bucket}, "group", COUNT(*),
+            SUM(propeller1), SUM(propeller2), SUM(propeller3), SUM(propeller4), SUM(propeller5),
+            SUM(propeller1 * propeller1) / 216 * 1000, SUM(propeller2 * propeller2) / 216 * 1000,
+            SUM(propeller3 * propeller3) / 216 * 1000, SUM(propeller4 * propeller4) / 216 * 1000,
+            SUM(propeller5 * propeller5) / 216 * 1000
+        FROM wall_data
+        GROUP BY {bucket}, "group"
+    """)
+
+
+def upgrade():
+    op.create_table('total_minute', *bucket_columns())
+    with op.batch_alter_table('total_minute', schema=None) as batch_op:
+        batch_op.create_index('ix_total_minute_bucket_group', ['bucket_start', 'group'], unique=True)
+
+    op.create_table('total_hour', *bucket_columns())
+    with op.batch_alter_table('total_hour', schema=None) as batch_op:
+        batch_op.create_index('ix_total_hour_bucket_group', ['bucket_start', 'group'], unique=True)
+
+    backfill('total_minute', 'minute')
+    backfill('total_hour', 'hour')
+
+
+def downgrade():
+    with op.batch_alter_table('total_hour', schema=None) as batch_op:
+        batch_op.drop_index('ix_total_hour_bucket_group')
+
+    op.drop_table('total_hour')
+    with op.batch_alter_table('total_minute', schema=None) as batch_op:
+        batch_op.drop_index('ix_total_minute_bucket_group')
+
+    op.drop_table('total_minute')
@@ -0,0 +1,57 @@
+"""device status per wall
+
+Revision ID: b7d41c2e9a53
+Revises: e3e6616d270f
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d41c2e9a53'
+down_revision = 'e3e6616d270f'
+branch_labels = None
+depends_on = None
+
+
+def device_status_table(primary_key):
+    # En SQLite la llave primaria no se puede cambiar: la tabla se vuelve a
+    # crear a partir de esta definición y se copian los renglones
+    return sa.Table('device_status', sa.MetaData(),
+        sa.Column('device', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.Integer(), nullable=False),
+        sa.Column('last_update', sa.DateTime(), nullable=False),
+        sa.Column('wall_id', sa.Integer(), server_default='1', nullable=False),
+        sa.PrimaryKeyConstraint(*primary_key, name='device_status_pkey')
+    )
+
+
+def upgrade():
+    # Todos los muros usan el mismo nombre de dispositivo: la llave pasa a ser (wall_id, device)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('device_status_pkey', 'device_status', type_='primary')
+        op.create_primary_key('device_status_pkey', 'device_status', ['wall_id', 'device'])
+    else:
+        with op.batch_alter_table('device_status', recreate='always', copy_from=device_status_table(['wall_id', 'device'])):
+            pass
+
+
+def downgrade():
+    # Se queda el renglón más reciente de cada dispositivo
+    op.execute("""
+        DELETE FROM device_status WHERE EXISTS (
+            SELECT 1 FROM device_status AS newer
+            WHERE newer.device = device_status.device
+              AND (newer.last_update > device_status.last_update
+                   OR (newer.last_update = device_status.last_update AND newer.wall_id < device_status.wall_id))
+        )
+    """)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('device_status_pkey', 'device_status', type_='primary')
+        op.create_primary_key('device_status_pkey', 'device_status', ['device'])
+    else:
+        with op.batch_alter_table('device_status', recreate='always', copy_from=device_status_table(['device'])):
+            pass
@@ -0,0 +1,40 @@
+"""archive file
+
+Revision ID: e3e6616d270f
+Revises: 69a379d4e0a9
+Create Date: 2026-10-18 01:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3e6616d270f'
+down_revision = '69a379d4e0a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archive_file',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('wall_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('path', sa.String(length=255), nullable=False),
+    sa.Column('format', sa.String(length=16), nullable=False),
+    sa.Column('first_id', sa.Integer(), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archive_file', schema=None) as batch_op:
+        batch_op.create_index('ix_archive_file_wall_date', ['wall_id', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('archive_file', schema=None) as batch_op:
+        batch_op.drop_index('ix_archive_file_wall_date')
+
+    op.drop_table('archive_file')
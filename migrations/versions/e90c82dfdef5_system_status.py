@@ -0,0 +1,33 @@
+"""system status
+
+Revision ID: e90c82dfdef5
+Revises: f31eeb68c214
+Create Date: 2025-03-01 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e90c82dfdef5'
+down_revision = 'f31eeb68c214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # En algunas instalaciones la tabla ya existe porque se creó con db.create_all()
+    if 'system_status' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('system_status',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('status', sa.Integer(), nullable=False),
+    sa.Column('last_update', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('system_status')
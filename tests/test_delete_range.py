@@ -0,0 +1,87 @@
+#   /deleteRangeWallData borra por bloques en segundo plano y descuenta de los
+#   acumulados lo que aportaba cada bloque. Aquí se revisa que TotalAll,
+#   TotalMonth, TotalDay y TotalHour queden igual que si se recalcularan desde
+#   cero con rebuild_rollups, sobre una base SQLite temporal.
+#
+#   Uso:
+#       python -m pytest tests
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['CACHE_TTL'] = '0'
+os.environ['DELETE_BATCH_PAUSE_MS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, BASE_URL, TotalAll, TotalMonth, TotalDay, TotalHour, rebuild_rollups  # noqa: E402
+
+START = datetime(2026, 1, 29)
+
+
+def snapshot(model):
+    # {columnas que identifican el renglón: valores acumulados}
+    db.session.expire_all()
+    columns = [column.name for column in model.__table__.columns if column.name != 'id']
+    keys = [name for name in columns if name in ('wall_id', 'date', 'bucket_start', 'group')]
+    values = [name for name in columns if name not in keys]
+    return {
+        tuple(getattr(row, name) for name in keys): [getattr(row, name) for name in values]
+        for row in model.query.all()
+    }
+
+
+def wait_for_job(client, response):
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+    for _ in range(600):
+        job = client.get(status_url).get_json()
+        if job['status'] != 'running':
+            return job
+        time.sleep(0.05)
+    pytest.fail('The delete job did not finish')
+
+
+@pytest.fixture(scope='module')
+def client():
+    rng = random.Random(16)
+    # Cinco días que cruzan el cambio de mes, en orden de fecha para que un
+    # rango de ids vacíe días completos y deje otros a medias
+    dates = sorted(START + timedelta(seconds=rng.randint(0, 5 * 86400)) for _ in range(2000))
+    readings = [{
+        'date': date.strftime('%Y-%m-%d %H:%M:%S'),
+        'group': rng.randint(1, 3),
+        **{f'propeller{i}': round(rng.uniform(0, 4), 3) for i in range(1, 6)},
+    } for date in dates]
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        test_client = app.test_client()
+        assert test_client.post(BASE_URL + '/newBatch', json=readings).status_code == 200
+        # Las lecturas de otro muro no se tocan
+        assert test_client.post(BASE_URL + '/newBatch', json={'wall_id': 2, 'readings': readings[:300]}).status_code == 200
+        yield test_client
+
+
+def test_range_delete_matches_rebuild(client):
+    response = client.delete(BASE_URL + '/deleteRangeWallData?batch_size=97', json={'start_id': 350, 'end_id': 1500})
+    job = wait_for_job(client, response)
+    assert job['status'] == 'done', job['error']
+    assert job['deleted'] == 1151
+    assert job['batches'] > 1
+
+    models = (TotalAll, TotalMonth, TotalDay, TotalHour)
+    after_delete = {model: snapshot(model) for model in models}
+    rebuild_rollups()
+    for model in models:
+        rebuilt = snapshot(model)
+        assert after_delete[model].keys() == rebuilt.keys(), model.__name__
+        for key, values in rebuilt.items():
+            assert after_delete[model][key] == pytest.approx(values), (model.__name__, key)
@@ -0,0 +1,105 @@
+#   /getAllHours y /getAllMinutes salen de TotalHour y TotalMinute. Aquí se
+#   comparan contra la implementación original, que recorría WallData renglón
+#   por renglón en Python, sobre lecturas sembradas en una base SQLite temporal.
+#
+#   Uso:
+#       python -m pytest tests
+
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['CACHE_TTL'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, BASE_URL, WallData, rebuild_rollups  # noqa: E402
+
+DAY = datetime(2026, 3, 14)
+
+
+def power(speed):
+    return speed ** 2 / 216 * 1000
+
+
+def python_hours(date):
+    # Implementación original de /getAllHours
+    all_data = WallData.query.filter(WallData.wall_id == 1, WallData.date >= date, WallData.date < date + timedelta(days=1)).all()
+    hourly_totals = {hour: 0 for hour in range(24)}
+    for data in all_data:
+        hourly_totals[data.date.hour] += sum(power(getattr(data, f'propeller{i}')) for i in range(1, 6))
+    return hourly_totals
+
+
+def python_minutes(hour_start):
+    # Implementación original de /getAllMinutes
+    all_data = WallData.query.filter(
+        WallData.wall_id == 1, WallData.date >= hour_start, WallData.date < hour_start + timedelta(hours=1)
+    ).all()
+    minute_totals = {minute: {f'propeller{i}': 0 for i in range(1, 6)} | {'total': 0} for minute in range(60)}
+    for data in all_data:
+        for i in range(1, 6):
+            minute_totals[data.date.minute][f'propeller{i}'] += power(getattr(data, f'propeller{i}'))
+        minute_totals[data.date.minute]['total'] += sum(power(getattr(data, f'propeller{i}')) for i in range(1, 6))
+    return minute_totals
+
+
+@pytest.fixture(scope='module')
+def client():
+    rng = random.Random(4)
+    readings = []
+    for _ in range(3000):
+        # El día de prueba con sus vecinos, para revisar los bordes de los rangos
+        date = DAY + timedelta(seconds=rng.randint(-3600, 25 * 3600))
+        readings.append({
+            'date': date.strftime('%Y-%m-%d %H:%M:%S'),
+            'group': rng.randint(1, 3),
+            **{f'propeller{i}': round(rng.uniform(0, 4), 3) for i in range(1, 6)},
+        })
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        test_client = app.test_client()
+        assert test_client.post(BASE_URL + '/newBatch', json=readings).status_code == 200
+        # Un segundo muro con las mismas horas no debe sumarse al primero
+        assert test_client.post(BASE_URL + '/newBatch', json={'wall_id': 2, 'readings': readings[:500]}).status_code == 200
+        yield test_client
+
+
+def check_hours(client):
+    response = client.get(BASE_URL + '/getAllHours?date=' + DAY.strftime('%Y-%m-%d'))
+    assert response.status_code == 200
+    expected = python_hours(DAY)
+    assert {int(hour): total for hour, total in response.get_json().items()} == pytest.approx(expected)
+
+
+def check_minutes(client):
+    for hour in (0, 7, 23):
+        hour_start = DAY + timedelta(hours=hour)
+        response = client.get(BASE_URL + '/getAllMinutes?date=' + hour_start.strftime('%Y-%m-%d %H:%M:%S'))
+        assert response.status_code == 200
+        expected = python_minutes(hour_start)
+        actual = {int(minute): values for minute, values in response.get_json().items()}
+        assert actual.keys() == expected.keys()
+        for minute in expected:
+            assert actual[minute] == pytest.approx(expected[minute]), minute
+
+
+def test_hours_match_python_loop(client):
+    check_hours(client)
+
+
+def test_minutes_match_python_loop(client):
+    check_minutes(client)
+
+
+def test_rebuilt_rollups_match_python_loop(client):
+    # Los acumulados que deja rebuild_rollups deben dar lo mismo que los de la ingesta
+    rebuild_rollups()
+    check_hours(client)
+    check_minutes(client)